@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+原子文件写入
+
+所有输出先写入同目录下的临时文件，flush + fsync 后用 os.replace 原子替换目标文件，再 fsync 目录，
+进程在任何时刻被杀死，目标文件要么是旧内容、要么是完整的新内容，不会出现写了一半的文件。
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+def fsync_directory(directory):
+    """
+    fsync 目录，使 rename 本身落盘（Windows 不支持对目录 fsync，忽略）
+    """
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _default_mode():
+    # mkstemp 创建的文件权限为 0600，改为按 umask 的普通文件权限，网页服务器等其他用户可读
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _temp_path(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    os.close(fd)
+    os.chmod(temp, _default_mode())
+    return temp
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding='utf-8', newline=None, copy_from=None):
+    """
+    以临时文件代替 path 打开，with 块正常结束后 fsync 并原子替换 path；出错时删除临时文件
+    copy_from 给出时临时文件先复制该文件的内容（配合 mode='a' 实现"追加"而不改动原文件，
+    代价是每次都完整复制一遍该文件）
+    """
+    temp = _temp_path(path)
+    try:
+        if copy_from is not None:
+            shutil.copyfile(copy_from, temp)
+        kwargs = {} if 'b' in mode else {'encoding': encoding, 'newline': newline}
+        with open(temp, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def atomic_write_json(path, obj, indent=1):
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=indent, separators=None if indent else (',', ':'))
+
+
+def atomic_link(source, path):
+    """
+    让 path 原子地指向与 source 相同的内容：优先创建硬链接（不复制数据），
+    文件系统不支持硬链接时复制
+    """
+    temp = _temp_path(path)
+    os.remove(temp)
+    try:
+        try:
+            os.link(source, temp)
+        except OSError:
+            shutil.copyfile(source, temp)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
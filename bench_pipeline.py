@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+查询 -> 合并 -> 写文件 流程的性能基准
+
+使用说明：
+1. 生成与 SHFE_rb.csv 同结构的合成历史数据（scale=1 约 2 万行，即一个品种约 100 个交易日），
+   按 --scales 放大到 10x / 100x；--products N 时生成分布在各交易所的 N 个品种（每个品种 scale 倍）
+2. 分别计时 load_existing_data、datetime 规范化、merge（merge_and_deduplicate）、保存（追加/重写）和整表 to_csv，
+   多个品种时为全部品种的合计耗时，记录耗时与峰值内存（tracemalloc）
+3. 结果写入 JSON；指定 --baseline 时与基线对比，超过 --threshold 倍即标记为回归
+
+例如：
+    python bench_pipeline.py --scales 1,10 --output bench_results.json
+    python bench_pipeline.py --scales 1 --products 12
+    python bench_pipeline.py --scales 1,10 --baseline bench_baseline.json --fail-on-regression
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from ranking_storage import (
+    RANKING_COLUMNS, RANKING_TYPE_NAMES, CsvStorage, load_existing_data, merge_and_deduplicate,
+    normalize_datetime, upsert_rows,
+)
+
+# scale=1 时的数据规模，与当前 SHFE_rb.csv 相当
+BASE_ROWS = 20000
+CONTRACTS_PER_PRODUCT = 5
+TOP_N = 20
+BROKER_COUNT = 120
+
+# --products 时依次使用的品种，覆盖各交易所（超出列表时循环使用并在品种代码后加序号）
+BENCH_PRODUCTS = [
+    ('SHFE', 'rb'), ('DCE', 'm'), ('CZCE', 'SR'), ('INE', 'sc'), ('GFEX', 'si'), ('CFFEX', 'IF'),
+    ('SHFE', 'cu'), ('DCE', 'i'), ('CZCE', 'TA'), ('INE', 'bc'), ('GFEX', 'lc'), ('CFFEX', 'IC'),
+]
+
+
+def bench_products(count):
+    """
+    前 count 个基准品种 [(交易所, 品种), ...]
+    """
+    products = []
+    for i in range(max(int(count), 1)):
+        exchange, product = BENCH_PRODUCTS[i % len(BENCH_PRODUCTS)]
+        round_ = i // len(BENCH_PRODUCTS)
+        products.append((exchange, f"{product}{round_}" if round_ else product))
+    return products
+
+
+def contract_symbols(exchange, product, count=CONTRACTS_PER_PRODUCT):
+    """
+    合成的合约代码；郑商所使用三位年月（如 CZCE.SR601）
+    """
+    first = 601 if exchange == 'CZCE' else 2601
+    return [f"{exchange}.{product}{first + 2 * i}" for i in range(count)]
+
+
+def generate_history(scale, seed=0, exchange='SHFE', product='rb', end=None):
+    """
+    生成一个品种的合成排名历史（宽表，与 query_symbol_data 输出列一致）
+    每个 (交易日, 合约, 排名类型) 从 BROKER_COUNT 家公司中随机选出 TOP_N 家上榜
+    """
+    rng = np.random.default_rng(seed)
+    n_days = math.ceil(BASE_ROWS * scale / (CONTRACTS_PER_PRODUCT * 3 * TOP_N))
+    days = pd.bdate_range(end=end or date.today(), periods=n_days).strftime('%Y%m%d')
+    symbols = contract_symbols(exchange, product)
+    brokers = np.array([f"B{i:03d}期货" for i in range(BROKER_COUNT)])
+    types = list(RANKING_TYPE_NAMES)
+
+    groups = n_days * len(symbols) * len(types)
+    picks = rng.random((groups, BROKER_COUNT)).argsort(axis=1)[:, :TOP_N].ravel()
+    day_idx = np.repeat(np.arange(n_days), len(symbols) * len(types) * TOP_N)
+    symbol_idx = np.tile(np.repeat(np.arange(len(symbols)), len(types) * TOP_N), n_days)
+    type_idx = np.tile(np.repeat(np.arange(len(types)), TOP_N), n_days * len(symbols))
+    rank = np.tile(np.arange(1, TOP_N + 1), groups).astype(float)
+    rows = len(picks)
+
+    symbol_arr = np.array(symbols)[symbol_idx]
+    type_arr = np.array(types)[type_idx]
+    df = pd.DataFrame({
+        'ranking_type': type_arr,
+        'ranking_type_name': pd.Series(type_arr).map(RANKING_TYPE_NAMES).to_numpy(),
+        'datetime': np.asarray(days)[day_idx].astype(np.int64),
+        'symbol': symbol_arr,
+        'exchange_id': exchange,
+        'instrument_id': pd.Series(symbol_arr).str.split('.').str[1].to_numpy(),
+        'broker': brokers[picks],
+    })
+    for field in ('volume', 'long_oi', 'short_oi'):
+        prefix = 'volume' if field == 'volume' else field[:-3]
+        df[field] = np.round(rng.lognormal(9, 1, rows))
+        df[f'{prefix}_change'] = np.round(rng.normal(0, 1, rows) * df[field] * 0.1)
+        df[f'{prefix}_ranking'] = np.where(type_arr == types[['volume', 'long_oi', 'short_oi'].index(field)],
+                                           rank, rng.integers(1, TOP_N + 1, rows).astype(float))
+    return df[RANKING_COLUMNS].sort_values('datetime', kind='stable').reset_index(drop=True)
+
+
+def nightly_batch(history, overlap_days=1, new_days=1, seed=1):
+    """
+    模拟一次夜间查询：重新返回最近 overlap_days 天（数值变动）+ 新增 new_days 天
+    """
+    rng = np.random.default_rng(seed)
+    dates = sorted(history['datetime'].unique())
+    overlap = history[history['datetime'].isin(dates[-overlap_days:])].copy() if overlap_days else history.iloc[:0]
+    overlap['volume'] = overlap['volume'] + 1
+    last = history[history['datetime'] == dates[-1]]
+    frames = [overlap]
+    last_day = pd.Timestamp(str(dates[-1]))
+    for i in range(new_days):
+        day = (last_day + pd.offsets.BDay(i + 1)).strftime('%Y-%m-%d')
+        new = last.copy()
+        new['datetime'] = day  # 与 tqsdk 返回的字符串日期一致
+        new['volume'] = np.round(rng.lognormal(9, 1, len(new)))
+        frames.append(new)
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(func, repeat=1, memory=True):
+    """
+    返回 (最短耗时秒数, 峰值内存 MB, 返回值)
+    计时不开启 tracemalloc（其开销会严重放大耗时），峰值内存单独再运行一次统计
+    """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+        best = min(best, time.perf_counter() - start)
+    if not memory:
+        return best, 0.0, result
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def bench_scale(scale, workdir, repeat=1, overlap_days=1, memory=True, products=1):
+    products = bench_products(products)
+    histories = [generate_history(scale, seed=i, exchange=exchange, product=product)
+                 for i, (exchange, product) in enumerate(products)]
+    batches = [nightly_batch(history, overlap_days=overlap_days, seed=i + 1) for i, history in enumerate(histories)]
+    # 不使用版本目录：save 直接追加/重写品种文件，计时覆盖实际的写入（版本模式下 save 只是暂存，发布在 commit 中）
+    storage = CsvStorage(workdir, generations=False)
+    filenames = [storage.location(exchange, product) for exchange, product in products]
+    stages = {}
+
+    def record(name, func):
+        seconds, peak_mb, result = measure(func, repeat, memory)
+        stages[name] = {'seconds': round(seconds, 4), 'peak_mb': round(peak_mb, 2)}
+        return result
+
+    record('to_csv', lambda: [history.to_csv(filename, index=False, encoding='utf-8-sig')
+                              for history, filename in zip(histories, filenames)])
+    loaded = record('load_existing_data', lambda: [load_existing_data(filename) for filename in filenames])
+    record('normalize_datetime', lambda: [normalize_datetime(df['datetime']) for df in loaded])
+    record('normalize_datetime_str', lambda: [df['datetime'].astype(str).str.replace('-', '').str[:8]
+                                              for df in loaded])
+    record('merge', lambda: [merge_and_deduplicate(df, batch) for df, batch in zip(loaded, batches)])
+    # 保存需要覆盖/追加的拆分结果，不计入 merge 的耗时
+    results = [upsert_rows(df, batch) for df, batch in zip(loaded, batches)]
+
+    def save():
+        # 每次都从同一份初始文件开始，保证重复计时可比
+        for filename in filenames:
+            shutil.copyfile(filename, filename + '.bak')
+        try:
+            return [storage.save(exchange, product, None, df, result)
+                    for (exchange, product), df, result in zip(products, loaded, results)]
+        finally:
+            for filename in filenames:
+                os.replace(filename + '.bak', filename)
+    record('save', save)
+
+    return {
+        'products': len(products),
+        'rows': sum(len(history) for history in histories),
+        'new_rows': sum(len(batch) for batch in batches),
+        'file_mb': round(sum(os.path.getsize(filename) for filename in filenames) / 2 ** 20, 2),
+        'patched': int(sum(result.patched_count for result in results)),
+        'appended': sum(len(result.appended_df) for result in results),
+        'stages': stages,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线对比，返回回归项列表
+    """
+    regressions = []
+    for scale_key, current in results.items():
+        base = baseline.get('results', {}).get(scale_key)
+        if not base:
+            continue
+        for stage, metrics in current['stages'].items():
+            base_metrics = base['stages'].get(stage)
+            if not base_metrics or base_metrics['seconds'] <= 0:
+                continue
+            ratio = metrics['seconds'] / base_metrics['seconds']
+            flag = ''
+            if ratio > threshold:
+                flag = '  <-- REGRESSION'
+                regressions.append((scale_key, stage, ratio))
+            print(f"  {scale_key:>10} {stage:<24} {base_metrics['seconds']:>9.4f}s -> "
+                  f"{metrics['seconds']:>9.4f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ranking 数据处理流程性能基准")
+    parser.add_argument('--scales', default='1,10', help="数据规模倍数，逗号分隔（1 约 2 万行）")
+    parser.add_argument('--products', type=int, default=1, help="品种数，分布在各交易所（各品种数据量相同）")
+    parser.add_argument('--repeat', type=int, default=3, help="每个阶段重复次数，取最短耗时")
+    parser.add_argument('--overlap-days', type=int, default=1, help="夜间查询中与历史重叠的交易日数")
+    parser.add_argument('--no-memory', action='store_true', help="不统计峰值内存（大规模时 tracemalloc 很慢）")
+    parser.add_argument('--output', default='bench_results.json', help="结果 JSON 文件")
+    parser.add_argument('--baseline', help="基线 JSON 文件，用于对比")
+    parser.add_argument('--threshold', type=float, default=1.25, help="耗时超过基线的倍数视为回归")
+    parser.add_argument('--fail-on-regression', action='store_true', help="存在回归时以非零状态退出")
+    args = parser.parse_args(argv)
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='bench_ranking_')
+    try:
+        for scale in [float(s) for s in args.scales.split(',') if s]:
+            key = f"scale_{scale:g}" + (f"_products_{args.products}" if args.products > 1 else "")
+            print(f"运行 {key} ...")
+            results[key] = bench_scale(scale, workdir, args.repeat, args.overlap_days, not args.no_memory,
+                                       args.products)
+            r = results[key]
+            print(f"  {r['products']} 个品种, {r['rows']} 行, {r['file_mb']} MB, 新数据 {r['new_rows']} 行 "
+                  f"(覆盖 {r['patched']}, 追加 {r['appended']})")
+            for stage, metrics in r['stages'].items():
+                print(f"    {stage:<24} {metrics['seconds']:>9.4f}s  峰值 {metrics['peak_mb']:>8.2f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"与基线 {args.baseline} 对比:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项回归")
+            if args.fail_on_regression:
+                return 1
+        else:
+            print("未发现回归")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
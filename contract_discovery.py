@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+活跃合约发现
+
+按品种列出当前在市（未到期）的期货合约，按持仓量、成交量排序后选取前 K 个或全部活跃月份，
+代替手工维护的合约列表。结果按数据日（最近一个已发布数据的交易日）缓存到本地 JSON 文件，
+同一数据日内重复运行不再查询合约信息。
+"""
+
+import json
+import math
+import os
+
+from atomic_io import atomic_write_json
+
+
+def parse_product(spec):
+    """
+    "SHFE.rb" -> ("SHFE", "rb")；格式不正确抛出 ValueError
+    """
+    exchange, _, product = str(spec).partition('.')
+    if not exchange or not product or not exchange.isupper() or not product.isalpha():
+        raise ValueError(f"品种格式应为 交易所.品种代码（例如 SHFE.rb），实际为: {spec!r}")
+    return exchange, product
+
+
+def list_contracts(api, exchange, product=None):
+    """
+    交易所（或其中一个品种）当前在市的期货合约代码
+    """
+    return list(api.query_quotes(ins_class="FUTURE", exchange_id=exchange, product_id=product, expired=False))
+
+
+def _quote_number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return 0 if math.isnan(value) else int(value)
+
+
+def rank_contracts(api, symbols):
+    """
+    查询合约行情，按持仓量、成交量从大到小排序
+    返回 [{'symbol', 'open_interest', 'volume'}, ...]
+    """
+    if not symbols:
+        return []
+    if hasattr(api, 'get_quote_list'):
+        quotes = api.get_quote_list(symbols)
+    else:
+        quotes = [api.get_quote(symbol) for symbol in symbols]
+    ranked = [
+        {'symbol': symbol,
+         'open_interest': _quote_number(getattr(quote, 'open_interest', 0)),
+         'volume': _quote_number(getattr(quote, 'volume', 0))}
+        for symbol, quote in zip(symbols, quotes)
+    ]
+    ranked.sort(key=lambda item: (-item['open_interest'], -item['volume'], item['symbol']))
+    return ranked
+
+
+def select_active(ranked, top_k=None, min_open_interest=1):
+    """
+    选取活跃合约：持仓量不低于 min_open_interest（没有持仓的合约没有持仓排名）；
+    top_k 为 None 时返回全部活跃月份，否则只取持仓量最大的前 top_k 个
+    返回的合约按合约代码排序
+    """
+    active = [item['symbol'] for item in ranked if item['open_interest'] >= min_open_interest]
+    if top_k is not None:
+        active = active[:max(int(top_k), 0)]
+    return sorted(active)
+
+
+class ContractDiscovery:
+    """
+    带数据日缓存的活跃合约发现
+    缓存文件格式：{"data_day": "YYYY-MM-DD", "products": {"SHFE.rb": [排序后的合约行情, ...]},
+                   "exchanges": {"SHFE": ["SHFE.rb", ...]}}
+    缓存保存的是完整排序结果，修改 top_k 不需要重新查询
+    """
+
+    def __init__(self, cache_file, data_day, min_open_interest=1):
+        self.cache_file = cache_file
+        self.data_day = data_day.isoformat()
+        self.min_open_interest = min_open_interest
+        self._ranked = {}
+        self._exchanges = {}
+        self._load()
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            print(f"  [WARN] 合约缓存 {self.cache_file} 无法读取，将重新查询")
+            return
+        if cache.get('data_day') == self.data_day:
+            self._ranked = cache.get('products', {})
+            self._exchanges = cache.get('exchanges', {})
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        atomic_write_json(self.cache_file,
+                          {'data_day': self.data_day, 'products': self._ranked, 'exchanges': self._exchanges})
+
+    def cached(self, product_spec):
+        return product_spec in self._ranked
+
+    def list_products(self, exchanges, get_api):
+        """
+        列出各交易所当前在市合约所属的全部品种，返回 ["SHFE.rb", ...]
+        每个交易所只查询一次合约列表，并顺带完成其下所有品种的合约排序
+        """
+        missing = [exchange for exchange in exchanges if exchange not in self._exchanges]
+        if missing:
+            api = get_api()
+            for exchange in missing:
+                by_product = {}
+                for symbol in list_contracts(api, exchange):
+                    instrument = symbol.partition('.')[2]
+                    product = instrument.rstrip('0123456789')
+                    # 跳过组合合约等非标准代码
+                    if product.isalpha() and product != instrument:
+                        by_product.setdefault(f"{exchange}.{product}", []).append(symbol)
+                for spec, symbols in by_product.items():
+                    self._ranked[spec] = rank_contracts(api, symbols)
+                self._exchanges[exchange] = sorted(by_product)
+                print(f"  [OK] {exchange}: {len(by_product)} 个品种")
+            self._save()
+        return [spec for exchange in exchanges for spec in self._exchanges[exchange]]
+
+    def discover(self, products, get_api, top_k=None):
+        """
+        products: ["SHFE.rb", ...]；get_api: 返回 TqApi 的函数，仅在缓存未命中时调用
+        返回 {(交易所, 品种): [合约代码, ...]}
+        """
+        selected = {}
+        missing = [spec for spec in products if spec not in self._ranked]
+        if missing:
+            api = get_api()
+            for spec in missing:
+                exchange, product = parse_product(spec)
+                self._ranked[spec] = rank_contracts(api, list_contracts(api, exchange, product))
+            self._save()
+        for spec in products:
+            exchange, product = parse_product(spec)
+            symbols = select_active(self._ranked[spec], top_k, self.min_open_interest)
+            source = "查询" if spec in missing else "缓存"
+            if symbols:
+                print(f"  [OK] {spec} 活跃合约（{source}）: {', '.join(symbols)}")
+            else:
+                print(f"  [WARN] {spec} 没有活跃合约（{source}）")
+            selected[(exchange, product)] = symbols
+        return selected
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+跨期（合约 × 期货公司）持仓矩阵的预计算
+
+网页的跨期净持仓表、按会员跨期图表/明细表和期货公司详情页的跨期对比图
+（script.js 的 renderCrossPeriodTable / getCrossPeriodBrokerData / renderBrokerCrossPeriodChart）
+都要扫描所选日期的全部排名行，按 (合约, 期货公司) 取多头/空头持仓的最大值。
+这里在每次合并后为本次涉及的每个交易日生成一次矩阵，网页一次请求即可渲染：
+
+    {summary_dir}/SHFE_rb/cross_period/20250829.json
+
+    {"date": 20250829,
+     "scope": "market",                                  数据范围（网页只使用全市场的矩阵）
+     "symbols": ["SHFE.rb2510", "SHFE.rb2601", ...],   按合约月份排序（与网页一致）
+     "brokers": ["D东证期货", ...],                      按名称排序
+     "long_oi": [[...], ...], "short_oi": [[...], ...]}  [期货公司][合约]，该公司当日没有该合约的排名行时为 null
+
+全市场视图按列汇总，期货公司视图取其中一行（期货公司文件中的排名行与全市场数据中该公司的行相同）。
+"""
+
+import os
+import re
+
+import pandas as pd
+
+from atomic_io import atomic_write_json
+from ranking_schema import MARKET_SCOPE
+
+CROSS_PERIOD_DIR = 'cross_period'
+
+_CONTRACT_MONTH = re.compile(r'(\d{4})')
+
+
+def _contract_order(symbol):
+    # 与网页一致：按合约代码中的四位年月排序，没有四位数字（如郑商所三位年月）时按合约代码
+    match = _CONTRACT_MONTH.search(symbol)
+    return match.group(1) if match else symbol
+
+
+def _dense(frame):
+    # 二维列表，缺失值为 None（JSON null）
+    return [[None if pd.isna(value) else int(value) for value in row] for row in frame.to_numpy(dtype=object)]
+
+
+def cross_period_matrix(rows):
+    """
+    一个交易日的 合约 × 期货公司 多头/空头持仓矩阵（见模块说明）
+    rows: 该品种当日的全部排名行
+    """
+    values = rows[['broker', 'symbol', 'long_oi', 'short_oi']].copy()
+    values['broker'] = values['broker'].astype(str)
+    values['symbol'] = values['symbol'].astype(str)
+    values[['long_oi', 'short_oi']] = values[['long_oi', 'short_oi']].fillna(0)
+    cells = values.groupby(['broker', 'symbol'], sort=False)[['long_oi', 'short_oi']].max()
+    symbols = sorted(values['symbol'].unique(), key=_contract_order)
+    brokers = sorted(values['broker'].unique())
+    return {
+        'symbols': symbols,
+        'brokers': brokers,
+        'long_oi': _dense(cells['long_oi'].unstack().reindex(index=brokers, columns=symbols)),
+        'short_oi': _dense(cells['short_oi'].unstack().reindex(index=brokers, columns=symbols)),
+    }
+
+
+def write_cross_period(merged_df, new_df, summary_dir, exchange, product, scope=MARKET_SCOPE):
+    """
+    为本次新数据涉及的每个交易日重写跨期矩阵 JSON，返回写入的文件数
+    merged_df: 合并后的全市场数据；new_df: 本次合并的新数据
+    scope: 数据范围，全市场为 MARKET_SCOPE，否则为期货公司列表
+    """
+    if merged_df.empty or new_df.empty:
+        return 0
+    directory = os.path.join(summary_dir, f"{exchange}_{product}", CROSS_PERIOD_DIR)
+    touched = {int(day) for day in new_df['datetime'].unique()}
+    rows = merged_df[merged_df['datetime'].isin(touched)]
+    scope = scope if scope == MARKET_SCOPE else sorted(scope)
+    written = 0
+    for day, day_rows in rows.groupby('datetime', sort=True):
+        atomic_write_json(os.path.join(directory, f"{int(day)}.json"),
+                          dict(date=int(day), scope=scope, **cross_period_matrix(day_rows)), indent=None)
+        written += 1
+    return written
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按月分片的静态数据文件
+
+网页原来每次都下载整份品种 CSV，文件随历史增长而变大。这里在每次合并全市场数据后，
+把本次涉及的月份重新写成按月分片，并维护清单，网页只加载所选日期需要的几个月：
+
+    {shard_dir}/manifest.json            全部品种：合约、起止日期、品种清单路径及其哈希
+    {shard_dir}/SHFE_rb/manifest.json    品种清单：数据范围 scope、各合约的交易日、各分片的路径/日期范围/行数/字节数/sha256
+    {shard_dir}/SHFE_rb/202508.1a2b3c4d5e6f.csv     2025 年 8 月的全市场数据（列与品种 CSV 相同）
+    {shard_dir}/SHFE_rb/202508.1a2b3c4d5e6f.csv.gz  同一内容的 gzip 压缩版本（安装了 brotli 时另有 .csv.br）
+
+分片文件名带内容哈希，内容不变的文件名不变、已发布的文件不再修改，浏览器和 CDN 可以长期缓存，
+每晚只有新数据涉及的月份换成新文件名（内容未变的月份不重写）。网页读取 .gz 后在浏览器中解压；
+.br 供支持按 Accept-Encoding 选择预压缩文件的服务器/CDN 使用（GitHub Pages 不支持）。
+每次写入只保留当前清单和上一版清单引用的文件，持有旧清单的页面仍可读取，其余文件删除。
+keep_months 限制分片覆盖的月份数（品种清单中的交易日随之截断），清单和分片目录的大小不随历史增长，
+更早的日期仍保存在品种 CSV 中。
+
+清单中的路径都相对于 shard_dir。品种清单中缺少的月份（首次启用或清单丢失）和旧格式的月份会一并补写。
+总清单由各品种目录下的清单汇总而成，由 write_catalog 在全部品种写完后统一生成（多进程扫描时由主进程生成）。
+总清单只列出 scope 为全市场的品种，只有部分期货公司数据的分片（以及没有 scope 的旧清单）不会被网页当作品种视图。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from atomic_io import atomic_open, atomic_write_json
+from ranking_schema import MARKET_SCOPE
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _product_name(exchange, product):
+    return f"{exchange}_{product}"
+
+
+def read_manifest(path):
+    """
+    读取清单文件，不存在或无法解析时返回空 dict
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"  [WARN] 分片清单 {path} 无法读取，将重新生成")
+        return {}
+
+
+# 文件名中内容哈希的长度（sha256 前缀）
+HASH_LENGTH = 12
+
+
+def _write_file(path, data):
+    with atomic_open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_shard(shard_dir, name, month, part, previous=None):
+    """
+    写入一个月份的分片及其压缩版本，返回清单项；内容与 previous 相同时不重写，直接返回 previous
+    """
+    data = part.to_csv(index=False).encode('utf-8-sig')
+    digest = hashlib.sha256(data).hexdigest()
+    if previous is not None and previous.get('sha256') == digest and 'encodings' in previous \
+            and os.path.exists(os.path.join(shard_dir, previous['path'])):
+        return previous
+    relative = f"{name}/{month}.{digest[:HASH_LENGTH]}.csv"
+    _write_file(os.path.join(shard_dir, relative), data)
+    # mtime=0 使相同内容的压缩结果相同
+    encodings = {'gzip': (f"{relative}.gz", gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli is not None:
+        encodings['br'] = (f"{relative}.br", brotli.compress(data, quality=11))
+    for path, compressed in encodings.values():
+        _write_file(os.path.join(shard_dir, path), compressed)
+    return {
+        'month': month,
+        'path': relative,
+        'first_date': int(part['datetime'].min()),
+        'last_date': int(part['datetime'].max()),
+        'rows': len(part),
+        'bytes': len(data),
+        'sha256': digest,
+        'encodings': {encoding: {'path': path, 'bytes': len(compressed)}
+                      for encoding, (path, compressed) in encodings.items()},
+    }
+
+
+def _shard_files(entry):
+    if not entry:
+        return set()
+    return {os.path.basename(entry['path'])} | {
+        os.path.basename(encoded['path']) for encoded in entry.get('encodings', {}).values()}
+
+
+def _remove_unreferenced(product_dir, keep):
+    """
+    删除品种目录中不在 keep 中的分片文件（被替换的旧版本、不带哈希的旧文件名、已移出清单的月份）
+    """
+    for filename in os.listdir(product_dir):
+        if filename.endswith(('.csv', '.gz', '.br')) and filename not in keep:
+            os.remove(os.path.join(product_dir, filename))
+
+
+def write_shards(merged_df, new_df, shard_dir, exchange, product, keep_months=None, scope=MARKET_SCOPE):
+    """
+    重写本次新数据涉及的月份（以及清单中还没有的月份）的分片，更新品种清单（总清单由 write_catalog 生成）
+    merged_df: 合并后的全市场数据；new_df: 本次合并的新数据
+    keep_months: 只保留最近的若干个月份，None 为全部保留
+    scope: 数据范围，全市场为 MARKET_SCOPE，否则为期货公司列表
+    返回内容有变化、写入了新文件的分片数
+    """
+    if merged_df.empty:
+        return 0
+    name = _product_name(exchange, product)
+    manifest_path = os.path.join(shard_dir, name, MANIFEST_FILE)
+    manifest = read_manifest(manifest_path)
+    previous_shards = manifest.get('shards', [])
+    shards = {shard['month']: shard for shard in previous_shards}
+
+    months = merged_df['datetime'] // 100
+    all_months = set(int(month) for month in months.unique())
+    if keep_months:
+        all_months = set(sorted(all_months)[-int(keep_months):])
+        merged_df = merged_df[months.isin(all_months)]
+        months = months[months.isin(all_months)]
+    touched = set(int(month) for month in (new_df['datetime'] // 100).unique()) if not new_df.empty else set()
+    # 清单中没有的月份，以及旧格式（不带哈希文件名和压缩版本）的月份一并补写
+    missing = {month for month in all_months if 'encodings' not in shards.get(month, {})}
+    to_write = sorted((touched | missing) & all_months)
+    written = 0
+    for month in to_write:
+        part = merged_df[months == month].sort_values('datetime', kind='stable')
+        previous = shards.get(month)
+        entry = _write_shard(shard_dir, name, month, part, previous)
+        if entry is not previous:
+            shards[month] = entry
+            written += 1
+
+    current_shards = [shards[month] for month in sorted(shards) if month in all_months]
+    symbols = merged_df['symbol'].astype(str)
+    atomic_write_json(manifest_path, {
+        'product': f"{exchange}.{product}",
+        'scope': scope if scope == MARKET_SCOPE else sorted(scope),
+        'updated': datetime.now().isoformat(timespec='seconds'),
+        'symbols': {symbol: sorted(int(day) for day in days)
+                    for symbol, days in merged_df['datetime'].groupby(symbols, sort=True).unique().items()},
+        'shards': current_shards,
+    }, indent=None)
+    # 清单写入后再删除文件：保留当前清单和上一版清单引用的文件
+    keep = set()
+    for entry in current_shards + previous_shards:
+        keep |= _shard_files(entry)
+    _remove_unreferenced(os.path.join(shard_dir, name), keep)
+    return written
+
+
+def write_catalog(shard_dir):
+    """
+    汇总各品种清单，写入 {shard_dir}/manifest.json；返回包含的品种数
+    只列出 scope 为全市场的品种清单
+    应在所有写入该目录的进程结束后由单个进程调用（多个进程同时汇总时会互相覆盖）
+    """
+    if not os.path.isdir(shard_dir):
+        return 0
+    products = {}
+    for name in sorted(os.listdir(shard_dir)):
+        path = os.path.join(shard_dir, name, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        manifest = json.loads(data)
+        shards = manifest.get('shards', [])
+        if not shards:
+            continue
+        if manifest.get('scope') != MARKET_SCOPE:
+            print(f"  [WARN] 分片清单 {path} 不是全市场数据（scope={manifest.get('scope')}），不列入总清单")
+            continue
+        products[name] = {
+            'manifest': f"{name}/{MANIFEST_FILE}",
+            'scope': MARKET_SCOPE,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'symbols': sorted(manifest.get('symbols', {})),
+            'first_date': shards[0]['first_date'],
+            'last_date': shards[-1]['last_date'],
+            'bytes': sum(shard['bytes'] for shard in shards),
+            'gzip_bytes': sum(shard.get('encodings', {}).get('gzip', {}).get('bytes', 0) for shard in shards),
+        }
+    atomic_write_json(os.path.join(shard_dir, MANIFEST_FILE), {
+        'updated': datetime.now().isoformat(timespec='seconds'),
+        'products': products,
+    })
+    return len(products)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+离线 TqApi 替身：不需要快期账户和网络即可运行/压测查询与合并流程
+
+使用说明：
+1. 设置环境变量 TQ_FAKE_API（或脚本中的 FAKE_API）后，create_api 返回 FakeTqApi，否则连接真实服务器
+2. 取值格式：{模式}[:{文件列表}][;参数=值...]
+   - "replay:SHFE_rb.csv,SHFE_rb_D东证期货.csv"  从已保存的排名CSV（录制数据）回放
+   - "synthetic;brokers=60;seed=7"               按交易日历生成合成排名数据
+   - 通用参数：latency=每次查询平均延迟秒数, failure_rate=失败概率, max_qps=每秒查询上限（超过返回 429）
+3. 例如：TQ_FAKE_API="synthetic;latency=0.05;failure_rate=0.02" python query_ranking_to_csv.py
+"""
+
+import asyncio
+import os
+import random
+import time
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import get_trading_calendar
+
+# tqsdk 持仓排名 DataFrame 的列
+RANKING_RESULT_COLUMNS = [
+    "datetime", "symbol", "exchange_id", "instrument_id", "broker",
+    "volume", "volume_change", "volume_ranking",
+    "long_oi", "long_change", "long_ranking",
+    "short_oi", "short_change", "short_ranking",
+]
+
+# 合成数据使用的期货公司名称前缀（不足时自动编号）
+SYNTHETIC_BROKERS = [
+    "Z中信期货", "G国泰君安", "D东证期货", "H海通期货", "Y永安期货", "Z中辉期货", "S申万期货", "C创元期货",
+    "X新湖期货", "J建信期货", "Y银河期货", "G光大期货", "H华泰期货", "G广发期货", "F方正中期", "Z中金财富",
+    "N南华期货", "G国投安信", "D东海期货", "W五矿期货", "B宝城期货", "M摩根大通", "P平安期货", "H宏源期货",
+]
+
+# 合成合约列表使用的品种（交易所 -> 品种代码）
+FAKE_PRODUCTS = {
+    "SHFE": ["rb", "hc", "cu", "al", "zn", "ni", "au", "ag", "ru", "fu", "bu", "sp"],
+    "DCE": ["m", "y", "p", "c", "a", "i", "j", "jm", "l", "pp", "v", "eg"],
+    "CZCE": ["SR", "CF", "TA", "MA", "FG", "RM", "OI", "SA", "AP", "UR"],
+    "INE": ["sc", "lu", "nr", "bc", "ec"],
+    "GFEX": ["si", "lc", "ps"],
+    "CFFEX": ["IF", "IH", "IC", "IM", "T", "TF", "TS"],
+}
+
+# 合成合约列表覆盖的月份数（从最近交易日所在月份起）
+FAKE_LISTED_MONTHS = 12
+
+
+def _fake_contract_symbol(exchange, product, year, month):
+    """
+    合约代码：郑商所年份只取一位（CZCE.SR601），其余交易所取两位（SHFE.rb2601）
+    """
+    year_code = f"{year % 10}" if exchange == "CZCE" else f"{year % 100:02d}"
+    return f"{exchange}.{product}{year_code}{month:02d}"
+
+
+class FakeApiError(Exception):
+    """
+    注入的查询失败，status 与 HTTP 状态码一致（429 表示限流）
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class _FakeRankingDataFrame(pd.DataFrame):
+    """
+    与 TqSymbolRankingDataFrame 一样：事件循环运行时先返回空表，查询结果为内部任务 _task 的返回值
+    """
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+
+class FakeTqApi:
+    """
+    模拟 TqApi 中本项目用到的接口：
+    query_symbol_ranking / query_quotes / get_quote / get_quote_list / get_kline_serial /
+    is_serial_ready / get_trading_calendar / create_task / wait_update / close
+    """
+
+    def __init__(self, ranking_source=None, latency=0.0, failure_rate=0.0, max_qps=None, seed=0):
+        self.ranking_source = ranking_source if ranking_source is not None else SyntheticRankingSource(seed=seed)
+        self.latency = float(latency)
+        self.failure_rate = float(failure_rate)
+        self.max_qps = max_qps
+        self._random = random.Random(seed)
+        self._loop = asyncio.new_event_loop()
+        self._request_times = []
+        self.query_count = 0
+        self._listing = None
+
+    # ---- 事件循环 -------------------------------------------------------
+    def create_task(self, coro, _caller_api=False):
+        return self._loop.create_task(coro)
+
+    def wait_update(self, deadline=None):
+        """
+        推进事件循环一小段时间；到达 deadline 返回 False
+        """
+        timeout = 0.01
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - time.time(), 0))
+        self._loop.run_until_complete(asyncio.sleep(timeout))
+        return deadline is None or time.time() < deadline
+
+    def close(self):
+        pending = [task for task in asyncio.all_tasks(self._loop) if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+    # ---- 持仓排名 -------------------------------------------------------
+    async def _respond(self, df, rows):
+        if self.latency > 0:
+            await asyncio.sleep(self._random.uniform(0.5, 1.5) * self.latency)
+        now = time.monotonic()
+        if self.max_qps:
+            self._request_times = [t for t in self._request_times if now - t < 1.0]
+            if len(self._request_times) >= self.max_qps:
+                raise FakeApiError("429 Too Many Requests", status=429)
+            self._request_times.append(now)
+        if self._random.random() < self.failure_rate:
+            raise FakeApiError("503 Service Unavailable (injected)", status=503)
+        # 与 tqsdk 一样由任务返回查询结果；为避免逐行填充的开销，直接返回新建的结果表
+        return _FakeRankingDataFrame(rows.reset_index(drop=True))
+
+    def query_symbol_ranking(self, symbol, ranking_type, days=1, start_dt=None, broker=None):
+        if ranking_type not in ['VOLUME', 'LONG', 'SHORT']:
+            raise Exception("ranking_type 参数只支持以下值： 'VOLUME', 'LONG', 'SHORT'。")
+        self.query_count += 1
+        rows = self.ranking_source.query(symbol, ranking_type, int(days), start_dt, broker)
+        df = _FakeRankingDataFrame(columns=RANKING_RESULT_COLUMNS)
+        task = self._loop.create_task(self._respond(df, rows))
+        if self._loop.is_running():
+            df.__dict__["_task"] = task
+            return df
+        return self._loop.run_until_complete(task)
+
+    # ---- 行情 / K线 -----------------------------------------------------
+    def get_kline_serial(self, symbol, duration_seconds, data_length=200):
+        calendar = get_trading_calendar()
+        days = calendar.last_n_trading_days(calendar.latest_data_day(), data_length)
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+        open_ = np.concatenate([[close[0]], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.005, len(days))) * close
+        return pd.DataFrame({
+            "datetime": [int(datetime.combine(d, datetime.min.time()).timestamp() * 1e9) for d in days],
+            "open": open_.round(3),
+            "high": (np.maximum(open_, close) + spread).round(3),
+            "low": (np.minimum(open_, close) - spread).round(3),
+            "close": close.round(3),
+            "volume": rng.integers(100000, 1000000, len(days)),
+            "open_oi": rng.integers(100000, 1000000, len(days)),
+            "close_oi": rng.integers(100000, 1000000, len(days)),
+            "symbol": symbol,
+            "duration": duration_seconds,
+        })
+
+    def is_serial_ready(self, serial):
+        return True
+
+    def get_quote(self, symbol):
+        kline = self.get_kline_serial(symbol, 86400, data_length=2)
+        last, prev = kline.iloc[-1], kline.iloc[0]
+        exchange, _, instrument = symbol.partition('.')
+        # 合成合约列表中的合约按活跃度缩放成交量/持仓量，远月合约无成交无持仓
+        activity = self._contract_listing().get(symbol, 1.0)
+        return SimpleNamespace(
+            instrument_id=symbol, instrument_name=instrument, exchange_id=exchange,
+            last_price=last["close"], open=last["open"], highest=last["high"], lowest=last["low"],
+            pre_close=prev["close"], volume=int(last["volume"] * activity),
+            amount=float(last["volume"] * activity * last["close"]),
+            open_interest=int(last["close_oi"] * activity),
+            datetime=datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+        )
+
+    def get_quote_list(self, symbols):
+        return [self.get_quote(symbol) for symbol in symbols]
+
+    # ---- 合约信息 -------------------------------------------------------
+    def _contract_listing(self):
+        """
+        合成的在市合约 {合约代码: 活跃度}：每个品种 FAKE_LISTED_MONTHS 个月份，
+        其中两个月份为主力（活跃度 1），其余为次要月份，最后三个月份尚无成交
+        """
+        if self._listing is None:
+            latest = get_trading_calendar().latest_data_day()
+            self._listing = {}
+            for exchange, products in FAKE_PRODUCTS.items():
+                for product in products:
+                    rng = random.Random(zlib.crc32(f"{exchange}.{product}".encode()))
+                    main_months = set(rng.sample(range(1, 6), 2))
+                    for offset in range(1, FAKE_LISTED_MONTHS + 1):
+                        year, month = divmod(latest.month - 1 + offset, 12)
+                        symbol = _fake_contract_symbol(exchange, product, latest.year + year, month + 1)
+                        if offset in main_months:
+                            activity = 1.0
+                        elif offset > FAKE_LISTED_MONTHS - 3:
+                            activity = 0.0
+                        else:
+                            activity = round(rng.uniform(0.01, 0.2), 4)
+                        self._listing[symbol] = activity
+        return self._listing
+
+    def query_quotes(self, ins_class=None, exchange_id=None, product_id=None, expired=None, has_night=None):
+        """
+        与 TqApi.query_quotes 一致：按交易所/品种筛选合约代码；合成列表中只有期货且都未到期
+        """
+        classes = [ins_class] if isinstance(ins_class, str) else (ins_class or ["FUTURE"])
+        if "FUTURE" not in classes or expired:
+            return []
+        exchanges = [exchange_id] if isinstance(exchange_id, str) else exchange_id
+        products = [product_id] if isinstance(product_id, str) else product_id
+        symbols = []
+        for symbol in self._contract_listing():
+            exchange, _, instrument = symbol.partition('.')
+            product = instrument.rstrip('0123456789')
+            if (exchanges is None or exchange in exchanges) and (products is None or product in products):
+                symbols.append(symbol)
+        return symbols
+
+    def get_trading_calendar(self, start_dt, end_dt):
+        calendar = get_trading_calendar()
+        days = pd.date_range(start_dt, end_dt, freq='D')
+        return pd.DataFrame({"date": days, "trading": [calendar.is_trading_day(d.date()) for d in days]})
+
+
+def _select_days(dates, days, start_dt):
+    """
+    按 tqsdk 语义选取日期：有 start_dt 时取其后的前 days 个，否则取最近 days 个
+    """
+    if start_dt is not None:
+        start = start_dt.strftime('%Y%m%d')
+        return [d for d in dates if d >= start][:days]
+    return dates[-days:]
+
+
+class ReplayRankingSource:
+    """
+    从已保存的排名CSV（宽表，含 ranking_type 列）回放查询结果
+    """
+
+    def __init__(self, paths):
+        frames = [pd.read_csv(path, encoding='utf-8-sig') for path in paths]
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=RANKING_RESULT_COLUMNS)
+        data['datetime'] = data['datetime'].astype(str).str.replace('-', '').str[:8]
+        data = data.drop_duplicates(subset=['ranking_type', 'datetime', 'symbol', 'broker'], keep='last')
+        self._groups = {key: group for key, group in data.groupby(['symbol', 'ranking_type'])}
+
+    def query(self, symbol, ranking_type, days, start_dt, broker):
+        group = self._groups.get((symbol, ranking_type))
+        if group is None:
+            return pd.DataFrame(columns=RANKING_RESULT_COLUMNS)
+        if broker is not None:
+            group = group[group['broker'] == broker]
+        selected = _select_days(sorted(set(group['datetime'])), days, start_dt)
+        rank_column = f"{ranking_type.lower()}_ranking"
+        rows = group[group['datetime'].isin(selected)]
+        return rows.sort_values(['datetime', rank_column])[RANKING_RESULT_COLUMNS]
+
+
+class SyntheticRankingSource:
+    """
+    按交易日历生成确定性的合成排名：每个合约/交易日 brokers 家公司，每种排名取前 top_n 名
+    """
+
+    def __init__(self, brokers=60, top_n=20, seed=0):
+        brokers = int(brokers)
+        names = SYNTHETIC_BROKERS[:brokers]
+        names += [f"Q期货{i:03d}" for i in range(len(names), brokers)]
+        self.brokers = names
+        self.top_n = int(top_n)
+        self.seed = int(seed)
+        self._cache = {}
+
+    def _day_table(self, symbol, day):
+        key = (symbol, day)
+        if key not in self._cache:
+            rng = np.random.default_rng([self.seed, zlib.crc32(f"{symbol}{day}".encode())])
+            n = len(self.brokers)
+            weights = 1.0 / np.arange(1, n + 1) ** 1.1
+            exchange, _, instrument = symbol.partition('.')
+            table = pd.DataFrame({
+                "datetime": day,
+                "symbol": symbol,
+                "exchange_id": exchange,
+                "instrument_id": instrument,
+                "broker": self.brokers,
+                "volume": np.round(rng.permutation(weights) * 2e6 * rng.uniform(0.5, 1.5)),
+                "long_oi": np.round(rng.permutation(weights) * 1e6 * rng.uniform(0.5, 1.5)),
+                "short_oi": np.round(rng.permutation(weights) * 1e6 * rng.uniform(0.5, 1.5)),
+            })
+            for field, change in (("volume", "volume_change"), ("long_oi", "long_change"), ("short_oi", "short_change")):
+                table[change] = np.round(table[field] * rng.normal(0, 0.1, n))
+                ranking = table[field].rank(ascending=False, method='first')
+                table[f"{'volume' if field == 'volume' else field[:-3]}_ranking"] = ranking.where(ranking <= self.top_n)
+            for field, rank in (("volume", "volume_ranking"), ("long_oi", "long_ranking"), ("short_oi", "short_ranking")):
+                change = "volume_change" if field == "volume" else f"{field[:-3]}_change"
+                table.loc[table[rank].isna(), [field, change]] = np.nan
+            self._cache[key] = table[RANKING_RESULT_COLUMNS]
+        return self._cache[key]
+
+    def query(self, symbol, ranking_type, days, start_dt, broker):
+        calendar = get_trading_calendar()
+        latest = calendar.latest_data_day()
+        if start_dt is not None:
+            selected = [d for d in calendar.first_n_trading_days(start_dt, days) if d <= latest]
+        else:
+            selected = calendar.last_n_trading_days(latest, days)
+        rank_column = f"{ranking_type.lower()}_ranking"
+        frames = []
+        for day in selected:
+            table = self._day_table(symbol, day.strftime('%Y%m%d'))
+            table = table[table[rank_column].notna()]
+            if broker is not None:
+                table = table[table['broker'] == broker]
+            frames.append(table.sort_values(rank_column))
+        if not frames:
+            return pd.DataFrame(columns=RANKING_RESULT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+def parse_fake_spec(spec):
+    """
+    解析 TQ_FAKE_API 取值，返回 FakeTqApi 的构造参数
+    """
+    head, *options = spec.split(';')
+    mode, _, paths = head.partition(':')
+    params = dict(option.split('=', 1) for option in options if '=' in option)
+    kwargs = {
+        'latency': float(params.pop('latency', 0)),
+        'failure_rate': float(params.pop('failure_rate', 0)),
+        'max_qps': int(params['max_qps']) if 'max_qps' in params else None,
+        'seed': int(params.get('seed', 0)),
+    }
+    params.pop('max_qps', None)
+    if mode == 'replay':
+        kwargs['ranking_source'] = ReplayRankingSource([p for p in paths.split(',') if p])
+    elif mode == 'synthetic':
+        kwargs['ranking_source'] = SyntheticRankingSource(
+            brokers=params.get('brokers', 60), top_n=params.get('top_n', 20), seed=kwargs['seed'])
+    else:
+        raise ValueError(f"未知的 TQ_FAKE_API 模式: {mode}（支持 replay / synthetic）")
+    return kwargs
+
+
+def create_api(username, password, fake=None):
+    """
+    创建 API 实例：fake（或环境变量 TQ_FAKE_API）非空时返回离线替身，否则连接快期服务器
+    """
+    fake = fake or os.environ.get('TQ_FAKE_API')
+    if fake:
+        print(f"[离线模式] 使用 FakeTqApi: {fake}")
+        return FakeTqApi(**parse_fake_spec(fake))
+    from tqsdk import TqApi, TqAuth
+    return TqApi(auth=TqAuth(username, password))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+断点续查日志
+
+每完成一个查询单元（期货公司, 合约, 排名类型, 日期区间）就把查询结果追加写入日志文件；
+运行中断后重新运行时，已完成的单元直接从日志恢复，只查询剩余部分。
+全部数据保存成功后日志被清除。
+"""
+
+import json
+import os
+
+import pandas as pd
+
+from ranking_schema import apply_ranking_schema
+
+
+class FetchJournal:
+    """
+    JSON Lines 格式的查询日志，每行对应一个已完成的查询单元
+    只恢复与本次运行相同数据日（最近一个已发布数据的交易日）写入的记录，避免误用过期数据
+    """
+
+    def __init__(self, filename, data_day):
+        self.filename = filename
+        self.data_day = data_day.isoformat()
+        self._completed = {}
+        self._load()
+
+    @staticmethod
+    def unit_key(unit):
+        start_dt = unit.start_dt.isoformat() if unit.start_dt is not None else None
+        return (unit.broker, unit.symbol, unit.ranking_type, start_dt, unit.days)
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        stale = 0
+        with open(self.filename, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时最后一行可能没写完整
+                    continue
+                if entry.get('data_day') != self.data_day:
+                    stale += 1
+                    continue
+                self._completed[tuple(entry['unit'])] = entry['rows']
+        if self._completed:
+            print(f"  [OK] 断点日志: {len(self._completed)} 个已完成的查询可恢复")
+        if stale:
+            print(f"  [WARN] 断点日志中 {stale} 条记录属于其他数据日，已忽略")
+
+    def __len__(self):
+        return len(self._completed)
+
+    def get(self, unit):
+        """
+        已完成单元的查询结果；未完成返回 None
+        """
+        rows = self._completed.get(self.unit_key(unit))
+        if rows is None:
+            return None
+        return apply_ranking_schema(pd.DataFrame(rows))
+
+    def record(self, unit, df):
+        """
+        追加一条完成记录并立即落盘
+        """
+        rows = json.loads(df.to_json(orient='records', force_ascii=False)) if len(df) > 0 else []
+        key = self.unit_key(unit)
+        entry = {'data_day': self.data_day, 'unit': list(key), 'rows': rows}
+        with open(self.filename, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._completed[key] = rows
+
+    def clear(self):
+        """
+        全部数据保存成功后删除日志
+        """
+        self._completed = {}
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多进程查询池
+
+单个 TqApi 只有一个事件循环，网络收发和 pandas 处理都挤在一个 CPU 上。查询池启动 N 个工作进程，
+每个进程在启动时创建自己的 TqApi 连接和请求层（限速为总限速的 1/N），之后复用到进程退出。
+
+查询单元按 (期货公司, 交易所, 品种) 分组提交，工作量大的组先提交；工作进程只负责查询并把结果
+交回主进程，断点日志、指标文件和所有数据文件都只由主进程写入，不会出现多个进程写同一个文件。
+"""
+
+import contextlib
+import io
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+
+import pandas as pd
+
+from run_metrics import RunMetrics
+
+# 工作进程内的状态：TqApi、请求层、并发上限（由 _init_worker 创建）
+_worker_state = None
+
+
+def _init_worker(username, password, fake_api, request_options, max_in_flight):
+    global _worker_state
+    from fake_tqapi import create_api
+    from query_ranking_to_csv import create_request_layer
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        api = create_api(username, password, fake_api)
+    # 工作进程退出时关闭连接
+    Finalize(api, api.close, exitpriority=10)
+    _worker_state = {
+        'api': api,
+        'layer': create_request_layer(**request_options),
+        'max_in_flight': max_in_flight,
+    }
+
+
+def _fetch_group(units):
+    """
+    在工作进程中查询一组单元
+    返回 (结果 {QueryUnit: DataFrame}, 重试用尽的单元, 请求层统计增量, 指标事件, 指标计数, 进程号)
+    """
+    from query_ranking_to_csv import fetch_units_concurrently
+
+    state = _worker_state
+    layer = state['layer']
+    before = dict(layer.stats)
+    metrics = RunMetrics(keep_events=True)
+    # 工作进程的进度输出会与其他进程交错，由主进程按组汇总打印
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = fetch_units_concurrently(state['api'], units, state['max_in_flight'], None, layer, metrics)
+    failed = layer.take_retry_queue()
+    layer.end_retry_round()
+    stats = {key: layer.stats[key] - before[key] for key in layer.stats}
+    return results, failed, stats, metrics.events, metrics.counters, os.getpid()
+
+
+def group_units(units):
+    """
+    按 (期货公司, 交易所, 品种) 分组，组内查询数多的排在前面
+    """
+    groups = defaultdict(list)
+    for unit in units:
+        groups[(unit.broker, unit.exchange, unit.product)].append(unit)
+    return sorted(groups.values(), key=lambda group: -sum(unit.days for unit in group))
+
+
+class FetchPool:
+    """
+    N 个工作进程，每个进程一个 TqApi 连接；fetch() 与 fetch_units_concurrently 的返回值一致
+    """
+
+    def __init__(self, workers, username, password, fake_api=None, request_options=None, max_in_flight=8):
+        self.workers = max(int(workers), 1)
+        request_options = dict(request_options or {})
+        # 总限速按进程平分，整体不超过服务器限速
+        request_options['rate_limit'] = request_options['rate_limit'] / self.workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(username, password, fake_api, request_options, max_in_flight),
+        )
+
+    def fetch(self, units, journal, layer, metrics):
+        """
+        分组并行查询；已在断点日志中的单元直接恢复，新完成的单元由主进程写入断点日志
+        工作进程中重试用尽的单元交给主进程的请求层，进入其重试队列
+        """
+        results = {}
+        pending = []
+        for unit in units:
+            restored = journal.get(unit) if journal is not None else None
+            if restored is not None:
+                results[unit] = restored
+                metrics.query(unit, 0.0, 0, len(restored), restored=True)
+            else:
+                pending.append(unit)
+        if len(pending) < len(units):
+            print(f"  从断点日志恢复 {len(units) - len(pending)} 个查询，剩余 {len(pending)} 个")
+        groups = group_units(pending)
+        if groups:
+            print(f"  {len(groups)} 组查询分配到 {self.workers} 个工作进程")
+        futures = {self.executor.submit(_fetch_group, group): group for group in groups}
+        for future in as_completed(futures):
+            group_results, failed, stats, events, counters, pid = future.result()
+            failed = set(failed)
+            for unit, df in group_results.items():
+                results[unit] = df
+                if journal is not None and unit not in failed:
+                    journal.record(unit, df)
+            for unit in failed:
+                layer.give_up(unit)
+            # 重试队列/最终失败由主进程的请求层计数
+            for key, value in stats.items():
+                if key not in ('requeued', 'final_failures'):
+                    layer.stats[key] += value
+            metrics.merge(events, counters)
+            unit = futures[future][0]
+            rows = sum(len(df) for df in group_results.values())
+            print(f"    [{'WARN' if failed else 'OK'}] 进程 {pid}: {unit.exchange}.{unit.product}"
+                  + (f" ({unit.broker})" if unit.broker else "")
+                  + f" {len(group_results)} 个查询，{rows} 条数据"
+                  + (f"，{len(failed)} 个失败" if failed else ""))
+        return {unit: results.get(unit, pd.DataFrame()) for unit in units}
+
+    def close(self):
+        self.executor.shutdown()
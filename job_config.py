@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量任务配置
+
+一个配置文件（TOML，安装 PyYAML 后也支持 YAML）定义多个查询任务，每个任务有自己的
+合约列表（或自动发现活跃合约的品种列表）、期货公司、查询窗口和存储后端；所有任务在同一进程中共用一个 TqApi 连接运行。
+
+示例（jobs.toml）：
+
+    [run]
+    parallel_jobs = 2          # 同时查询的任务数（同一批任务的查询混合并发，共用并发上限）
+    max_in_flight = 8
+    rate_limit = 20
+
+    [defaults]                 # 各任务的默认值
+    days = 100
+    brokers = ["D东证期货", "G国泰君安"]
+    storage = "csv"
+
+    [[jobs]]
+    name = "rb"
+    symbols = ["SHFE.rb2601", "SHFE.rb2605"]
+
+    [[jobs]]
+    name = "m"
+    products = ["DCE.m"]       # 自动发现活跃合约：持仓量最大的 top_k 个月份
+    top_k = 2
+    brokers = []               # 全市场
+    start_dt = 2025-01-02
+    output_dir = "data/dce"
+
+账户信息不写在配置文件中：依次读取环境变量 TQ_USERNAME / TQ_PASSWORD，
+以及 keyring 中服务名为 tqsdk 的密码（需要 pip install keyring）。
+"""
+
+import os
+from collections import namedtuple
+from datetime import date
+
+from contract_discovery import parse_product
+
+# 一个查询任务；storage_options 传给 ranking_storage.create_storage
+# products 为自动发现活跃合约的品种（"SHFE.rb"），top_k 为每个品种选取的合约数（配置中写 "all" 为全部活跃月份）
+Job = namedtuple(
+    'Job',
+    ['name', 'symbols', 'days', 'start_dt', 'brokers', 'split_from_full_market',
+     'incremental_fetch', 'storage_backend', 'storage_options', 'products', 'top_k'],
+    defaults=[(), None]
+)
+
+# 任务配置中允许出现的键
+JOB_KEYS = {
+    'name', 'symbols', 'products', 'top_k', 'days', 'start_dt', 'brokers', 'split_from_full_market',
+    'incremental_fetch', 'storage', 'output_dir', 'parquet_dir', 'normalized_dir', 'sqlite_path',
+    'segments_dir', 'compact_after', 'export_csv', 'summary_dir', 'shard_dir', 'ledger_dir',
+    'shard_keep_months', 'keep_generations',
+}
+
+# [run] 中允许出现的键
+RUN_KEYS = {
+    'parallel_jobs', 'fetch_workers', 'max_in_flight', 'rate_limit', 'retry_attempts', 'retry_base_delay',
+    'query_timeout', 'journal_file', 'metrics_file', 'fake_api', 'username', 'contract_cache_file',
+    'sweep_exchanges', 'sweep_workers', 'sweep_summary_file',
+}
+
+KEYRING_SERVICE = "tqsdk"
+
+
+def _read_config_file(path):
+    """
+    按扩展名读取 TOML / YAML 配置文件
+    """
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("读取 YAML 配置需要安装 PyYAML: pip install pyyaml")
+        with open(path, encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError("Python 3.11 以下读取 TOML 配置需要安装 tomli: pip install tomli")
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def _parse_date(value, name):
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"任务 {name} 的 start_dt 不是有效日期: {value!r}")
+
+
+def parse_job(raw, defaults, index):
+    """
+    由配置中的一个任务（已合并 defaults）构造 Job
+    """
+    merged = dict(defaults)
+    merged.update(raw)
+    name = str(merged.get('name') or f"job{index + 1}")
+    unknown = set(merged) - JOB_KEYS
+    if unknown:
+        raise ValueError(f"任务 {name} 中有未知配置项: {sorted(unknown)}")
+    symbols = merged.get('symbols') or []
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    products = merged.get('products') or []
+    if isinstance(products, str):
+        products = [products]
+    for spec in products:
+        parse_product(spec)
+    top_k = merged.get('top_k', 3)
+    brokers = merged.get('brokers')
+    output_dir = merged.get('output_dir', '.')
+    storage_options = {
+        'csv_directory': output_dir,
+        'parquet_dir': merged.get('parquet_dir', os.path.join(output_dir, 'ranking_parquet')),
+        'normalized_dir': merged.get('normalized_dir', os.path.join(output_dir, 'ranking_facts')),
+        'sqlite_path': merged.get('sqlite_path', os.path.join(output_dir, 'ranking_history.sqlite3')),
+        'segments_dir': merged.get('segments_dir', os.path.join(output_dir, 'ranking_segments')),
+        'compact_after': int(merged.get('compact_after', 30)),
+        # 不填为按后端默认（segments 不导出，其他后端导出）
+        'export_csv': None if merged.get('export_csv') is None else bool(merged['export_csv']),
+        'keep_generations': int(merged.get('keep_generations', 2)),
+        # 设为 "" 不生成排行榜汇总
+        'summary_dir': merged.get('summary_dir', os.path.join(output_dir, 'summaries')),
+        # 设为 "" 不生成月度分片
+        'shard_dir': merged.get('shard_dir', os.path.join(output_dir, 'shards')),
+        # 分片只保留最近的月份数，0 为全部保留
+        'shard_keep_months': int(merged.get('shard_keep_months', 36)) or None,
+        # 设为 "" 不记录已查询日期（增量查询只按现有数据判断）
+        'ledger_dir': merged.get('ledger_dir', os.path.join(output_dir, 'query_ledger')),
+    }
+    return Job(
+        name=name,
+        symbols=list(symbols),
+        products=list(products),
+        top_k=None if top_k in (None, 'all') else int(top_k),
+        days=int(merged.get('days', 100)),
+        start_dt=_parse_date(merged.get('start_dt'), name),
+        brokers=list(brokers) if brokers else [],
+        split_from_full_market=bool(merged.get('split_from_full_market', False)),
+        incremental_fetch=bool(merged.get('incremental_fetch', True)),
+        storage_backend=merged.get('storage', 'csv'),
+        storage_options=storage_options,
+    )
+
+
+def load_config(path):
+    """
+    读取批量任务配置文件，返回 (run 设置 dict, [Job, ...])
+    """
+    config = _read_config_file(path)
+    run = _read_run_settings(config)
+    defaults = config.get('defaults') or {}
+    raw_jobs = config.get('jobs') or []
+    if not raw_jobs:
+        raise ValueError(f"配置文件 {path} 中没有定义任何任务（[[jobs]]）")
+    jobs = [parse_job(raw, defaults, i) for i, raw in enumerate(raw_jobs)]
+    names = [job.name for job in jobs]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"任务名重复: {duplicated}")
+    return run, jobs
+
+
+def _read_run_settings(config):
+    run = dict(config.get('run') or {})
+    unknown = set(run) - RUN_KEYS
+    if unknown:
+        raise ValueError(f"[run] 中有未知配置项: {sorted(unknown)}")
+    return run
+
+
+def load_sweep_config(path):
+    """
+    全市场扫描使用的配置：返回 (run 设置 dict, 由 [defaults] 构造的模板 Job)
+    模板中的合约/品种列表不使用，由扫描时发现的活跃合约代替
+    """
+    config = _read_config_file(path)
+    run = _read_run_settings(config)
+    template = parse_job({'name': 'sweep'}, config.get('defaults') or {}, 0)
+    return run, template
+
+
+def resolve_credentials(username=None, password=None):
+    """
+    账户信息：环境变量 TQ_USERNAME / TQ_PASSWORD 优先，其次 keyring，最后使用传入的默认值
+    """
+    username = os.environ.get('TQ_USERNAME') or username
+    env_password = os.environ.get('TQ_PASSWORD')
+    if env_password:
+        return username, env_password
+    if username:
+        try:
+            import keyring
+        except ImportError:
+            keyring = None
+        if keyring is not None:
+            stored = keyring.get_password(KEYRING_SERVICE, username)
+            if stored:
+                return username, stored
+    return username, password
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+已查询交易日记录
+
+增量查询按现有数据判断缺失的交易日，但某期货公司不在某日排名表中时查询结果为空、数据中没有该日，
+只看数据会把这些日期当作缺失每次重新查询。这里在数据保存后记录每个查询单元已查询过的交易日
+（包括无数据的日期），规划时与现有数据一起视为已覆盖。只记录不晚于查询实际返回的最新交易日的日期
+（见 query_ranking_to_csv.record_queried_days），发布前查询得到的空结果不会让最新交易日被当作已查询：
+
+    {ledger_dir}/SHFE_rb.json    {"D东证期货": {"SHFE.rb2601|LONG": [20250828, 20250829, ...]}, "": {...}}
+
+顶层键为期货公司（"" 为全市场）。只保留查询窗口内的日期，文件大小不随历史增长。
+"""
+
+import json
+import os
+
+from atomic_io import atomic_write_json
+
+# 全市场输出在记录中的键
+MARKET_KEY = ''
+
+
+class QueryLedger:
+    """
+    按品种保存的已查询交易日（YYYYMMDD 整数），每个品种一个 JSON 文件
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, exchange, product):
+        return os.path.join(self.directory, f"{exchange}_{product}.json")
+
+    def _read(self, exchange, product):
+        path = self.path(exchange, product)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print(f"  [WARN] 已查询日期记录 {path} 无法读取，将按现有数据规划查询")
+            return {}
+
+    def load(self, exchange, product, broker=None):
+        """
+        某个输出已查询过的交易日 {(合约, 排名类型): set(YYYYMMDD)}，格式与 get_date_coverage 相同
+        """
+        entries = self._read(exchange, product).get(broker or MARKET_KEY, {})
+        return {tuple(key.split('|', 1)): set(days) for key, days in entries.items()}
+
+    def record(self, exchange, product, queried, keep_from=None):
+        """
+        追加记录 queried: {(期货公司, 合约, 排名类型): 交易日集合}，并删除早于 keep_from 的日期
+        """
+        data = self._read(exchange, product)
+        for (broker, symbol, ranking_type), days in queried.items():
+            entries = data.setdefault(broker or MARKET_KEY, {})
+            key = f"{symbol}|{ranking_type}"
+            entries[key] = set(entries.get(key, [])) | set(days)
+        for entries in data.values():
+            for key in list(entries):
+                days = sorted(day for day in entries[key] if keep_from is None or day >= keep_from)
+                if days:
+                    entries[key] = days
+                else:
+                    del entries[key]
+        atomic_write_json(self.path(exchange, product), data, indent=None)
@@ -7,20 +7,41 @@
 1. 在下方【配置区域】填写你的查询参数
 2. 直接运行脚本即可
 3. 数据会自动增量更新到按品种命名的CSV文件中
+
+批量运行：python query_ranking_to_csv.py --config jobs.toml [--job 任务名] [--parallel-jobs N]
+全市场扫描：python query_ranking_to_csv.py --sweep [--workers N] [--exchanges SHFE,DCE]
+配置文件格式见 job_config.py；账户信息可通过环境变量 TQ_USERNAME / TQ_PASSWORD 提供
 """
 
-from datetime import date, timedelta
-from tqsdk import TqApi, TqAuth
+from datetime import date
+import asyncio
+import contextlib
 import os
 import re
+import time
 import pandas as pd
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from trading_calendar import get_trading_calendar
+from fetch_journal import FetchJournal
+from query_ledger import QueryLedger
+from request_layer import RequestLayer
+from run_metrics import RunMetrics, path_size
+from job_config import Job, load_config, load_sweep_config, resolve_credentials
+from contract_discovery import ContractDiscovery
+from fake_tqapi import create_api
+from ranking_schema import apply_ranking_schema, concat_rankings, date_int
+from ranking_storage import create_storage, normalize_datetime, upsert_rows
+from cross_period import write_cross_period
+from data_shards import write_catalog, write_shards
+from ranking_summary import write_summaries
+# 兼容原有用法：CSV 读写/合并函数已移到 ranking_storage，仍可从本模块导入
+from ranking_storage import get_csv_filename, load_existing_data, merge_and_deduplicate  # noqa: F401
 
 # ============================================================================
 # 【配置区域】请在此处填写你的查询参数
 # ============================================================================
 
-# 【必填】快期账户信息
+# 【必填】快期账户信息（环境变量 TQ_USERNAME / TQ_PASSWORD 或 keyring 中的密码优先）
 USERNAME = "chaos123"  # 填写你的快期账户邮箱
 PASSWORD = "123456"   # 填写你的快期账户密码
 
@@ -38,12 +59,27 @@ SYMBOLS = [
     # "DCE.m2401",
 ]
 
+# 【可选】自动发现活跃合约的品种列表，格式：{交易所}.{品种}，例如 "SHFE.rb", "CZCE.SR"
+# 运行时列出这些品种当前在市的合约，按持仓量/成交量排序，取前 ACTIVE_TOP_K 个（None 为全部有持仓的月份），
+# 与 SYMBOLS 合并后查询；结果按交易日缓存在 CONTRACT_CACHE_FILE 中，当天重复运行不再查询
+PRODUCTS = []
+ACTIVE_TOP_K = 3
+CONTRACT_CACHE_FILE = "contract_cache.json"
+
+# 【可选】全市场扫描（python query_ranking_to_csv.py --sweep）
+# 列出 SWEEP_EXCHANGES（None 为六个期货交易所）全部品种的活跃合约（每个品种取 ACTIVE_TOP_K 个），
+# 按交易所分片到 SWEEP_WORKERS 个进程并行查询，各品种分别保存，运行摘要写入 SWEEP_SUMMARY_FILE
+SWEEP_EXCHANGES = None
+SWEEP_WORKERS = 4
+SWEEP_SUMMARY_FILE = "sweep_summary.json"
+
 # 【必填】查询天数
 DAYS = 100  # 返回最近N个交易日的数据，必须 >= 1
 
 # 【可选】开始日期
 # 如果填写，则返回从该日期起N个交易日的数据
 # 如果为 None，则自动使用上一个交易日作为开始日期（排除当日）
+# 必须在 trading_calendar.json 节假日表覆盖的年份内（当前为 2020 ~ 2026 年）
 START_DT = None  # 例如: date(2024, 1, 1) 或 None
 
 # 【可选】期货公司列表（一次运行为多个公司分别拉取并保存）
@@ -59,6 +95,102 @@ BROKERS = [
     # 可继续添加: "X新湖期货", "J建信期货", ...
 ]
 
+# 【可选】并发查询数量上限
+# 所有 (期货公司, 合约, 排名类型) 查询共用同一个 TqApi 连接并发发出，
+# 同一时刻最多有 MAX_IN_FLIGHT 个查询在途；设为 1 即退化为逐个串行查询
+MAX_IN_FLIGHT = 8
+
+# 【可选】查询进程数
+# 大于 1 时启动 FETCH_WORKERS 个工作进程，每个进程一个 TqApi 连接、并发上限 MAX_IN_FLIGHT，
+# 查询按 (期货公司, 品种) 分组分配；QUERY_RATE_LIMIT 为所有进程合计的限速。
+# 合并与写文件只在主进程进行。1 为在本进程内查询
+FETCH_WORKERS = 1
+
+# 【可选】由全市场数据拆分各期货公司文件
+# True：每个合约/排名类型只查询一次全市场数据，在本地按 broker 列拆分出 SHFE_rb_公司名.csv，
+#       同时保存全市场 SHFE_rb.csv；仅当某公司不在该排名表中时才单独按公司补查
+# False：按 BROKERS 列表逐家查询（原有方式）
+SPLIT_FROM_FULL_MARKET = False
+
+# 【可选】增量查询
+# True：先读取现有CSV中每个 (合约, 排名类型, 期货公司) 已有的交易日，
+#       只查询查询窗口（DAYS 个交易日）内缺失的日期区间，并在联网前打印查询计划
+# False：每次都完整查询 DAYS 个交易日
+INCREMENTAL_FETCH = True
+
+# 【可选】增量查询的规划参数
+# QUERY_LEDGER_DIR：记录每个查询已查询过的交易日（包括无数据的日期，如期货公司未进入当日排名），
+#                   之后不再当作缺失重复查询；设为 None 则只按现有数据判断
+# QUERY_OVERHEAD_DAYS：一次查询的固定开销折合的交易日数。两段缺失区间之间已有数据的交易日
+#                      不超过该值时合并为一次查询；各区间的总开销不少于完整查询时改为一次完整查询
+QUERY_LEDGER_DIR = "query_ledger"
+QUERY_OVERHEAD_DAYS = 5
+
+# 【可选】断点续查日志
+# 每个查询完成后立即把结果写入该文件；运行中断后重新运行会跳过已完成的查询，
+# 全部数据保存成功后自动删除。设为 None 关闭
+JOURNAL_FILE = "fetch_journal.jsonl"
+
+# 【可选】请求限速与重试
+# QUERY_RATE_LIMIT：每秒最多发出的查询数（遇到限流自动降速，成功后逐步回升）
+# RETRY_ATTEMPTS：单个查询的最大尝试次数，失败间隔按 RETRY_BASE_DELAY * 2^n 秒随机抖动退避
+# 仍失败的查询进入重试队列，在本次运行的查询全部结束后再统一重试一轮
+# QUERY_TIMEOUT：单次查询的超时时间（秒）
+QUERY_RATE_LIMIT = 20
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+QUERY_TIMEOUT = 30
+
+# 【可选】离线模式：不连接服务器，使用 fake_tqapi.FakeTqApi 回放录制数据或生成合成数据
+# 例如 "replay:SHFE_rb.csv" 或 "synthetic;latency=0.05;failure_rate=0.02"，也可用环境变量 TQ_FAKE_API
+FAKE_API = None
+
+# 【可选】运行指标
+# 各阶段耗时、查询延迟、行数、写入字节数、重试次数等以 JSON Lines 追加写入该文件
+# （与 CSV 同目录），用于发现慢的期货公司/合约和不断增长的合并开销；设为 None 则不记录
+METRICS_FILE = "ranking_metrics.jsonl"
+
+# 是否在终端打印进度信息；定时任务中可设为 False（或使用 --quiet），只保留指标文件
+PRINT_PROGRESS = True
+
+# 【可选】存储后端
+# "csv"：每个品种/期货公司一个CSV文件（网页直接读取）
+# "parquet"：按 交易所/品种/交易日 分区的 Parquet 数据集（需要 pip install pyarrow），
+#            每次只写入新增交易日的分区
+# "normalized"：每个 (日期, 合约, 期货公司) 只存一行 + 入榜标记，保存在 NORMALIZED_DIR
+# "sqlite"：本地 SQLite 数据库 SQLITE_PATH（WAL 模式），按去重键 upsert
+# "segments"：每次运行只追加按交易日划分的分段文件（SEGMENTS_DIR），
+#             每个数据集积累 COMPACT_AFTER 个分段后压缩进基础文件
+# 非 csv 后端在 EXPORT_CSV 为 True 时同时导出原有格式的CSV供网页使用；None 为按后端默认：
+# parquet/normalized/sqlite 导出，segments 不导出。导出的 CSV 每晚都要追加或重写整份品种文件
+# （有覆盖更新时重写全部历史，版本目录中另有一份完整副本），segments 只写新数据的好处随之抵消；
+# segments 不导出时网页使用月度分片（SHARD_DIR）和预计算汇总
+STORAGE_BACKEND = "csv"
+PARQUET_DIR = "ranking_parquet"
+NORMALIZED_DIR = "ranking_facts"
+SQLITE_PATH = "ranking_history.sqlite3"
+SEGMENTS_DIR = "ranking_segments"
+COMPACT_AFTER = 30
+EXPORT_CSV = None
+
+# 【可选】CSV 版本目录 generations/ 保留的版本数（含当前版本），更早的版本在发布新版本时删除
+# 版本目录供直接从数据目录提供网页的服务器使用，不需要提交到 Git（见 DEPLOY.md）
+KEEP_GENERATIONS = 2
+
+# 【可选】持仓排行榜预计算汇总
+# 每次合并全市场数据后，为新数据涉及的每个 (合约, 交易日) 写一个汇总 JSON（五张排名表及合计），
+# 以及每个交易日的跨期（合约 × 期货公司）持仓矩阵，
+# 网页直接渲染而不必在浏览器中解析整份历史；设为 None 则不生成
+SUMMARY_DIR = "summaries"
+
+# 【可选】按月分片的静态数据
+# 每次合并全市场数据后，把新数据涉及的月份写成 SHARD_DIR/{交易所_品种}/{YYYYMM}.csv，
+# 并更新 SHARD_DIR/manifest.json（品种、合约、交易日、分片路径/大小/哈希），
+# 网页只加载所选日期需要的几个月，不再下载整份历史；设为 None 则不生成
+SHARD_DIR = "shards"
+# 分片只保留最近的月份数，网页可选的日期随之限定在这段时间内（更早的数据仍在品种 CSV 中）；设为 None 则全部保留
+SHARD_KEEP_MONTHS = 36
+
 # ============================================================================
 # 以下代码无需修改
 # ============================================================================
@@ -67,22 +199,24 @@ BROKERS = [
 def get_previous_trading_day(today=None):
     """
     计算上一个交易日（排除当日）
-    简单实现：如果是周一，往前推3天；否则往前推1天
+    按交易日历跳过周末和交易所节假日
     """
     if today is None:
         today = date.today()
-    
-    # 获取今天是星期几（0=周一, 6=周日）
-    weekday = today.weekday()
-    
-    if weekday == 0:  # 周一，上一个交易日是上周五
-        previous_day = today - timedelta(days=3)
-    elif weekday == 6:  # 周日，上一个交易日是上周五
-        previous_day = today - timedelta(days=2)
-    else:  # 周二到周六，上一个交易日是昨天
-        previous_day = today - timedelta(days=1)
-    
-    return previous_day
+    return get_trading_calendar().previous_trading_day(today)
+
+
+def get_trading_day_window(days, start_dt=None, now=None):
+    """
+    计算查询窗口内的交易日列表（升序）
+    start_dt 为 None 时：截止到最近一个已发布数据的交易日的最近 days 个交易日
+    否则：从 start_dt 起的 days 个交易日（不晚于最近一个已发布数据的交易日）
+    """
+    calendar = get_trading_calendar()
+    latest = calendar.latest_data_day(now)
+    if start_dt is None:
+        return calendar.last_n_trading_days(latest, days)
+    return [day for day in calendar.first_n_trading_days(start_dt, days) if day <= latest]
 
 
 def extract_product_code(symbol):
@@ -91,7 +225,8 @@ def extract_product_code(symbol):
     例如：SHFE.rb2601 -> rb
     """
     # 匹配格式：交易所.品种月份
-    match = re.match(r'^([A-Z]+)\.([a-z]+)(\d+)$', symbol)
+    # 郑商所、中金所的品种代码为大写，例如 CZCE.SR601、CFFEX.IF2601
+    match = re.match(r'^([A-Z]+)\.([A-Za-z]+)(\d+)$', symbol)
     if match:
         exchange = match.group(1)
         product = match.group(2)
@@ -99,140 +234,371 @@ def extract_product_code(symbol):
     return None, None
 
 
-def get_csv_filename(exchange, product, broker=None):
+# 一个查询单元：对应一次 api.query_symbol_ranking 调用
+QueryUnit = namedtuple(
+    'QueryUnit',
+    ['broker', 'exchange', 'product', 'symbol', 'ranking_type', 'type_name', 'days', 'start_dt']
+)
+
+
+def build_query_units(symbols_by_product, ranking_types, broker_list, days, start_dt):
     """
-    生成CSV文件名：{交易所}_{品种}.csv
-    例如：SHFE_rb.csv
+    按 期货公司 -> 品种 -> 合约 -> 排名类型 的顺序展开全部查询单元
     """
-    if broker:
-        broker_clean = re.sub(r'[\\/:*?"<>|\s]+', '_', broker.strip())
-        return f"{exchange}_{product}_{broker_clean}.csv"
-    return f"{exchange}_{product}.csv"
+    days = max(int(days), 1)  # tqsdk 要求 days 为 int
+    units = []
+    for broker in broker_list:
+        for (exchange, product), symbols in symbols_by_product.items():
+            for symbol in symbols:
+                for ranking_type, type_name in ranking_types:
+                    units.append(QueryUnit(broker, exchange, product, symbol,
+                                           ranking_type, type_name, days, start_dt))
+    return units
 
 
-def load_existing_data(filename):
+def _to_ranking_df(df, ranking_type, type_name):
     """
-    加载现有的CSV数据（如果存在）
+    将查询结果转为普通 DataFrame，补充 ranking_type / ranking_type_name 列，并统一列类型（见 ranking_schema）
     """
-    if os.path.exists(filename):
-        try:
-            df = pd.read_csv(filename, encoding='utf-8-sig')
-            print(f"  [OK] 加载现有数据: {len(df)} 条记录")
-            return df
-        except Exception as e:
-            print(f"  [WARN] 加载现有数据失败: {e}，将创建新文件")
-            return pd.DataFrame()
-    return pd.DataFrame()
+    # 转为普通 DataFrame，避免 TqSymbolRankingDataFrame 子类在 concat 时出问题
+    df = pd.DataFrame(df.copy())
+    if len(df) > 0:
+        df['ranking_type'] = ranking_type
+        df['ranking_type_name'] = type_name
+    return apply_ranking_schema(df)
 
 
-def merge_and_deduplicate(old_df, new_df):
+async def _query_unit_once(api, unit):
     """
-    合并新旧数据并去重
-    去重规则：ranking_type, datetime, symbol, broker 相同的记录只保留一条（保留新的）
+    发出一次查询并等待结果（在途数量由请求层的 slot 限制，最多 MAX_IN_FLIGHT 个）
     """
-    if old_df.empty:
-        return new_df
-    
-    if new_df.empty:
-        return old_df
-    
-    # 合并数据
-    combined = pd.concat([old_df, new_df], ignore_index=True)
-    
-    # 去重：保留最新的记录
-    # 使用 ranking_type, datetime, symbol, broker 作为唯一键
-    key_columns = ['ranking_type', 'datetime', 'symbol', 'broker']
-    
-    # 确保所有必需的列都存在
-    for col in key_columns:
-        if col not in combined.columns:
-            print(f"  [WARN] 警告：数据中缺少列 '{col}'，无法去重")
-            return combined
-    
-    # 统一 datetime 为字符串 YYYYMMDD，避免 str/int 混用导致排序报错
-    if 'datetime' in combined.columns:
-        combined['datetime'] = combined['datetime'].astype(str).str.replace('-', '').str[:8]
-    # 按日期排序，确保最新的数据在后面
-    if 'datetime' in combined.columns:
-        combined = combined.sort_values('datetime', ascending=True)
+    # 事件循环运行时 query_symbol_ranking 立即返回，查询结果由其内部任务异步填充
+    df = api.query_symbol_ranking(
+        symbol=unit.symbol,
+        ranking_type=unit.ranking_type,
+        days=unit.days,
+        start_dt=unit.start_dt,
+        broker=unit.broker
+    )
+    task = df.__dict__.get("_task")
+    if task is not None:
+        # tqsdk 的查询任务完成后返回填充好的 DataFrame
+        df = await task
+    return df
+
+
+async def _fetch_unit(api, unit, semaphore, layer, results, journal=None, metrics=None):
+    """
+    在 TqApi 事件循环中执行单个查询单元（经请求层限速、重试）
+    """
+    label = f"{unit.symbol} 的 {unit.type_name}" + (f" ({unit.broker})" if unit.broker else "")
+    attempts = 0
     
-    # 去重，保留最后一条（最新的）
-    combined = combined.drop_duplicates(subset=key_columns, keep='last')
+    def request():
+        nonlocal attempts
+        attempts += 1
+        return _query_unit_once(api, unit)
     
-    return combined
+    start = time.perf_counter()
+    try:
+        print(f"    正在查询 {label}...")
+        df = await layer.call(request, semaphore)
+        df = _to_ranking_df(df, unit.ranking_type, unit.type_name)
+        if len(df) > 0:
+            print(f"      [OK] {label} 查询完成，共 {len(df)} 条数据")
+        else:
+            print(f"      [WARN] {label} 查询完成，但无数据")
+        results[unit] = df
+        if metrics is not None:
+            metrics.query(unit, time.perf_counter() - start, attempts, len(df))
+        if journal is not None:
+            journal.record(unit, df)
+    except Exception as e:
+        print(f"      [FAIL] {label} 查询失败（已尝试 {layer.max_attempts} 次）: {e!r}")
+        layer.give_up(unit)
+        results[unit] = pd.DataFrame()
+        if metrics is not None:
+            metrics.query(unit, time.perf_counter() - start, attempts, 0, failed=True)
 
 
-def query_symbol_data(api, symbol, ranking_types, days, start_dt, broker):
+def create_request_layer(rate_limit=None, retry_attempts=None, retry_base_delay=None, query_timeout=None):
     """
-    查询单个合约的所有排名数据
+    按配置创建请求层；未传入的参数使用【配置区域】中的默认值
     """
-    all_dfs = []
-    days = int(days)  # tqsdk 要求 days 为 int
-    if days < 1:
-        days = 1
+    return RequestLayer(
+        rate=rate_limit if rate_limit is not None else QUERY_RATE_LIMIT,
+        max_attempts=retry_attempts if retry_attempts is not None else RETRY_ATTEMPTS,
+        base_delay=retry_base_delay if retry_base_delay is not None else RETRY_BASE_DELAY,
+        timeout=query_timeout if query_timeout is not None else QUERY_TIMEOUT,
+    )
 
-    for ranking_type, type_name in ranking_types:
+
+def fetch_units_concurrently(api, units, max_in_flight=MAX_IN_FLIGHT, journal=None, layer=None, metrics=None):
+    """
+    复用同一个 TqApi 连接并发执行全部查询单元
+    journal 中已完成的单元直接恢复，新完成的单元写入 journal
+    layer 为请求层（限速、重试、统计），不传则新建一个
+    metrics 为 RunMetrics，记录每个查询单元的耗时、尝试次数和行数
+    返回 {QueryUnit: DataFrame}，顺序与 units 一致；失败或无数据的单元对应空 DataFrame
+    """
+    results = {}
+    if not units:
+        return results
+    if layer is None:
+        layer = create_request_layer()
+    pending = []
+    for unit in units:
+        restored = journal.get(unit) if journal is not None else None
+        if restored is not None:
+            results[unit] = restored
+            if metrics is not None:
+                metrics.query(unit, 0.0, 0, len(restored), restored=True)
+        else:
+            pending.append(unit)
+    if len(pending) < len(units):
+        print(f"  从断点日志恢复 {len(units) - len(pending)} 个查询，剩余 {len(pending)} 个")
+    semaphore = asyncio.Semaphore(max(int(max_in_flight), 1))
+    tasks = [api.create_task(_fetch_unit(api, unit, semaphore, layer, results, journal, metrics))
+             for unit in pending]
+    while not all(task.done() for task in tasks):
         try:
-            print(f"    正在查询 {symbol} 的 {type_name}...")
-            df = api.query_symbol_ranking(
-                symbol=symbol,
-                ranking_type=ranking_type,
-                days=days,
-                start_dt=start_dt,
-                broker=broker
-            )
-            # 转为普通 DataFrame，避免 TqSymbolRankingDataFrame 子类在 concat 时出问题
-            df = pd.DataFrame(df.copy())
-            if len(df) > 0:
-                df['ranking_type'] = ranking_type
-                df['ranking_type_name'] = type_name
-                all_dfs.append(df)
-                print(f"      [OK] {type_name} 查询完成，共 {len(df)} 条数据")
-            else:
-                print(f"      [WARN] {type_name} 查询完成，但无数据")
+            api.wait_update()
         except Exception as e:
-            print(f"      [FAIL] {type_name} 查询失败: {e}")
-            import traceback
-            traceback.print_exc()
-
-    if all_dfs:
-        combined = pd.concat(all_dfs, ignore_index=True)
-        cols = ['ranking_type', 'ranking_type_name'] + \
-               [col for col in combined.columns if col not in ['ranking_type', 'ranking_type_name']]
-        combined = combined[cols]
+            # tqsdk 把下载任务的异常（如 HTTP 429）从 wait_update 抛出；
+            # 对应查询会因超时由请求层重试，这里只计入统计并继续
+            print(f"      [WARN] 查询过程中出现异常: {e!r}")
+            layer.record_error(e)
+    return {unit: results.get(unit, pd.DataFrame()) for unit in units}
+
+
+def get_date_coverage(df):
+    """
+    统计现有数据中每个 (合约, 排名类型) 已有的交易日集合（YYYYMMDD 整数）
+    """
+    coverage = defaultdict(set)
+    if df.empty or not {'symbol', 'ranking_type', 'datetime'}.issubset(df.columns):
+        return coverage
+    dates = normalize_datetime(df['datetime'])
+    for (symbol, ranking_type), group in dates.groupby([df['symbol'], df['ranking_type']], observed=True):
+        coverage[(symbol, ranking_type)] = set(group.tolist())
+    return coverage
+
+
+def merge_coverage(*coverages):
+    """
+    合并多个 get_date_coverage 格式的日期覆盖（如现有数据与已查询日期记录）
+    """
+    merged = defaultdict(set)
+    for coverage in coverages:
+        for key, dates in coverage.items():
+            merged[key] |= set(dates)
+    return merged
+
+
+def plan_incremental_units(units, coverage_by_broker, window, coverage_brokers=None,
+                           overhead_days=QUERY_OVERHEAD_DAYS):
+    """
+    根据现有数据的日期覆盖情况，把每个查询单元拆成只覆盖缺失交易日的若干区间
+    coverage_by_broker: {(交易所, 品种, 期货公司): get_date_coverage 的结果}
+    coverage_brokers: 全市场单元（broker=None）需要同时满足的输出列表（拆分模式下为全市场+各公司）
+    overhead_days: 一次查询的固定开销折合的交易日数；间隔不超过该值的缺失区间合并，
+                   各区间开销之和（每个区间 overhead_days + 天数）不少于完整查询时保留原单元
+    返回新的查询单元列表，每个单元的 start_dt/days 对应一段缺失区间（可能包含少量已有数据的日期）
+    """
+    planned = []
+    for unit in units:
+        brokers = coverage_brokers if (unit.broker is None and coverage_brokers) else [unit.broker]
+        existing_sets = [
+            coverage_by_broker.get((unit.exchange, unit.product, broker), {}).get((unit.symbol, unit.ranking_type), set())
+            for broker in brokers
+        ]
+        # 任一输出缺少该日数据即视为缺失；runs 为缺失区间在窗口中的 [起, 止] 下标
+        runs = []
+        for i, day in enumerate(window):
+            if not any(date_int(day) not in dates for dates in existing_sets):
+                continue
+            if runs and i - runs[-1][1] - 1 <= overhead_days:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+        if not runs:
+            continue
+        cost = sum(overhead_days + end - start + 1 for start, end in runs)
+        if cost >= overhead_days + len(window):
+            planned.append(unit)
+        else:
+            planned.extend(unit._replace(start_dt=window[start], days=end - start + 1) for start, end in runs)
+    return planned
+
+
+def print_fetch_plan(planned_units, full_units):
+    """
+    打印查询计划：需要发出的查询及每个查询的天数
+    """
+    planned_days = sum(unit.days for unit in planned_units)
+    full_days = sum(unit.days for unit in full_units)
+    print("=" * 60)
+    print("增量查询计划")
+    print("=" * 60)
+    for unit in planned_units:
+        print(f"  {unit.symbol} {unit.type_name}" + (f" ({unit.broker})" if unit.broker else "") +
+              f": 从 {unit.start_dt} 起 {unit.days} 个交易日")
+    print(f"共 {len(planned_units)} 个查询，{planned_days} 个合约交易日"
+          f"（完整查询需 {len(full_units)} 个查询，{full_days} 个合约交易日）")
+    print()
+
+
+def derive_broker_results(full_results, broker_list):
+    """
+    从全市场查询结果中按 broker 列拆分出各期货公司的查询结果
+    返回 (derived, missing)：
+      derived: {QueryUnit(broker=公司): DataFrame}
+      missing: 该公司不在对应排名表中的查询单元，需要单独按公司补查
+    """
+    derived = {}
+    missing = []
+    for unit, df in full_results.items():
+        for broker in broker_list:
+            broker_unit = unit._replace(broker=broker)
+            if len(df) > 0 and 'broker' in df.columns:
+                broker_df = df[df['broker'] == broker]
+            else:
+                broker_df = pd.DataFrame()
+            if len(broker_df) > 0:
+                derived[broker_unit] = broker_df.reset_index(drop=True)
+            else:
+                missing.append(broker_unit)
+    return derived, missing
+
+
+def split_full_market(fetch, full_results, broker_list, layer):
+    """
+    拆分模式：由全市场查询结果拆分出各公司结果，不在排名表中的公司单独补查
+    fetch 为执行查询的函数（查询单元列表 -> {QueryUnit: DataFrame}）
+    查询失败（在重试队列中）的全市场单元暂不拆分，等重试后再处理
+    """
+    failed = set(layer.retry_queue)
+    succeeded = {unit: df for unit, df in full_results.items() if unit.broker is None and unit not in failed}
+    derived, missing_units = derive_broker_results(succeeded, broker_list)
+    print(f"\n由全市场数据拆分: {len(derived)} 个公司查询单元，需补查: {len(missing_units)} 个")
+    if missing_units:
+        derived.update(fetch(missing_units))
+    return derived
+
+
+def combine_unit_results(frames):
+    """
+    合并同一合约/品种的多个查询结果，ranking_type / ranking_type_name 放在最前
+    """
+    combined = concat_rankings(frames)
+    if combined.empty:
         return combined
-    return pd.DataFrame()
+    cols = ['ranking_type', 'ranking_type_name'] + \
+           [col for col in combined.columns if col not in ['ranking_type', 'ranking_type_name']]
+    return combined[cols]
+
+
+def query_symbol_data(api, symbol, ranking_types, days, start_dt, broker):
+    """
+    查询单个合约的所有排名数据（各排名类型并发查询）
+    """
+    exchange, product = extract_product_code(symbol)
+    units = build_query_units({(exchange, product): [symbol]}, ranking_types, [broker], days, start_dt)
+    results = fetch_units_concurrently(api, units)
+    return combine_unit_results(results.values())
+
+
+# 三种排名类型
+RANKING_TYPES = [
+    ('VOLUME', '成交量排名'),
+    ('LONG', '多头持仓排名'),
+    ('SHORT', '空头持仓排名')
+]
+
+# 一个已准备好的任务：现有数据已加载，查询单元已规划
+# ledger 为 QueryLedger（未启用增量查询或未配置时为 None），window 为查询窗口内的交易日
+PreparedJob = namedtuple(
+    'PreparedJob',
+    ['job', 'symbols_by_product', 'broker_list', 'output_brokers', 'split_mode',
+     'storage', 'existing_by_output', 'units', 'ledger', 'window'],
+    defaults=[None, None]
+)
+
+
+def job_from_config():
+    """
+    由【配置区域】中的常量构造单个任务
+    """
+    return Job(
+        name='default',
+        symbols=SYMBOLS,
+        products=PRODUCTS,
+        top_k=ACTIVE_TOP_K,
+        days=DAYS,
+        start_dt=START_DT,
+        brokers=BROKERS,
+        split_from_full_market=SPLIT_FROM_FULL_MARKET,
+        incremental_fetch=INCREMENTAL_FETCH,
+        storage_backend=STORAGE_BACKEND,
+        storage_options={'parquet_dir': PARQUET_DIR, 'normalized_dir': NORMALIZED_DIR,
+                         'sqlite_path': SQLITE_PATH, 'segments_dir': SEGMENTS_DIR,
+                         'compact_after': COMPACT_AFTER, 'export_csv': EXPORT_CSV,
+                         'keep_generations': KEEP_GENERATIONS,
+                         'summary_dir': SUMMARY_DIR, 'shard_dir': SHARD_DIR,
+                         'shard_keep_months': SHARD_KEEP_MONTHS,
+                         'ledger_dir': QUERY_LEDGER_DIR},
+    )
 
 
-def main():
+def discover_job_symbols(jobs, get_api, cache_file, metrics):
+    """
+    为配置了 products 的任务发现活跃合约，追加到任务的合约列表中
+    get_api 返回共用的 TqApi，只有缓存未命中时才会调用
+    """
+    if not any(job.products for job in jobs):
+        return jobs
     print("=" * 60)
-    print("合约成交排名/持仓排名查询工具（增量更新版）")
+    print("活跃合约发现")
     print("=" * 60)
+    discovery = ContractDiscovery(cache_file, get_trading_calendar().latest_data_day())
+    resolved = []
+    for job in jobs:
+        if job.products:
+            with metrics.stage('discover', job=job.name, products=len(job.products), top_k=job.top_k) as stage:
+                selected = discovery.discover(job.products, get_api, job.top_k)
+                discovered = [symbol for symbols in selected.values() for symbol in symbols]
+                stage['symbols'] = len(discovered)
+            job = job._replace(symbols=list(dict.fromkeys(list(job.symbols or []) + discovered)))
+        resolved.append(job)
     print()
+    return resolved
+
+
+def prepare_job(job, metrics):
+    """
+    校验任务参数、加载现有数据并规划查询单元；参数有误返回 None
+    """
+    if not job.symbols or len(job.symbols) == 0:
+        print(f"错误: 任务 {job.name} 没有合约（请填写合约列表，或填写品种列表且存在活跃合约）")
+        return None
     
-    # 参数验证
-    if not USERNAME or USERNAME == "your_email@example.com":
-        print("错误: 请先填写 USERNAME (快期账户邮箱)")
-        return
-    
-    if not PASSWORD or PASSWORD == "your_password":
-        print("错误: 请先填写 PASSWORD (快期账户密码)")
-        return
-    
-    if not SYMBOLS or len(SYMBOLS) == 0:
-        print("错误: 请先填写 SYMBOLS (合约代码列表)")
-        return
-    
-    if DAYS < 1:
-        print("错误: DAYS 必须大于等于 1")
-        return
+    if job.days < 1:
+        print(f"错误: 任务 {job.name} 的查询天数必须大于等于 1")
+        return None
     
-    # 如果开始日期为None，自动计算上一个交易日（排除当日）
-    actual_start_dt = START_DT
+    # 开始日期落在非交易日时，顺延到下一个交易日，避免查询不可能有数据的日期
+    actual_start_dt = job.start_dt
+    if actual_start_dt is not None:
+        calendar = get_trading_calendar()
+        if not calendar.first_day <= actual_start_dt <= calendar.last_day:
+            print(f"错误: 任务 {job.name} 的开始日期 {actual_start_dt} 超出交易日历范围 "
+                  f"{calendar.first_day} ~ {calendar.last_day}（节假日表覆盖的年份）")
+            return None
+        actual_start_dt = calendar.on_or_after(actual_start_dt)
     
     # 按品种分组合约
     symbols_by_product = defaultdict(list)
-    for symbol in SYMBOLS:
+    for symbol in job.symbols:
         exchange, product = extract_product_code(symbol)
         if exchange and product:
             symbols_by_product[(exchange, product)].append(symbol)
@@ -240,88 +606,416 @@ def main():
             print(f"警告: 无法解析合约代码 {symbol}，跳过")
     
     if not symbols_by_product:
-        print("错误: 没有有效的合约代码")
-        return
+        print(f"错误: 任务 {job.name} 没有有效的合约代码")
+        return None
     
     print("=" * 60)
-    print("正在连接服务器并查询数据...")
+    print(f"任务: {job.name}")
     print("=" * 60)
-    print(f"合约数量: {len(SYMBOLS)}")
+    print(f"合约数量: {len(job.symbols)}")
     print(f"品种数量: {len(symbols_by_product)}")
-    print(f"查询天数: {DAYS}")
+    print(f"查询天数: {job.days}")
     print(f"开始日期: {actual_start_dt}")
     # 空列表或未配置则视为“全市场”；否则按列表中的公司逐个查询
-    broker_list = BROKERS if (BROKERS is not None and len(BROKERS) > 0) else [None]
+    broker_list = job.brokers if (job.brokers is not None and len(job.brokers) > 0) else [None]
     if broker_list == [None]:
         print("期货公司: 全市场（所有公司）")
     else:
         print(f"期货公司: 共 {len(broker_list)} 家 — {broker_list}")
     print()
     
-    # 定义三种排名类型
-    ranking_types = [
-        ('VOLUME', '成交量排名'),
-        ('LONG', '多头持仓排名'),
-        ('SHORT', '空头持仓排名')
-    ]
+    # 拆分模式：只查询全市场，各公司文件由全市场数据拆分得到，同时输出全市场文件
+    split_mode = job.split_from_full_market and broker_list != [None]
+    query_brokers = [None] if split_mode else broker_list
+    output_brokers = [None] + broker_list if split_mode else broker_list
     
-    api = None
     try:
-        # 创建API实例
-        api = TqApi(auth=TqAuth(USERNAME, PASSWORD))
+        storage = create_storage(job.storage_backend, **job.storage_options)
+    except (ImportError, ValueError) as e:
+        print(f"错误: {e}")
+        return None
+    
+    metrics.emit('job', job=job.name, symbols=len(job.symbols), products=len(symbols_by_product),
+                 brokers=len(output_brokers), days=job.days, start_dt=actual_start_dt,
+                 storage=job.storage_backend, split_mode=split_mode, incremental=job.incremental_fetch)
+    
+    # 加载现有数据（每个输出只读取一次，合并时复用）
+    existing_by_output = {}
+    for broker in output_brokers:
+        for (exchange, product) in symbols_by_product:
+            location = storage.location(exchange, product, broker)
+            print(f"读取 {location}")
+            try:
+                with metrics.stage('load', job=job.name, exchange=exchange, product=product,
+                                   broker=broker) as stage:
+                    df = storage.load(exchange, product, broker)
+                    stage['rows'] = len(df)
+                    stage['bytes'] = path_size(location.split('#')[0])
+            except ValueError as e:
+                print(f"错误: {e}")
+                return None
+            existing_by_output[(exchange, product, broker)] = df
+    print()
+    
+    # 展开全部查询单元；增量模式下只保留现有数据和已查询日期记录都未覆盖的交易日区间
+    ledger = None
+    window = None
+    with metrics.stage('plan', job=job.name) as stage:
+        units = build_query_units(symbols_by_product, RANKING_TYPES, query_brokers, job.days, actual_start_dt)
+        stage['full_queries'] = len(units)
+        if job.incremental_fetch:
+            window = get_trading_day_window(job.days, actual_start_dt)
+            ledger_dir = job.storage_options.get('ledger_dir')
+            ledger = QueryLedger(ledger_dir) if ledger_dir else None
+            coverage_by_broker = {}
+            for (exchange, product, broker), df in existing_by_output.items():
+                queried = ledger.load(exchange, product, broker) if ledger is not None else {}
+                coverage_by_broker[(exchange, product, broker)] = merge_coverage(get_date_coverage(df), queried)
+            full_units = units
+            units = plan_incremental_units(
+                full_units, coverage_by_broker, window, output_brokers if split_mode else None
+            )
+        stage['queries'] = len(units)
+        stage['query_days'] = sum(unit.days for unit in units)
+    if job.incremental_fetch:
+        print_fetch_plan(units, full_units)
+    
+    return PreparedJob(job, symbols_by_product, broker_list, output_brokers, split_mode,
+                       storage, existing_by_output, units, ledger, window)
+
+
+def fetch_jobs(api, prepared_jobs, journal, layer, metrics, max_in_flight=MAX_IN_FLIGHT, pool=None):
+    """
+    一批任务的查询单元合并后共用一个连接并发查询（相同的查询单元只查询一次），
+    拆分模式的任务再由全市场结果拆分；最后统一执行一轮重试队列
+    pool 为 fetch_pool.FetchPool 时查询分配到多个工作进程，否则在本进程的 api 上查询
+    返回 {QueryUnit: DataFrame}
+    """
+    units = list(dict.fromkeys(unit for prepared in prepared_jobs for unit in prepared.units))
+    split_jobs = [prepared for prepared in prepared_jobs if prepared.split_mode]
+    
+    def fetch(units):
+        if pool is not None:
+            return pool.fetch(units, journal, layer, metrics)
+        return fetch_units_concurrently(api, units, max_in_flight, journal, layer, metrics)
+    
+    def split(results):
+        derived = {}
+        for prepared in split_jobs:
+            job_results = {unit: results[unit] for unit in prepared.units if unit in results}
+            derived.update(split_full_market(fetch, job_results, prepared.broker_list, layer))
+        return derived
+    
+    with metrics.stage('fetch', jobs=[prepared.job.name for prepared in prepared_jobs],
+                       queries=len(units), workers=pool.workers if pool is not None else 1) as stage:
+        results = fetch(units)
+        results.update(split(results))
+        # 所有查询结束后统一执行一轮重试队列
+        retry_units = layer.take_retry_queue()
+        stage['retry_queue'] = len(retry_units)
+        if retry_units:
+            print(f"\n重试队列: {len(retry_units)} 个查询")
+            retried = fetch(retry_units)
+            results.update(retried)
+            results.update(split(retried))
+        layer.end_retry_round()
+        stage['rows'] = sum(len(df) for df in results.values())
+    return results
+
+
+def write_market_views(job, metrics, exchange, product, merged_df, new_df):
+    """
+    按品种的合并后数据更新网页用的排行榜汇总、跨期矩阵和月度分片（未配置对应目录的跳过）
+    """
+    summary_dir = job.storage_options.get('summary_dir')
+    if summary_dir:
+        with metrics.stage('summary', job=job.name, exchange=exchange, product=product) as stage:
+            stage['files'] = write_summaries(merged_df, new_df, summary_dir, exchange, product)
+        print(f"  [OK] 已更新 {stage['files']} 个排行榜汇总: {os.path.abspath(summary_dir)}")
+        with metrics.stage('cross_period', job=job.name, exchange=exchange, product=product) as stage:
+            stage['files'] = write_cross_period(merged_df, new_df, summary_dir, exchange, product)
+        print(f"  [OK] 已更新 {stage['files']} 个交易日的跨期持仓矩阵")
+    shard_dir = job.storage_options.get('shard_dir')
+    if shard_dir:
+        with metrics.stage('shards', job=job.name, exchange=exchange, product=product) as stage:
+            stage['files'] = write_shards(merged_df, new_df, shard_dir, exchange, product,
+                                          job.storage_options.get('shard_keep_months'))
+        print(f"  [OK] 已更新 {stage['files']} 个月度分片: {os.path.abspath(shard_dir)}")
+
+
+def save_job(prepared, results, metrics):
+    """
+    把查询结果合并进任务的各个输出并保存
+    返回 {'outputs': 写入的输出数, 'rows_written': 实际新增行数, 'rows_patched': 覆盖更新行数}
+    """
+    job = prepared.job
+    storage = prepared.storage
+    counts = {'outputs': 0, 'rows_written': 0, 'rows_patched': 0}
+    # 按期货公司循环（None=全市场，否则按列表逐家）
+    for broker in prepared.output_brokers:
+        if broker is not None:
+            print(f"\n{'#'*60}")
+            print(f"# 期货公司: {broker}")
+            print(f"{'#'*60}")
         
-        # 按期货公司循环（None=全市场，否则按列表逐家）
-        for broker in broker_list:
-            if broker is not None:
-                print(f"\n{'#'*60}")
-                print(f"# 期货公司: {broker}")
-                print(f"{'#'*60}")
+        # 按品种处理数据，每个品种只合并、写文件一次
+        for (exchange, product), symbols in prepared.symbols_by_product.items():
+            print(f"\n{'='*60}")
+            print(f"处理品种: {exchange}.{product} (共 {len(symbols)} 个合约)" + (f" — {broker}" if broker else ""))
+            print(f"{'='*60}")
             
-            # 按品种处理数据
-            for (exchange, product), symbols in symbols_by_product.items():
-                print(f"\n{'='*60}")
-                print(f"处理品种: {exchange}.{product} (共 {len(symbols)} 个合约)" + (f" — {broker}" if broker else ""))
-                print(f"{'='*60}")
-                
-                csv_filename = get_csv_filename(exchange, product, broker)
-                existing_df = load_existing_data(csv_filename)
-                product_new_data = []
-                
-                for symbol in symbols:
-                    print(f"\n  查询合约: {symbol}")
-                    symbol_df = query_symbol_data(
-                        api, symbol, ranking_types, DAYS, actual_start_dt, broker
-                    )
-                    if len(symbol_df) > 0:
-                        product_new_data.append(symbol_df)
-                
-                if product_new_data:
-                    new_df = pd.concat(product_new_data, ignore_index=True)
-                    print(f"\n  {exchange}.{product} 新数据: {len(new_df)} 条记录")
-                    merged_df = merge_and_deduplicate(existing_df, new_df)
-                    old_count = len(existing_df)
-                    new_count = len(new_df)
-                    merged_count = len(merged_df)
-                    added_count = merged_count - old_count
-                    if 'datetime' in merged_df.columns:
-                        merged_df['datetime'] = merged_df['datetime'].astype(str).str.replace('-', '').str[:8]
-                    merged_df.to_csv(csv_filename, index=False, encoding='utf-8-sig')
-                    print(f"\n  [OK] 数据已保存到: {os.path.abspath(csv_filename)}")
-                    print(f"    原有数据: {old_count} 条")
-                    print(f"    新增数据: {new_count} 条")
-                    print(f"    合并后总计: {merged_count} 条")
-                    print(f"    实际新增: {added_count} 条（去重后）")
+            existing_df = prepared.existing_by_output[(exchange, product, broker)]
+            new_df = combine_unit_results(
+                df for unit, df in results.items()
+                if unit.broker == broker and (unit.exchange, unit.product) == (exchange, product)
+                and unit.symbol in symbols
+            )
+            
+            if len(new_df) > 0:
+                print(f"\n  {exchange}.{product} 新数据: {len(new_df)} 条记录")
+                with metrics.stage('merge', job=job.name, exchange=exchange, product=product,
+                                   broker=broker) as stage:
+                    result = upsert_rows(existing_df, new_df)
+                    stage.update(old_rows=len(existing_df), new_rows=len(new_df),
+                                 merged_rows=len(result.merged_df), patched_rows=result.patched_count)
+                patched_count = result.patched_count
+                old_count = len(existing_df)
+                new_count = len(new_df)
+                merged_count = len(result.merged_df)
+                added_count = merged_count - old_count
+                location = storage.location(exchange, product, broker).split('#')[0]
+                with metrics.stage('write', job=job.name, exchange=exchange, product=product,
+                                   broker=broker) as stage:
+                    bytes_before = path_size(location)
+                    saved = storage.save(exchange, product, broker, existing_df, result)
+                    # 版本化存储写入新的版本目录，按写入后的位置统计
+                    stage['bytes'] = path_size(storage.location(exchange, product, broker).split('#')[0])
+                    stage['bytes_delta'] = stage['bytes'] - bytes_before
+                # 汇总、跨期矩阵和分片是网页的品种（全市场）视图，只由全市场数据生成
+                if broker is None:
+                    write_market_views(job, metrics, exchange, product, result.merged_df, result.new_df)
+                metrics.count('rows_written', added_count)
+                metrics.count('rows_patched', patched_count)
+                counts['outputs'] += 1
+                counts['rows_written'] += added_count
+                counts['rows_patched'] += patched_count
+                print(f"\n  [OK] 数据已保存: {saved}")
+                print(f"    原有数据: {old_count} 条")
+                print(f"    新增数据: {new_count} 条")
+                print(f"    合并后总计: {merged_count} 条")
+                print(f"    实际新增: {added_count} 条（去重后）")
+                print(f"    覆盖更新: {patched_count} 条")
+            else:
+                print(f"\n  [WARN] {exchange}.{product} 没有新数据")
+                if len(existing_df) > 0:
+                    print(f"    保留现有数据: {len(existing_df)} 条")
+    
+    if None not in prepared.output_brokers and counts['outputs'] \
+            and (job.storage_options.get('summary_dir') or job.storage_options.get('shard_dir')):
+        print(f"\n  [WARN] 任务 {job.name} 没有全市场输出，未更新排行榜汇总/跨期矩阵/月度分片"
+              f"（需要时开启 SPLIT_FROM_FULL_MARKET）")
+    
+    # 各品种的一组文件写完后整体发布（切换版本清单）
+    if hasattr(storage, 'commit'):
+        with metrics.stage('commit', job=job.name):
+            for message in storage.commit():
+                print(f"  [OK] {message}")
+    return counts
+
+
+def write_shard_catalogs(jobs, metrics=None):
+    """
+    所有品种的分片写完后，为任务用到的每个分片目录汇总一次总清单
+    """
+    for shard_dir in sorted({job.storage_options.get('shard_dir') for job in jobs} - {None, ''}):
+        with metrics.stage('shard_catalog') if metrics is not None else contextlib.nullcontext():
+            products = write_catalog(shard_dir)
+        if products:
+            print(f"  [OK] 分片总清单已更新: {products} 个品种 {os.path.abspath(shard_dir)}")
+
+
+def latest_returned_day(df):
+    """
+    查询结果中最新的交易日（YYYYMMDD 整数），无数据时返回 None
+    """
+    if df is None or df.empty:
+        return None
+    return int(normalize_datetime(df['datetime']).max())
+
+
+def record_queried_days(prepared, results, failed):
+    """
+    数据保存后，把本任务查询成功的单元覆盖的交易日写入已查询日期记录
+    failed 为最终失败的查询单元，不记录
+    只记录不晚于查询实际返回的最新交易日的日期：无数据的结果不能说明数据已发布（最新交易日的数据
+    可能尚未发布），这些日期留给下次运行重新查询。拆分模式下公司结果来自同一次全市场查询，
+    以全市场结果的最新交易日为准
+    """
+    if prepared.ledger is None or not prepared.window:
+        return
+    failed = set(failed)
+    queried = defaultdict(lambda: defaultdict(set))
+    for unit in results:
+        if unit in failed or unit.broker not in prepared.output_brokers \
+                or unit.symbol not in prepared.symbols_by_product.get((unit.exchange, unit.product), ()):
+            continue
+        latest = [latest_returned_day(results[unit])]
+        if prepared.split_mode and unit.broker is not None:
+            latest.append(latest_returned_day(results.get(unit._replace(broker=None))))
+        latest = [day for day in latest if day is not None]
+        if not latest:
+            continue
+        days = {date_int(day) for day in get_trading_day_window(unit.days, unit.start_dt)
+                if date_int(day) <= max(latest)}
+        queried[(unit.exchange, unit.product)][(unit.broker, unit.symbol, unit.ranking_type)] |= days
+    keep_from = date_int(prepared.window[0])
+    for (exchange, product), entries in queried.items():
+        prepared.ledger.record(exchange, product, entries, keep_from)
+
+
+def find_output_conflicts(prepared_jobs):
+    """
+    检查多个任务是否写入同一个输出（同一存储位置的同一品种/期货公司），返回冲突描述列表
+    """
+    owners = {}
+    conflicts = []
+    for prepared in prepared_jobs:
+        for (exchange, product, broker) in prepared.existing_by_output:
+            location = prepared.storage.location(exchange, product, broker)
+            key = os.path.abspath(location) if '#' not in location else location
+            if key in owners and owners[key] != prepared.job.name:
+                conflicts.append(f"{location}（任务 {owners[key]} 与 {prepared.job.name}）")
+            owners.setdefault(key, prepared.job.name)
+    return conflicts
+
+
+def run_jobs(jobs, username, password, parallel_jobs=1, max_in_flight=MAX_IN_FLIGHT,
+             journal_file=JOURNAL_FILE, metrics_file=METRICS_FILE, fake_api=FAKE_API, request_options=None,
+             contract_cache_file=CONTRACT_CACHE_FILE, fetch_workers=FETCH_WORKERS, summary=None,
+             shard_catalog=True):
+    """
+    在同一进程中运行多个任务，共用一个 TqApi 连接
+    每 parallel_jobs 个任务为一批：同批任务的查询合并并发，查询完成后逐个任务合并保存
+    fetch_workers 大于 1 时查询分配到多个工作进程（每个进程一个 TqApi），合并与写文件仍在本进程
+    request_options 为 create_request_layer 的参数（限速、重试、超时）
+    summary 为列表时，每个保存完成的任务追加一条结果摘要
+    shard_catalog 为 False 时不汇总分片总清单（全市场扫描的分片进程，由主进程在全部分片结束后汇总）
+    全部任务成功返回 True
+    """
+    # 参数验证
+    fake_api = fake_api or os.environ.get('TQ_FAKE_API')
+    if not fake_api:
+        if not username or username == "your_email@example.com":
+            print("错误: 请先填写 USERNAME (快期账户邮箱)，或设置环境变量 TQ_USERNAME")
+            return False
+        
+        if not password or password == "your_password":
+            print("错误: 请先填写 PASSWORD (快期账户密码)，或设置环境变量 TQ_PASSWORD")
+            return False
+    
+    metrics = RunMetrics(metrics_file)
+    metrics.emit('run_start', jobs=[job.name for job in jobs], parallel_jobs=parallel_jobs,
+                 max_in_flight=max_in_flight, fetch_workers=fetch_workers)
+    
+    prepared_jobs = []
+    status = 'error'
+    api = None
+    pool = None
+    
+    def connect():
+        # 创建API实例（所有任务共用，首次需要联网时才连接）
+        nonlocal api
+        if api is None:
+            print("=" * 60)
+            print("正在连接服务器并查询数据...")
+            print("=" * 60)
+            with metrics.stage('connect'):
+                api = create_api(username, password, fake_api)
+        return api
+    
+    def start_pool():
+        # 多进程查询池（首次需要查询时才启动），各工作进程自行连接服务器
+        nonlocal pool
+        if pool is None:
+            from fetch_pool import FetchPool
+            print("=" * 60)
+            print(f"正在启动 {fetch_workers} 个查询进程...")
+            print("=" * 60)
+            options = dict(request_options or {})
+            options.setdefault('rate_limit', QUERY_RATE_LIMIT)
+            with metrics.stage('connect', workers=fetch_workers):
+                pool = FetchPool(fetch_workers, username, password, fake_api, options, max_in_flight)
+        return pool
+    
+    try:
+        jobs = discover_job_symbols(jobs, connect, contract_cache_file, metrics)
+        for job in jobs:
+            prepared = prepare_job(job, metrics)
+            if prepared is None:
+                return False
+            prepared_jobs.append(prepared)
+        conflicts = find_output_conflicts(prepared_jobs)
+        if conflicts:
+            print("错误: 多个任务写入同一个输出文件:")
+            for conflict in conflicts:
+                print(f"  {conflict}")
+            return False
+        
+        journal = None
+        if journal_file:
+            journal = FetchJournal(journal_file, get_trading_calendar().latest_data_day())
+        
+        layer = create_request_layer(**(request_options or {}))
+        parallel_jobs = max(int(parallel_jobs), 1)
+        for i in range(0, len(prepared_jobs), parallel_jobs):
+            batch = prepared_jobs[i:i + parallel_jobs]
+            results = {}
+            if any(prepared.units for prepared in batch):
+                if fetch_workers > 1:
+                    start_pool()
                 else:
-                    print(f"\n  [WARN] {exchange}.{product} 没有新数据")
-                    if len(existing_df) > 0:
-                        print(f"    保留现有数据: {len(existing_df)} 条")
+                    connect()
+                
+                # 复用同一连接并发查询
+                query_count = len(set(unit for prepared in batch for unit in prepared.units))
+                print(f"任务 {', '.join(prepared.job.name for prepared in batch)}: "
+                      f"共 {query_count} 个查询，并发上限: {max_in_flight}")
+                fetch_start = time.time()
+                results = fetch_jobs(api, batch, journal, layer, metrics, max_in_flight, pool)
+                print(f"\n查询耗时: {time.time() - fetch_start:.1f} 秒")
+            else:
+                print("现有数据已覆盖查询窗口，无需联网查询")
+            
+            for prepared in batch:
+                counts = save_job(prepared, results, metrics)
+                record_queried_days(prepared, results, layer.failed)
+                if summary is not None:
+                    summary.append(dict(
+                        job=prepared.job.name, products=len(prepared.symbols_by_product),
+                        symbols=len(prepared.job.symbols), queries=len(prepared.units), **counts))
+        
+        if shard_catalog:
+            write_shard_catalogs([prepared.job for prepared in prepared_jobs], metrics)
+        
+        if api is not None or pool is not None:
+            print()
+            layer.print_stats()
+            metrics.emit('request_stats', rate=round(layer.bucket.rate, 3), **layer.stats)
+        
+        # 全部数据已保存，断点日志不再需要
+        if journal is not None:
+            journal.clear()
+        status = 'ok'
         
         print()
         print("=" * 60)
         print("查询完成！")
         print("=" * 60)
-        print(f"共处理 {len(symbols_by_product)} 个品种, {len(broker_list)} 个期货公司/全市场")
+        for prepared in prepared_jobs:
+            print(f"任务 {prepared.job.name}: 共处理 {len(prepared.symbols_by_product)} 个品种, "
+                  f"{len(prepared.output_brokers)} 个期货公司/全市场")
         print()
+        return True
         
     except Exception as e:
         print()
@@ -338,13 +1032,133 @@ def main():
         print("3. 合约代码不存在")
         print("4. 参数设置错误")
         print("5. 数据更新时间未到（数据更新时间: 18:30~19:00）")
+        return False
         
     finally:
         # 关闭API连接
         if api:
             api.close()
             print("已关闭API连接")
+        if pool is not None:
+            pool.close()
+        for prepared in prepared_jobs:
+            if hasattr(prepared.storage, 'close'):
+                prepared.storage.close()
+        metrics.close(status)
+
+
+def main(fetch_workers=None):
+    print("=" * 60)
+    print("合约成交排名/持仓排名查询工具（增量更新版）")
+    print("=" * 60)
+    print()
+    username, password = resolve_credentials(USERNAME, PASSWORD)
+    return run_jobs([job_from_config()], username, password, fetch_workers=fetch_workers or FETCH_WORKERS)
+
+
+def run_config_file(path, job_names=None, parallel_jobs=None, fetch_workers=None):
+    """
+    按配置文件运行批量任务；job_names 非空时只运行其中列出的任务
+    """
+    print("=" * 60)
+    print("合约成交排名/持仓排名查询工具（批量任务）")
+    print("=" * 60)
+    print()
+    try:
+        run, jobs = load_config(path)
+    except (OSError, ImportError, ValueError) as e:
+        print(f"错误: 读取配置文件失败: {e}")
+        return False
+    if job_names:
+        unknown = set(job_names) - {job.name for job in jobs}
+        if unknown:
+            print(f"错误: 配置文件中没有任务 {sorted(unknown)}")
+            return False
+        jobs = [job for job in jobs if job.name in job_names]
+    
+    username, password = resolve_credentials(run.get('username'))
+    options = run_options_from_config(run)
+    if parallel_jobs:
+        options['parallel_jobs'] = parallel_jobs
+    if fetch_workers:
+        options['fetch_workers'] = fetch_workers
+    return run_jobs(jobs, username, password, **options)
+
+
+def run_options_from_config(run=None):
+    """
+    由配置文件的 [run] 设置得到 run_jobs 的参数，未设置的使用【配置区域】中的默认值
+    """
+    run = run or {}
+    return dict(
+        parallel_jobs=run.get('parallel_jobs', 1),
+        max_in_flight=run.get('max_in_flight', MAX_IN_FLIGHT),
+        journal_file=run.get('journal_file', JOURNAL_FILE),
+        metrics_file=run.get('metrics_file', METRICS_FILE),
+        fake_api=run.get('fake_api', FAKE_API),
+        contract_cache_file=run.get('contract_cache_file', CONTRACT_CACHE_FILE),
+        fetch_workers=run.get('fetch_workers', FETCH_WORKERS),
+        request_options={key: run[key] for key in
+                         ('rate_limit', 'retry_attempts', 'retry_base_delay', 'query_timeout') if key in run},
+    )
+
+
+def run_sweep_mode(config_path=None, exchanges=None, workers=None):
+    """
+    全市场扫描：各交易所全部品种的活跃合约，按交易所分片到多个进程（见 universe_sweep）
+    """
+    from universe_sweep import run_sweep
+    
+    print("=" * 60)
+    print("合约成交排名/持仓排名查询工具（全市场扫描）")
+    print("=" * 60)
+    print()
+    if config_path:
+        try:
+            run, template = load_sweep_config(config_path)
+        except (OSError, ImportError, ValueError) as e:
+            print(f"错误: 读取配置文件失败: {e}")
+            return False
+        username, password = resolve_credentials(run.get('username'))
+    else:
+        run, template = {}, job_from_config()
+        username, password = resolve_credentials(USERNAME, PASSWORD)
+    options = run_options_from_config(run)
+    fake_api = options.pop('fake_api')
+    return run_sweep(
+        template, username, password,
+        exchanges=exchanges or run.get('sweep_exchanges') or SWEEP_EXCHANGES,
+        workers=workers or run.get('sweep_workers', SWEEP_WORKERS),
+        run_options=options,
+        summary_file=run.get('sweep_summary_file', SWEEP_SUMMARY_FILE),
+        fake_api=fake_api,
+    )
+
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="查询合约成交排名/持仓排名并增量保存")
+    parser.add_argument('--config', help="批量任务配置文件（.toml / .yaml）；不指定则使用脚本中的【配置区域】")
+    parser.add_argument('--job', action='append', dest='jobs', help="只运行指定任务，可重复")
+    parser.add_argument('--parallel-jobs', type=int, help="同时查询的任务数，覆盖配置文件中的 parallel_jobs")
+    parser.add_argument('--fetch-workers', type=int, help="查询进程数（每个进程一个 TqApi 连接），覆盖 FETCH_WORKERS")
+    parser.add_argument('--sweep', action='store_true', help="全市场扫描：所有交易所的全部品种（活跃合约）")
+    parser.add_argument('--exchanges', type=lambda value: [item.strip() for item in value.split(',') if item.strip()],
+                        help="全市场扫描的交易所，逗号分隔，例如 SHFE,DCE")
+    parser.add_argument('--workers', type=int, help="全市场扫描的进程数")
+    parser.add_argument('--quiet', action='store_true', help="不打印进度信息，只写指标文件")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    with contextlib.ExitStack() as stack:
+        if args.quiet or not PRINT_PROGRESS:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        if args.sweep:
+            ok = run_sweep_mode(args.config, args.exchanges, args.workers)
+        elif args.config:
+            ok = run_config_file(args.config, args.jobs, args.parallel_jobs, args.fetch_workers)
+        else:
+            ok = main(args.fetch_workers)
+    raise SystemExit(0 if ok else 1)
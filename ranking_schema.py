@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+排名数据的内存类型约定
+
+查询结果和从文件读出的数据都在进入流水线时统一为同一套列类型，之后的合并、去重、拆分
+不再做字符串处理：
+- datetime: int32（YYYYMMDD）
+- *_ranking: Int16（可空整数，不在对应排名表中的公司为空）
+- volume / *_oi / *_change: Int64（可空整数）
+- ranking_type / ranking_type_name / symbol / exchange_id / instrument_id / broker: category
+
+写出的 CSV 列和取值不变，只是整数列不再带 .0 后缀（空值仍为空）。
+"""
+
+import pandas as pd
+
+RANKING_DTYPES = {
+    'ranking_type': 'category',
+    'ranking_type_name': 'category',
+    'datetime': 'int32',
+    'symbol': 'category',
+    'exchange_id': 'category',
+    'instrument_id': 'category',
+    'broker': 'category',
+    'volume': 'Int64',
+    'volume_change': 'Int64',
+    'volume_ranking': 'Int16',
+    'long_oi': 'Int64',
+    'long_change': 'Int64',
+    'long_ranking': 'Int16',
+    'short_oi': 'Int64',
+    'short_change': 'Int64',
+    'short_ranking': 'Int16',
+}
+
+CATEGORY_COLUMNS = [col for col, dtype in RANKING_DTYPES.items() if dtype == 'category']
+
+# 预计算视图（汇总、跨期矩阵、月度分片）的 scope 字段：由全市场数据生成时为 'market'，
+# 否则为生成所用的期货公司列表；网页只把 scope 为 'market' 的文件当作品种视图
+MARKET_SCOPE = 'market'
+
+
+def date_int(day):
+    """
+    date -> YYYYMMDD 整数，与 datetime 列的取值一致
+    """
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def to_date_int(series):
+    """
+    日期列 -> int32 YYYYMMDD；只有文本日期（'2025-08-29'、'20250829' 等）才做一次字符串截取
+    """
+    if pd.api.types.is_integer_dtype(series):
+        return series.astype('int32')
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(str)
+    return series.astype(str).str.replace('-', '').str[:8].astype('int32')
+
+
+def apply_ranking_schema(df):
+    """
+    把 DataFrame 中已有的排名列统一为 RANKING_DTYPES；已是目标类型的列不做处理
+    不认识的列（如事实表的入榜标记）保持原样
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    for col, dtype in RANKING_DTYPES.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if col == 'datetime':
+            if series.dtype != 'int32':
+                df[col] = to_date_int(series)
+        elif dtype == 'category':
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+        elif str(series.dtype) != dtype:
+            # 浮点形式的整数（1.0）先取整再转可空整数
+            df[col] = pd.to_numeric(series, errors='coerce').round().astype(dtype)
+    return df
+
+
+def read_ranking_csv(path):
+    """
+    读取排名 CSV 并统一为 RANKING_DTYPES（共享的加载入口）
+    安装了 pyarrow 时用其多线程解析器直接按目标类型解析；否则用默认解析器读出后再转换
+    （默认解析器边读边转 category/可空整数比读出后转换慢得多）
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return apply_ranking_schema(pd.read_csv(path, encoding='utf-8-sig'))
+    header = pd.read_csv(path, encoding='utf-8-sig', nrows=0).columns
+    # datetime 可能是旧的 '2025-08-29' 写法，由 apply_ranking_schema 统一转换
+    dtype = {col: RANKING_DTYPES[col] for col in header if col in RANKING_DTYPES and col != 'datetime'}
+    try:
+        df = pd.read_csv(path, encoding='utf-8-sig', engine='pyarrow', dtype=dtype)
+    except (TypeError, ValueError):
+        # 旧文件中的 1.0 等浮点写法无法直接解析为整数类型，读出后再转换
+        df = pd.read_csv(path, encoding='utf-8-sig', engine='pyarrow')
+    return apply_ranking_schema(df)
+
+
+def unify_categories(left, right):
+    """
+    让两个 DataFrame 中同名的 category 列使用相同的类别集合，
+    之后两者可以直接拼接/按位置赋值而不会退化为 object 列
+    """
+    left, right = left.copy(), right.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in left.columns and col in right.columns:
+            a, b = left[col], right[col]
+            if isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype) \
+                    and not a.cat.categories.equals(b.cat.categories):
+                categories = a.cat.categories.union(b.cat.categories)
+                left[col] = a.cat.set_categories(categories)
+                right[col] = b.cat.set_categories(categories)
+    return left, right
+
+
+def concat_rankings(frames):
+    """
+    拼接多个排名 DataFrame，category 列合并类别后保持 category 类型
+    """
+    frames = [df for df in frames if len(df) > 0]
+    if not frames:
+        return pd.DataFrame()
+    categories = {}
+    for df in frames:
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                current = categories.get(col)
+                values = df[col].cat.categories
+                categories[col] = values if current is None else current.union(values)
+    aligned = []
+    for df in frames:
+        df = df.copy()
+        for col, values in categories.items():
+            if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.set_categories(values)
+        aligned.append(df)
+    return apply_ranking_schema(pd.concat(aligned, ignore_index=True))
@@ -0,0 +1,826 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+排名数据的存储后端
+
+- csv: 每个 (品种, 期货公司) 一个 UTF-8-BOM CSV 文件，网页直接读取（默认）
+- parquet: 按 交易所/品种/交易日 分区的 Parquet 数据集，需要安装 pyarrow；
+  每次只重写本次涉及的交易日分区，CSV 可作为派生文件继续导出
+- normalized: 每个 (日期, 合约, 期货公司) 只存一行事实数据 + 三种排名的入榜标记，
+  原有宽表 CSV 作为兼容视图继续导出
+- sqlite: 本地 SQLite 数据库（WAL 模式），按去重键 upsert，带合约/期货公司索引
+- segments: 每次运行按交易日追加不可变的分段文件，读取时合并 基础文件 + 分段，
+  分段积累到一定数量后压缩进基础文件；每晚的写入量只与新数据量成正比
+
+所有文件都通过临时文件 + fsync + 原子重命名写入（见 atomic_io）；CSV 输出另按品种维护版本清单，
+同一品种的一组文件作为一个版本整体切换。
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_link, atomic_open, atomic_write_json, fsync_directory
+from ranking_schema import apply_ranking_schema, concat_rankings, read_ranking_csv, to_date_int, unify_categories
+
+
+def clean_broker_name(broker):
+    """
+    清洗期货公司名称，去掉不适合文件名的字符
+    """
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', broker.strip())
+
+
+def get_csv_filename(exchange, product, broker=None):
+    """
+    生成CSV文件名：{交易所}_{品种}.csv
+    例如：SHFE_rb.csv
+    """
+    if broker:
+        return f"{exchange}_{product}_{clean_broker_name(broker)}.csv"
+    return f"{exchange}_{product}.csv"
+
+
+def load_existing_data(filename):
+    """
+    加载现有的CSV数据（如果存在），列类型见 ranking_schema
+    文件存在但无法读取时抛出 ValueError，而不是当作空数据——否则随后的保存会覆盖全部历史
+    """
+    if os.path.exists(filename):
+        try:
+            df = read_ranking_csv(filename)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        except Exception as e:
+            raise ValueError(f"无法读取现有数据 {filename}: {e}（为保护历史数据，已停止写入）")
+        print(f"  [OK] 加载现有数据: {len(df)} 条记录")
+        return df
+    return pd.DataFrame()
+
+
+# 去重键：ranking_type, datetime, symbol, broker 相同的记录只保留一条
+KEY_COLUMNS = ['ranking_type', 'datetime', 'symbol', 'broker']
+
+
+def normalize_datetime(series):
+    """
+    统一 datetime 为 int32 YYYYMMDD（与 ranking_schema 一致），已是整数的列不做字符串处理
+    """
+    return to_date_int(series)
+
+
+# 增量合并结果
+# merged_df: 合并后的全部数据；patched_count: 覆盖更新的历史记录数
+# appended_df: 追加到末尾的新记录；new_df: 去重、日期规范化后的全部新记录
+MergeResult = namedtuple('MergeResult', ['merged_df', 'patched_count', 'appended_df', 'new_df'])
+
+
+def upsert_rows(old_df, new_df, key_columns=KEY_COLUMNS):
+    """
+    基于去重键（默认 KEY_COLUMNS）的哈希索引，把新数据增量合并进现有数据（保留新的）
+    - 键已存在的记录：在原位置用新记录覆盖（patch），不改变历史数据的顺序
+    - 键不存在的记录：按日期排序后追加到末尾
+    返回 MergeResult
+    """
+    for col in key_columns:
+        if col not in new_df.columns or (not old_df.empty and col not in old_df.columns):
+            print(f"  [WARN] 警告：数据中缺少列 '{col}'，无法去重")
+            return MergeResult(pd.concat([old_df, new_df], ignore_index=True), 0, new_df, new_df)
+
+    new_df = apply_ranking_schema(new_df)
+    # 新数据内部先去重（保留最后一条），再按日期稳定排序
+    new_df = new_df.drop_duplicates(subset=key_columns, keep='last')
+    new_df = new_df.sort_values('datetime', kind='stable').reset_index(drop=True)
+    if old_df.empty:
+        return MergeResult(new_df, 0, new_df, new_df)
+
+    old_df = apply_ranking_schema(old_df.reset_index(drop=True))
+    for col in new_df.columns:
+        if col not in old_df.columns:
+            old_df[col] = pd.Series(pd.NA, index=old_df.index, dtype=new_df[col].dtype)
+    # 类别统一后键列可直接比较，补丁和追加也不会把 category 列退化为文本
+    old_df, new_df = unify_categories(old_df, new_df)
+
+    # 键 -> 现有数据中的行位置的哈希索引（重复键取最后一条，与“保留新的”一致）
+    old_index = pd.MultiIndex.from_frame(old_df[key_columns])
+    old_positions = np.arange(len(old_df))
+    if not old_index.is_unique:
+        keep = ~old_index.duplicated(keep='last')
+        old_index, old_positions = old_index[keep], old_positions[keep]
+    new_index = pd.MultiIndex.from_frame(new_df[key_columns])
+    found = old_index.get_indexer(new_index)
+    is_patch = found >= 0
+
+    patch_df = new_df[is_patch]
+    if len(patch_df) > 0:
+        patch_positions = old_positions[found[is_patch]]
+        old_df = old_df.astype({col: patch_df[col].dtype for col in new_df.columns
+                                if old_df[col].dtype != patch_df[col].dtype})
+        # 逐列按位置覆盖，保持各列的类型
+        for col in new_df.columns:
+            old_df.iloc[patch_positions, old_df.columns.get_loc(col)] = patch_df[col].array
+
+    appended_df = new_df[~is_patch]
+    merged = pd.concat([old_df, appended_df], ignore_index=True) if len(appended_df) > 0 else old_df
+    return MergeResult(merged, len(patch_df), appended_df, new_df)
+
+
+def merge_and_deduplicate(old_df, new_df):
+    """
+    合并新旧数据并去重
+    去重规则：ranking_type, datetime, symbol, broker 相同的记录只保留一条（保留新的）
+    """
+    if old_df.empty:
+        return new_df
+    
+    if new_df.empty:
+        return old_df
+    
+    return upsert_rows(old_df, new_df).merged_df
+
+
+def save_merged_data(csv_filename, existing_df, merged_df, patched_count, appended_df, output=None):
+    """
+    保存合并结果：没有覆盖历史记录且表头一致时只把新记录追加到原文件内容之后，否则整体重写
+    写入 output（默认为 csv_filename 本身）：先写临时文件，fsync 后原子替换，原文件在写入过程中始终保持完整
+    追加同样要把原文件整份复制到临时文件再写入新记录（原文件可能正被网页读取，或与版本目录中已发布的文件
+    是同一个硬链接，不能就地修改），磁盘读写量与文件大小成正比；与重写相比省掉的是把全部历史重新序列化为
+    CSV 的时间（按字节复制，不解析），写入量并没有减少
+    返回是否为追加写入
+    """
+    output = output or csv_filename
+    can_append = (
+        patched_count == 0 and len(existing_df) > 0 and os.path.exists(csv_filename)
+        and list(appended_df.columns) == list(existing_df.columns)
+    )
+    if can_append:
+        if len(appended_df) == 0 and output == csv_filename:
+            return True
+        with atomic_open(output, 'a', encoding='utf-8', newline='', copy_from=csv_filename) as f:
+            appended_df.to_csv(f, header=False, index=False)
+        return True
+    with atomic_open(output, 'w', encoding='utf-8-sig', newline='') as f:
+        merged_df.to_csv(f, index=False)
+    return False
+
+
+# 排名数据的全部列（与 tqsdk 返回的列 + ranking_type/ranking_type_name 一致）
+RANKING_COLUMNS = [
+    'ranking_type', 'ranking_type_name', 'datetime', 'symbol', 'exchange_id', 'instrument_id', 'broker',
+    'volume', 'volume_change', 'volume_ranking',
+    'long_oi', 'long_change', 'long_ranking',
+    'short_oi', 'short_change', 'short_ranking',
+]
+
+# 排名类型及其中文名称
+RANKING_TYPE_NAMES = {'VOLUME': '成交量排名', 'LONG': '多头持仓排名', 'SHORT': '空头持仓排名'}
+
+# 事实表：每个 (日期, 合约, 期货公司) 一行，入榜标记表示该公司是否出现在对应排名表中
+FACT_KEY_COLUMNS = ['datetime', 'symbol', 'broker']
+MEMBERSHIP_COLUMNS = {'VOLUME': 'in_volume', 'LONG': 'in_long', 'SHORT': 'in_short'}
+
+
+def normalize_rankings(df):
+    """
+    宽表 -> 事实表：三种 ranking_type 下重复的成交/持仓数据合并为一行，
+    同一字段取最后一个非空值（与“保留新的”一致），并记录入榜标记
+    """
+    if df.empty:
+        return pd.DataFrame()
+    df = apply_ranking_schema(df)
+    grouped = df.groupby(FACT_KEY_COLUMNS, sort=False, dropna=False, observed=True)
+    payload_columns = [col for col in df.columns
+                       if col not in FACT_KEY_COLUMNS + ['ranking_type', 'ranking_type_name']]
+    facts = grouped[payload_columns].last() if payload_columns else grouped.size().to_frame().iloc[:, :0]
+    for ranking_type, flag in MEMBERSHIP_COLUMNS.items():
+        facts[flag] = df['ranking_type'].eq(ranking_type).groupby(
+            [df[col] for col in FACT_KEY_COLUMNS], sort=False, dropna=False, observed=True).any()
+    facts = facts.reset_index()
+    columns = [col for col in df.columns if col not in ('ranking_type', 'ranking_type_name')]
+    return facts[columns + list(MEMBERSHIP_COLUMNS.values())]
+
+
+def denormalize_rankings(facts):
+    """
+    事实表 -> 兼容视图：按入榜标记展开为原有的宽表（每种排名类型一行），供 script.js 使用
+    """
+    if facts.empty:
+        return pd.DataFrame()
+    frames = []
+    payload = facts.drop(columns=list(MEMBERSHIP_COLUMNS.values()))
+    for ranking_type, flag in MEMBERSHIP_COLUMNS.items():
+        rows = payload[facts[flag].astype(bool)].copy()
+        rows.insert(0, 'ranking_type_name', RANKING_TYPE_NAMES[ranking_type])
+        rows.insert(0, 'ranking_type', ranking_type)
+        frames.append(rows)
+    wide = concat_rankings(frames)
+    return wide.sort_values('datetime', kind='stable').reset_index(drop=True)
+
+
+def upsert_facts(old_facts, new_facts):
+    """
+    合并事实表：成交/持仓数据以新数据为准，入榜标记与已有标记取并集
+    （增量查询可能只补了其中一种排名类型）
+    """
+    if not old_facts.empty and not new_facts.empty:
+        old_facts, new_facts = unify_categories(apply_ranking_schema(old_facts), apply_ranking_schema(new_facts))
+        old_index = pd.MultiIndex.from_frame(old_facts[FACT_KEY_COLUMNS])
+        new_index = pd.MultiIndex.from_frame(new_facts[FACT_KEY_COLUMNS])
+        found = old_index.get_indexer(new_index)
+        matched = found >= 0
+        for flag in MEMBERSHIP_COLUMNS.values():
+            old_flags = old_facts[flag].astype(bool).to_numpy()[found[matched]]
+            new_facts.loc[matched, flag] = new_facts.loc[matched, flag].astype(bool).to_numpy() | old_flags
+    return upsert_rows(old_facts, new_facts, FACT_KEY_COLUMNS)
+
+
+# 各品种历史版本所在的目录（相对 CSV 目录；不以 . 开头，GitHub Pages 会发布）
+GENERATIONS_DIR = 'generations'
+
+
+def get_manifest_filename(exchange, product):
+    """
+    品种版本清单文件名：{交易所}_{品种}.manifest.json
+    """
+    return f"{exchange}_{product}.manifest.json"
+
+
+def get_broker_index_filename(exchange, product):
+    """
+    品种的期货公司文件索引文件名：{交易所}_{品种}.brokers.json
+    """
+    return f"{exchange}_{product}.brokers.json"
+
+
+def describe_ranking_file(path, broker=None, df=None):
+    """
+    期货公司文件索引中的一项：文件大小、sha256、行数、起止日期（YYYYMMDD）
+    df 为该文件的数据时直接统计，否则读取文件；broker 为空时取文件中的期货公司名
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if df is None:
+        df = load_existing_data(path)
+    if broker is None and len(df) > 0 and 'broker' in df.columns:
+        broker = str(df['broker'].iloc[0])
+    return {
+        'broker': broker,
+        'file': os.path.basename(path),
+        'rows': len(df),
+        'first_date': int(df['datetime'].min()) if len(df) > 0 else None,
+        'last_date': int(df['datetime'].max()) if len(df) > 0 else None,
+        'bytes': len(data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+    }
+
+
+class CsvStorage:
+    """
+    CSV 存储：每个 (交易所, 品种, 期货公司) 一个文件，文件名见 get_csv_filename
+
+    generations 为 True 时同一品种的全市场文件和各期货公司文件作为一个版本整体发布：
+    save() 把新文件写入 generations/SHFE_rb/000012/，commit() 把未变化的文件硬链接进同一版本目录，
+    再原子替换版本清单 SHFE_rb.manifest.json（切换点）。读取方按清单取文件，
+    任何时刻看到的都是同一版本的一组文件；固定文件名 SHFE_rb.csv 等随后同步为新版本，供旧读取方使用。
+    保留最近 keep_generations 个版本，正在按旧清单读取的客户端不会读到已删除的文件。
+    版本目录和清单供直接从数据目录提供网页的场景使用；通过 Git 提交发布时每次提交本身就是一个完整版本，
+    只需提交固定文件名的文件（没有清单时网页直接读取固定文件名）
+
+    每个品种另有期货公司文件索引 SHFE_rb.brokers.json（期货公司名 -> 文件名/行数/起止日期/大小/sha256），
+    网页据此列出有专用数据的期货公司，不必逐个探测文件是否存在
+    """
+    name = 'csv'
+
+    def __init__(self, directory='.', generations=True, keep_generations=2):
+        self.directory = directory
+        self.generations = generations
+        self.keep_generations = max(int(keep_generations), 1)
+        # 本次运行已写入但尚未发布的文件 {(交易所, 品种): {文件名: {'path': 暂存路径, 'rows': 行数, ...}}}
+        self._staged = {}
+
+    def manifest_path(self, exchange, product):
+        return os.path.join(self.directory, get_manifest_filename(exchange, product))
+
+    def broker_index_path(self, exchange, product):
+        return os.path.join(self.directory, get_broker_index_filename(exchange, product))
+
+    def read_broker_index(self, exchange, product):
+        """
+        读取期货公司文件索引 {期货公司: 索引项}，不存在或无法解析时返回空 dict
+        """
+        path = self.broker_index_path(exchange, product)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f).get('brokers', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _write_broker_index(self, exchange, product, brokers):
+        atomic_write_json(self.broker_index_path(exchange, product), {
+            'product': f"{exchange}.{product}",
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'brokers': {broker: brokers[broker] for broker in sorted(brokers)},
+        })
+
+    def read_manifest(self, exchange, product):
+        """
+        读取品种版本清单，不存在时返回 None
+        """
+        path = self.manifest_path(exchange, product)
+        if not self.generations or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def location(self, exchange, product, broker=None):
+        """
+        当前保存该输出数据的文件：本次已暂存的新文件 > 清单中的当前版本 > 固定文件名
+        """
+        filename = get_csv_filename(exchange, product, broker)
+        staged = self._staged.get((exchange, product), {})
+        if filename in staged:
+            return staged[filename]['path']
+        manifest = self.read_manifest(exchange, product)
+        entry = (manifest or {}).get('files', {}).get(filename)
+        if entry is not None:
+            path = os.path.join(self.directory, entry['path'])
+            if os.path.exists(path):
+                return path
+        return os.path.join(self.directory, filename)
+
+    def load(self, exchange, product, broker=None):
+        return load_existing_data(self.location(exchange, product, broker))
+
+    def _generation_dir(self, exchange, product, generation):
+        return os.path.join(self.directory, GENERATIONS_DIR, f"{exchange}_{product}", f"{generation:06d}")
+
+    def save(self, exchange, product, broker, existing_df, result):
+        """
+        保存一次增量合并的结果，返回写入说明
+        generations 为 True 时只写入新版本目录，commit() 之后才对读取方可见
+        """
+        csv_filename = self.location(exchange, product, broker)
+        os.makedirs(self.directory, exist_ok=True)
+        output = None
+        if self.generations:
+            manifest = self.read_manifest(exchange, product) or {}
+            generation = manifest.get('generation', 0) + 1
+            filename = get_csv_filename(exchange, product, broker)
+            output = os.path.join(self._generation_dir(exchange, product, generation), filename)
+        appended = save_merged_data(csv_filename, existing_df, result.merged_df,
+                                    result.patched_count, result.appended_df, output)
+        if output is not None:
+            self._staged.setdefault((exchange, product), {})[filename] = {
+                'path': output, 'rows': len(result.merged_df), 'broker': broker,
+                # 期货公司文件发布时统计索引项（全市场文件不进索引，不保留数据）
+                'df': result.merged_df if broker else None}
+            return f"{'追加' if appended else '重写'} {os.path.abspath(output)}（待发布）"
+        if broker:
+            brokers = self.read_broker_index(exchange, product)
+            brokers[broker] = describe_ranking_file(csv_filename, broker, result.merged_df)
+            self._write_broker_index(exchange, product, brokers)
+        return f"{'追加' if appended else '重写'} {os.path.abspath(csv_filename)}"
+
+    def commit(self):
+        """
+        发布本次暂存的各品种新版本，返回发布说明列表
+        """
+        messages = []
+        for (exchange, product), staged in sorted(self._staged.items()):
+            messages.append(self._publish(exchange, product, staged))
+        self._staged = {}
+        return messages
+
+    def _publish(self, exchange, product, staged):
+        manifest = self.read_manifest(exchange, product) or {}
+        generation = manifest.get('generation', 0) + 1
+        generation_dir = self._generation_dir(exchange, product, generation)
+        rows = {filename: entry['rows'] for filename, entry in staged.items()}
+        # 未变化的文件链接进新版本目录，清单中只引用同一个版本目录
+        for filename, entry in manifest.get('files', {}).items():
+            source = os.path.join(self.directory, entry['path'])
+            if filename not in staged and os.path.exists(source):
+                atomic_link(source, os.path.join(generation_dir, filename))
+                rows[filename] = entry['rows']
+        # 首次发布时把已有的固定文件名文件一并纳入版本
+        if not manifest:
+            prefix = get_csv_filename(exchange, product)[:-4]
+            for filename in os.listdir(self.directory):
+                legacy = filename == f"{prefix}.csv" or (filename.startswith(f"{prefix}_")
+                                                         and filename.endswith('.csv'))
+                if legacy and filename not in staged:
+                    atomic_link(os.path.join(self.directory, filename), os.path.join(generation_dir, filename))
+                    with open(os.path.join(generation_dir, filename), encoding='utf-8-sig') as f:
+                        rows[filename] = max(sum(1 for _ in f) - 1, 0)
+        fsync_directory(generation_dir)
+        files = {}
+        for filename in sorted(rows):
+            path = os.path.join(generation_dir, filename)
+            files[filename] = {
+                'path': os.path.relpath(path, self.directory).replace(os.sep, '/'),
+                'rows': rows[filename],
+                'bytes': os.path.getsize(path),
+            }
+        atomic_write_json(self.manifest_path(exchange, product), {
+            'product': f"{exchange}.{product}",
+            'generation': generation,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'files': files,
+        })
+        # 清单已切换；固定文件名逐个原子替换为新版本（兼容直接按文件名读取的旧页面和脚本）
+        for filename in staged:
+            atomic_link(os.path.join(generation_dir, filename), os.path.join(self.directory, filename))
+        # 索引在文件都可读之后更新：本次写入的文件重新统计，其余沿用旧索引（旧数据目录首次发布时读取统计）
+        previous = {entry['file']: entry for entry in self.read_broker_index(exchange, product).values()}
+        brokers = {}
+        for filename in files:
+            if filename == get_csv_filename(exchange, product):
+                continue
+            path = os.path.join(generation_dir, filename)
+            if filename in staged:
+                entry = describe_ranking_file(path, staged[filename]['broker'], staged[filename]['df'])
+            else:
+                entry = previous.get(filename) or describe_ranking_file(path)
+            if entry['broker']:
+                brokers[entry['broker']] = entry
+        self._write_broker_index(exchange, product, brokers)
+        self._remove_old_generations(exchange, product, generation)
+        return f"{exchange}.{product} 发布版本 {generation}（{len(files)} 个文件）"
+
+    def _remove_old_generations(self, exchange, product, generation):
+        root = os.path.join(self.directory, GENERATIONS_DIR, f"{exchange}_{product}")
+        for name in os.listdir(root):
+            if not name.isdigit() or int(name) > generation - self.keep_generations:
+                continue
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+# 写入 Parquet 时使用字典编码的列
+DICTIONARY_COLUMNS = ['ranking_type', 'ranking_type_name', 'symbol', 'broker']
+
+
+class ParquetStorage:
+    """
+    Parquet 存储：{root}/exchange=SHFE/product=rb/dataset=market/trade_date=20250829/part-0.parquet
+    dataset 为 market（全市场）或清洗后的期货公司名；broker/symbol 等文本列使用字典编码
+    """
+    name = 'parquet'
+
+    def __init__(self, root='ranking_parquet', export_csv=True, csv_directory='.', keep_generations=2):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("parquet 存储需要安装 pyarrow: pip install pyarrow")
+        self.root = root
+        self.csv = CsvStorage(csv_directory, keep_generations=keep_generations) if export_csv else None
+
+    @staticmethod
+    def dataset_name(broker=None):
+        return clean_broker_name(broker) if broker else 'market'
+
+    def location(self, exchange, product, broker=None):
+        return os.path.join(self.root, f"exchange={exchange}", f"product={product}",
+                            f"dataset={self.dataset_name(broker)}")
+
+    def read(self, exchange, product, broker=None, start=None, end=None, symbols=None):
+        """
+        读取数据集，日期(YYYYMMDD)和合约过滤条件下推到分区/行组，文本列保持 category 类型
+        """
+        import pyarrow.dataset as ds
+
+        directory = self.location(exchange, product, broker)
+        if not os.path.isdir(directory):
+            return pd.DataFrame()
+        dataset = ds.dataset(directory, format='parquet', partitioning='hive')
+        condition = None
+        for expr in (
+            ds.field('trade_date') >= int(start) if start is not None else None,
+            ds.field('trade_date') <= int(end) if end is not None else None,
+            ds.field('symbol').isin(list(symbols)) if symbols is not None else None,
+        ):
+            if expr is not None:
+                condition = expr if condition is None else condition & expr
+        df = dataset.to_table(filter=condition).to_pandas()
+        return df.drop(columns=['trade_date'], errors='ignore')
+
+    def load(self, exchange, product, broker=None):
+        try:
+            df = self.read(exchange, product, broker)
+        except Exception as e:
+            raise ValueError(f"无法读取现有数据 {self.location(exchange, product, broker)}: {e}"
+                             f"（为保护历史数据，已停止写入）")
+        if len(df) > 0:
+            df = apply_ranking_schema(df)
+            print(f"  [OK] 加载现有数据: {len(df)} 条记录")
+        return df
+
+    def save(self, exchange, product, broker, existing_df, result):
+        """
+        只重写本次新数据涉及的交易日分区
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        merged = result.merged_df
+        dates = merged['datetime']
+        touched = sorted(set(result.new_df['datetime']))
+        directory = self.location(exchange, product, broker)
+        for trade_date in touched:
+            part = merged[dates == trade_date].copy()
+            for col in DICTIONARY_COLUMNS:
+                if col in part.columns:
+                    part[col] = part[col].astype('category').cat.remove_unused_categories()
+            partition_dir = os.path.join(directory, f"trade_date={trade_date}")
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            with atomic_open(os.path.join(partition_dir, 'part-0.parquet'), 'wb') as f:
+                pq.write_table(table, f)
+        message = f"写入 {len(touched)} 个交易日分区 {os.path.abspath(directory)}"
+        if self.csv is not None:
+            message += f"；CSV {self.csv.save(exchange, product, broker, existing_df, result)}"
+        return message
+
+    def commit(self):
+        return self.csv.commit() if self.csv is not None else []
+
+
+class NormalizedStorage:
+    """
+    规范化存储：{directory}/SHFE_rb.facts.csv，每个 (日期, 合约, 期货公司) 一行 + 入榜标记
+    export_csv 为 True 时同时维护原有宽表 CSV（兼容视图）
+    """
+    name = 'normalized'
+
+    def __init__(self, directory='ranking_facts', export_csv=True, csv_directory='.', keep_generations=2):
+        self.directory = directory
+        self.csv = CsvStorage(csv_directory, keep_generations=keep_generations) if export_csv else None
+        self._facts = {}
+
+    def location(self, exchange, product, broker=None):
+        return os.path.join(self.directory, get_csv_filename(exchange, product, broker)[:-4] + '.facts.csv')
+
+    def load(self, exchange, product, broker=None):
+        """
+        读取事实表，返回兼容视图（宽表），供增量计划与合并使用
+        """
+        facts = load_existing_data(self.location(exchange, product, broker))
+        if len(facts) > 0:
+            for flag in MEMBERSHIP_COLUMNS.values():
+                facts[flag] = facts[flag].astype(bool)
+        self._facts[(exchange, product, broker)] = facts
+        return denormalize_rankings(facts)
+
+    def save(self, exchange, product, broker, existing_df, result):
+        old_facts = self._facts.get((exchange, product, broker), pd.DataFrame())
+        fact_result = upsert_facts(old_facts, normalize_rankings(result.new_df))
+        self._facts[(exchange, product, broker)] = fact_result.merged_df
+        os.makedirs(self.directory, exist_ok=True)
+        filename = self.location(exchange, product, broker)
+        appended = save_merged_data(filename, old_facts, fact_result.merged_df,
+                                    fact_result.patched_count, fact_result.appended_df)
+        message = (f"{'追加' if appended else '重写'} {os.path.abspath(filename)}"
+                   f"（{len(fact_result.merged_df)} 条事实记录）")
+        if self.csv is not None:
+            message += f"；CSV {self.csv.save(exchange, product, broker, existing_df, result)}"
+        return message
+
+    def commit(self):
+        return self.csv.commit() if self.csv is not None else []
+
+
+class SqliteStorage:
+    """
+    SQLite 存储：所有品种/期货公司的数据保存在同一个数据库的 rankings 表中
+    dataset 列区分全市场（market）与各期货公司专用数据，主键为 dataset + 去重键
+    """
+    name = 'sqlite'
+
+    def __init__(self, path='ranking_history.sqlite3', export_csv=True, csv_directory='.', keep_generations=2):
+        self.path = path
+        self.csv = CsvStorage(csv_directory, keep_generations=keep_generations) if export_csv else None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        text_columns = {'ranking_type', 'ranking_type_name', 'datetime', 'symbol',
+                        'exchange_id', 'instrument_id', 'broker'}
+        column_defs = ", ".join(
+            f"{col} {'TEXT' if col in text_columns else 'REAL'}" for col in RANKING_COLUMNS
+        )
+        key = ", ".join(['dataset'] + KEY_COLUMNS)
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS rankings ("
+                f"dataset TEXT NOT NULL, product TEXT NOT NULL, {column_defs}, PRIMARY KEY ({key}))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_rankings_symbol ON rankings (symbol, datetime)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_rankings_broker ON rankings (broker, datetime)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_rankings_product ON rankings (dataset, product, datetime)")
+
+    @staticmethod
+    def dataset_name(broker=None):
+        return clean_broker_name(broker) if broker else 'market'
+
+    def location(self, exchange, product, broker=None):
+        return f"{os.path.abspath(self.path)}#{self.dataset_name(broker)}/{exchange}.{product}"
+
+    def load(self, exchange, product, broker=None):
+        columns = ", ".join(RANKING_COLUMNS)
+        df = pd.read_sql_query(
+            f"SELECT {columns} FROM rankings WHERE dataset = ? AND exchange_id = ? AND product = ? "
+            f"ORDER BY datetime",
+            self.conn, params=(self.dataset_name(broker), exchange, product)
+        )
+        if len(df) > 0:
+            df = apply_ranking_schema(df)
+            print(f"  [OK] 加载现有数据: {len(df)} 条记录")
+        return df
+
+    def save(self, exchange, product, broker, existing_df, result):
+        """
+        一个事务内批量 INSERT ... ON CONFLICT DO UPDATE 本次的新数据
+        """
+        new_df = result.new_df
+        columns = [col for col in RANKING_COLUMNS if col in new_df.columns]
+        placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col not in KEY_COLUMNS)
+        sql = (
+            f"INSERT INTO rankings (dataset, product, {', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(['dataset'] + KEY_COLUMNS)}) DO UPDATE SET {updates}"
+        )
+        values = new_df[columns].astype(object).where(new_df[columns].notna(), None)
+        dataset = self.dataset_name(broker)
+        with self.conn:
+            self.conn.executemany(sql, ([dataset, product] + row for row in values.values.tolist()))
+        message = f"upsert {len(new_df)} 条到 {self.location(exchange, product, broker)}"
+        if self.csv is not None:
+            message += f"；CSV {self.csv.save(exchange, product, broker, existing_df, result)}"
+        return message
+
+    def commit(self):
+        return self.csv.commit() if self.csv is not None else []
+
+    def available_dates(self, symbol, broker=None):
+        """
+        某合约已有数据的交易日列表（走 symbol, datetime 索引）
+        """
+        rows = self.conn.execute(
+            "SELECT DISTINCT datetime FROM rankings WHERE symbol = ? AND dataset = ? ORDER BY datetime",
+            (symbol, self.dataset_name(broker))
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def broker_positions(self, broker, start=None, end=None):
+        """
+        某期货公司在各合约上的排名数据（走 broker, datetime 索引），日期为 YYYYMMDD
+        """
+        sql = f"SELECT {', '.join(RANKING_COLUMNS)} FROM rankings WHERE broker = ? AND dataset = 'market'"
+        params = [broker]
+        if start is not None:
+            sql += " AND datetime >= ?"
+            params.append(str(start))
+        if end is not None:
+            sql += " AND datetime <= ?"
+            params.append(str(end))
+        return pd.read_sql_query(sql + " ORDER BY datetime, symbol", self.conn, params=params)
+
+    def close(self):
+        self.conn.close()
+
+
+class SegmentStorage:
+    """
+    分段存储：{root}/SHFE_rb[_期货公司]/base.csv + segments/{写入时间}-{交易日}.csv
+    每次保存只把本次的新数据按交易日写成新的分段文件（写入后不再修改），不读写历史数据；
+    读取时按写入顺序把分段合并到基础文件上（规则同 merge_and_deduplicate：相同去重键保留新的）。
+    一个数据集的分段数达到 compact_after 时，commit() 把分段压缩进按日期排序的新基础文件
+    export_csv 默认关闭：导出的 CSV 每次都要追加或重写整份品种文件，抵消只写新数据的好处
+    """
+    name = 'segments'
+
+    def __init__(self, root='ranking_segments', compact_after=30, export_csv=False, csv_directory='.', keep_generations=2):
+        self.root = root
+        self.compact_after = max(int(compact_after), 1)
+        self.csv = CsvStorage(csv_directory, keep_generations=keep_generations) if export_csv else None
+        # 本次运行写入过分段的数据集
+        self._touched = set()
+
+    def location(self, exchange, product, broker=None):
+        return os.path.join(self.root, get_csv_filename(exchange, product, broker)[:-4])
+
+    def _segment_files(self, directory):
+        segment_dir = os.path.join(directory, 'segments')
+        if not os.path.isdir(segment_dir):
+            return []
+        # 文件名以写入时间开头，按文件名排序即写入顺序
+        return [os.path.join(segment_dir, name) for name in sorted(os.listdir(segment_dir))
+                if name.endswith('.csv')]
+
+    def _read(self, directory):
+        """
+        返回 (合并视图, 已合并的分段文件列表)
+        """
+        base = load_existing_data(os.path.join(directory, 'base.csv'))
+        segment_files = self._segment_files(directory)
+        frames = []
+        for path in segment_files:
+            try:
+                frames.append(read_ranking_csv(path))
+            except Exception as e:
+                raise ValueError(f"无法读取分段文件 {path}: {e}（为保护历史数据，已停止写入）")
+        if frames:
+            # 基础文件为空（尚未压缩）时分段之间同样要去重，merge_and_deduplicate 遇到空的旧数据会原样返回新数据
+            merged = upsert_rows(base, concat_rankings(frames)).merged_df
+            print(f"  [OK] 合并 {len(segment_files)} 个分段: 共 {len(merged)} 条记录")
+            return merged, segment_files
+        return base, segment_files
+
+    def load(self, exchange, product, broker=None):
+        return self._read(self.location(exchange, product, broker))[0]
+
+    def save(self, exchange, product, broker, existing_df, result):
+        """
+        本次新数据按交易日各写一个分段文件
+        """
+        new_df = result.new_df
+        directory = self.location(exchange, product, broker)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        for trade_date, part in new_df.groupby(new_df['datetime'], sort=True):
+            path = os.path.join(directory, 'segments', f"{stamp}-{trade_date}.csv")
+            with atomic_open(path, 'w', encoding='utf-8', newline='') as f:
+                part.to_csv(f, index=False)
+        self._touched.add(directory)
+        message = f"写入 {new_df['datetime'].nunique()} 个交易日分段 {os.path.abspath(directory)}"
+        if self.csv is not None:
+            message += f"；CSV {self.csv.save(exchange, product, broker, existing_df, result)}"
+        return message
+
+    def compact(self, directory):
+        """
+        把数据集的全部分段合并进新的基础文件（按日期稳定排序），然后删除这些分段
+        基础文件原子替换后才删除分段，中途中断时剩余分段会再次合并，结果不变
+        """
+        merged, segment_files = self._read(directory)
+        if not segment_files:
+            return 0
+        if len(merged) > 0:
+            merged = merged.sort_values('datetime', kind='stable')
+        with atomic_open(os.path.join(directory, 'base.csv'), 'w', encoding='utf-8-sig', newline='') as f:
+            merged.to_csv(f, index=False)
+        for path in segment_files:
+            os.remove(path)
+        fsync_directory(os.path.join(directory, 'segments'))
+        return len(segment_files)
+
+    def commit(self):
+        messages = self.csv.commit() if self.csv is not None else []
+        for directory in sorted(self._touched):
+            if len(self._segment_files(directory)) >= self.compact_after:
+                count = self.compact(directory)
+                messages.append(f"压缩 {count} 个分段到 {os.path.abspath(os.path.join(directory, 'base.csv'))}")
+        self._touched = set()
+        return messages
+
+
+def create_storage(backend='csv', **options):
+    """
+    按名称创建存储后端
+    export_csv 为 None 或未给出时按后端默认：segments 不导出 CSV，其他非 csv 后端导出
+    """
+    keep_generations = options.get('keep_generations', 2)
+    export_csv = options.get('export_csv')
+    if export_csv is None:
+        export_csv = backend != 'segments'
+    if backend == 'csv':
+        return CsvStorage(options.get('csv_directory', '.'), keep_generations=keep_generations)
+    if backend == 'parquet':
+        return ParquetStorage(options.get('parquet_dir', 'ranking_parquet'),
+                              export_csv=export_csv,
+                              csv_directory=options.get('csv_directory', '.'),
+                              keep_generations=keep_generations)
+    if backend == 'normalized':
+        return NormalizedStorage(options.get('normalized_dir', 'ranking_facts'),
+                                 export_csv=export_csv,
+                                 csv_directory=options.get('csv_directory', '.'),
+                                 keep_generations=keep_generations)
+    if backend == 'sqlite':
+        return SqliteStorage(options.get('sqlite_path', 'ranking_history.sqlite3'),
+                             export_csv=export_csv,
+                             csv_directory=options.get('csv_directory', '.'),
+                             keep_generations=keep_generations)
+    if backend == 'segments':
+        return SegmentStorage(options.get('segments_dir', 'ranking_segments'),
+                              compact_after=options.get('compact_after', 30),
+                              export_csv=export_csv,
+                              csv_directory=options.get('csv_directory', '.'),
+                              keep_generations=keep_generations)
+    raise ValueError(f"未知的存储后端: {backend}")
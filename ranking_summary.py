@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+持仓排行榜的预计算汇总
+
+网页的持仓排行榜（script.js 的 renderRankings / calculateSummary）每次查询都要在浏览器中
+把整份品种 CSV 按 (合约, 日期) 过滤、按期货公司取最大值、排序并计算合计。这里在每次合并后
+为本次涉及的每个 (合约, 交易日) 生成一个几 KB 的 JSON，内容与网页的计算结果一致，网页直接渲染：
+
+    {summary_dir}/SHFE_rb/index.json                 各合约有汇总的交易日 {"SHFE.rb2601": [20250829, ...]}
+    {summary_dir}/SHFE_rb/SHFE.rb2601/20250829.json  当日五张排名表（成交量/多头/空头/净多/净空）及数据范围 scope
+
+每张表：items 为 [期货公司, 数值, 增减, 名次]（净持仓表没有增减，为 null），最多 TOP_N 条；
+summary 为 本日合计 / 上日合计 / 总量增减 / 前5/10/20名合计，字段名与 calculateSummary 一致。
+上日为该合约在数据中的前一个交易日（而不是前一个自然日）。
+"""
+
+import os
+
+import pandas as pd
+
+from atomic_io import atomic_write_json
+from ranking_schema import MARKET_SCOPE
+
+# 每张排名表保留的名次数（与网页一致）
+TOP_N = 20
+
+# 没有名次时的占位名次（与网页一致）
+NO_RANK = 999
+
+# 成交量/多头/空头表使用的列：(数值列, 增减列, 名次列)
+RANKING_FIELDS = {
+    'volume': ('volume', 'volume_change', 'volume_ranking'),
+    'long': ('long_oi', 'long_change', 'long_ranking'),
+    'short': ('short_oi', 'short_change', 'short_ranking'),
+}
+
+
+def _broker_leaders(rows, value_col, change_col, rank_col):
+    """
+    按期货公司取数值最大的一行（同一公司可能出现在三张排名表中），只保留数值大于 0 的公司
+    返回列 broker, value, change, rank 的 DataFrame，按公司首次出现的顺序排列
+    """
+    values = rows[value_col].fillna(0)
+    valid = rows[values > 0]
+    if valid.empty:
+        return pd.DataFrame(columns=['broker', 'value', 'change', 'rank'])
+    best = valid.loc[valid.groupby('broker', sort=False, observed=True)[value_col].idxmax()]
+    rank = best[rank_col].fillna(0).astype('int64')
+    return pd.DataFrame({
+        'broker': best['broker'].astype(str).to_numpy(),
+        'value': best[value_col].astype('int64').to_numpy(),
+        'change': best[change_col].fillna(0).astype('int64').to_numpy(),
+        'rank': rank.where(rank > 0, NO_RANK).to_numpy(),
+    })
+
+
+def _broker_totals(rows):
+    """
+    各期货公司当日的最大成交量/多头持仓/空头持仓（没有数据为 0），{公司: {列: 值}}
+    """
+    if rows.empty:
+        return {}
+    columns = [value_col for value_col, _, _ in RANKING_FIELDS.values()]
+    totals = rows[['broker'] + columns].copy()
+    totals[columns] = totals[columns].fillna(0)
+    return totals.groupby('broker', sort=False, observed=True)[columns].max().astype('int64').to_dict('index')
+
+
+def _summary(values, prev_total):
+    today_total = int(sum(values))
+    return {
+        'todayTotal': today_total,
+        'prevTotal': int(prev_total),
+        'change': today_total - int(prev_total),
+        'top5Total': int(sum(values[:5])),
+        'top10Total': int(sum(values[:10])),
+        'top20Total': int(sum(values[:20])),
+    }
+
+
+def summarize_day(rows, prev_rows):
+    """
+    一个合约一个交易日的五张排名表及汇总
+    rows / prev_rows: 该合约当日 / 上一交易日的全部排名行
+    """
+    tables = {}
+    totals = _broker_totals(rows)
+    prev_totals = _broker_totals(prev_rows)
+    for name, (value_col, change_col, rank_col) in RANKING_FIELDS.items():
+        leaders = _broker_leaders(rows, value_col, change_col, rank_col)
+        if name == 'volume':
+            leaders = leaders.sort_values('rank', kind='stable')
+        else:
+            # 有名次的按名次，其余（只出现在其他排名表中的公司）按数值排在后面并顺延名次
+            leaders = leaders.assign(unranked=leaders['rank'] == NO_RANK)
+            leaders = leaders.sort_values(['unranked', 'rank', 'value'], ascending=[True, True, False], kind='stable')
+            leaders = leaders.head(TOP_N).reset_index(drop=True)
+            position = pd.Series(range(1, len(leaders) + 1))
+            leaders['rank'] = leaders['rank'].where(~leaders['unranked'], position)
+        leaders = leaders.head(TOP_N)
+        prev_total = sum(broker[value_col] for broker in prev_totals.values())
+        tables[name] = {
+            'items': [[broker, int(value), int(change), int(rank)] for broker, value, change, rank
+                      in leaders[['broker', 'value', 'change', 'rank']].itertuples(index=False)],
+            'summary': _summary(leaders['value'].tolist(), prev_total),
+        }
+    for name, sign in (('netLong', 1), ('netShort', -1)):
+        net = [(broker, sign * (values['long_oi'] - values['short_oi'])) for broker, values in totals.items()]
+        net = sorted([item for item in net if item[1] > 0], key=lambda item: -item[1])[:TOP_N]
+        prev_total = sum(max(sign * (values['long_oi'] - values['short_oi']), 0) for values in prev_totals.values())
+        tables[name] = {
+            'items': [[broker, int(value), None, i + 1] for i, (broker, value) in enumerate(net)],
+            'summary': _summary([value for _, value in net], prev_total),
+        }
+    return tables
+
+
+def _product_dir(summary_dir, exchange, product):
+    return os.path.join(summary_dir, f"{exchange}_{product}")
+
+
+def write_summaries(merged_df, new_df, summary_dir, exchange, product, scope=MARKET_SCOPE):
+    """
+    为本次新数据涉及的 (合约, 交易日) 及其后一个交易日（其“上日合计”随之变化）重写汇总 JSON，
+    并更新品种的汇总索引；返回写入的文件数
+    merged_df: 合并后的全市场数据；new_df: 本次合并的新数据
+    scope: 数据范围，全市场为 MARKET_SCOPE，否则为期货公司列表（网页只使用全市场的汇总）
+    """
+    if merged_df.empty or new_df.empty:
+        return 0
+    directory = _product_dir(summary_dir, exchange, product)
+    symbols = merged_df['symbol'].astype(str)
+    index = {symbol: sorted(int(day) for day in days)
+             for symbol, days in merged_df['datetime'].groupby(symbols, sort=True).unique().items()}
+    touched = new_df.groupby(new_df['symbol'].astype(str))['datetime'].unique()
+    scope = scope if scope == MARKET_SCOPE else sorted(scope)
+    written = 0
+    for symbol, touched_days in touched.items():
+        dates = index.get(symbol, [])
+        touched_days = {int(day) for day in touched_days}
+        # 本次涉及的交易日，以及上一交易日被涉及的交易日
+        targets = [(day, dates[i - 1] if i > 0 else None) for i, day in enumerate(dates)
+                   if day in touched_days or (i > 0 and dates[i - 1] in touched_days)]
+        needed = {day for pair in targets for day in pair if day is not None}
+        rows = merged_df[(symbols == symbol) & merged_df['datetime'].isin(needed)]
+        by_date = dict(tuple(rows.groupby('datetime', sort=False)))
+        for day, prev_day in targets:
+            prev_rows = by_date[prev_day] if prev_day is not None else rows.iloc[:0]
+            atomic_write_json(os.path.join(directory, symbol, f"{day}.json"), {
+                'symbol': symbol,
+                'date': day,
+                'prev_date': prev_day,
+                'scope': scope,
+                'rankings': summarize_day(by_date[day], prev_rows),
+            }, indent=None)
+            written += 1
+    atomic_write_json(os.path.join(directory, 'index.json'), index, indent=None)
+    return written
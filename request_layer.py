@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+持仓排名查询的请求层：自适应限速 + 抖动指数退避重试 + 运行统计
+
+- 令牌桶限制每秒发出的查询数；遇到限流时速率减半，之后每次成功缓慢回升（AIMD）
+- 单个查询失败后按 base * 2^n 的随机抖动间隔重试，超过次数进入重试队列
+- 重试队列在本次运行所有查询结束后统一再执行一轮，仍失败的记为最终失败
+"""
+
+import asyncio
+import contextlib
+import random
+import time
+
+
+def is_throttle_error(error):
+    """
+    判断异常是否为服务端限流
+    """
+    status = getattr(error, 'status', None)
+    if status in (429, 503):
+        return True
+    text = str(error).lower()
+    return '429' in text or 'too many requests' in text or '限流' in text
+
+
+def is_timeout_error(error):
+    return isinstance(error, asyncio.TimeoutError) or 'timeout' in type(error).__name__.lower() \
+        or '超时' in str(error)
+
+
+class AdaptiveTokenBucket:
+    """
+    异步令牌桶：rate 为每秒令牌数，burst 为桶容量
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.5, increase=0.5):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.increase = increase
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, 1))
+
+    def on_throttle(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+
+
+class RequestLayer:
+    """
+    包装单次查询：限速、超时、退避重试，并记录统计与重试队列
+    """
+
+    def __init__(self, rate=20, max_attempts=3, base_delay=1.0, max_delay=30.0, timeout=30.0):
+        self.bucket = AdaptiveTokenBucket(rate)
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.retry_queue = []
+        self.failed = []
+        self.draining = False
+        self.stats = {
+            'attempts': 0,
+            'successes': 0,
+            'retries': 0,
+            'throttles': 0,
+            'timeouts': 0,
+            'requeued': 0,
+            'final_failures': 0,
+        }
+
+    def backoff_delay(self, attempt):
+        """
+        第 attempt 次失败后的等待时间（full jitter）
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def record_error(self, error):
+        if is_throttle_error(error):
+            self.stats['throttles'] += 1
+            self.bucket.on_throttle()
+        elif is_timeout_error(error):
+            self.stats['timeouts'] += 1
+
+    async def call(self, request, slot=None):
+        """
+        执行 request()（返回协程的函数），失败时退避重试，全部失败则抛出最后一次的异常
+        slot 为限制在途查询数的信号量：先取得 slot，再取令牌并开始计时，
+        超时和限速只针对实际发出的请求，不包括排队等待 slot 的时间；退避等待时不占用 slot
+        """
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.backoff_delay(attempt - 1))
+            async with slot if slot is not None else contextlib.nullcontext():
+                await self.bucket.acquire()
+                self.stats['attempts'] += 1
+                try:
+                    result = await asyncio.wait_for(request(), self.timeout)
+                except Exception as e:
+                    self.record_error(e)
+                    last_error = e
+                    continue
+            self.stats['successes'] += 1
+            self.bucket.on_success()
+            return result
+        raise last_error
+
+    def give_up(self, unit):
+        """
+        查询单元重试用尽：首轮进入重试队列，重试队列阶段记为最终失败
+        """
+        if self.draining:
+            self.stats['final_failures'] += 1
+            self.failed.append(unit)
+        else:
+            self.stats['requeued'] += 1
+            self.retry_queue.append(unit)
+
+    def take_retry_queue(self):
+        """
+        取出重试队列，之后的失败记为最终失败
+        """
+        units, self.retry_queue = self.retry_queue, []
+        self.draining = True
+        return units
+
+    def end_retry_round(self):
+        """
+        重试队列执行完毕；之后新的失败重新进入重试队列（同一请求层用于多批查询时）
+        """
+        self.draining = False
+
+    def print_stats(self):
+        s = self.stats
+        print(f"请求统计: 尝试 {s['attempts']} 次, 成功 {s['successes']} 次, 重试 {s['retries']} 次, "
+              f"限流 {s['throttles']} 次, 超时 {s['timeouts']} 次, 进入重试队列 {s['requeued']} 个, "
+              f"最终失败 {s['final_failures']} 个, 当前限速 {self.bucket.rate:.1f} 次/秒")
+        for unit in self.failed:
+            print(f"  [FAIL] {unit.symbol} {unit.type_name}" + (f" ({unit.broker})" if unit.broker else "") +
+                  f" 从 {unit.start_dt} 起 {unit.days} 天")
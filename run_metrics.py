@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标记录
+
+每次运行把各阶段耗时、计数以 JSON Lines 格式追加写入指标文件（默认与 CSV 同目录），
+每行一个事件，字段 event 表示事件类型：
+  run_start      运行开始（任务列表、并行设置）
+  job            一个任务的配置摘要
+  query          单个查询单元完成（耗时、尝试次数、返回行数、是否失败）
+  stage          一个处理阶段完成（load / fetch / merge / write 等，附耗时与计数）
+  request_stats  请求层统计（尝试、重试、限流、超时等）
+  run_end        运行结束（总耗时、状态）
+同一次运行的所有事件带相同的 run_id，便于按运行、按公司、按合约聚合分析。
+"""
+
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def path_size(path):
+    """
+    文件或目录（递归）的字节数；不存在返回 0
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class RunMetrics:
+    """
+    JSON Lines 指标写入器；filename 为空时只在内存中计数，不写文件
+    keep_events 为 True 时事件同时保存在 events 列表中（工作进程把事件交回主进程写入）
+    """
+
+    def __init__(self, filename=None, keep_events=False):
+        self.filename = filename
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        self.started = time.perf_counter()
+        self.counters = {}
+        self.events = [] if keep_events else None
+        self._file = None
+        if filename:
+            directory = os.path.dirname(os.path.abspath(filename))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(filename, 'a', encoding='utf-8')
+
+    def emit(self, event, **fields):
+        """
+        写入一条事件
+        """
+        if self._file is None and self.events is None:
+            return
+        entry = {'run_id': self.run_id, 'ts': datetime.now().isoformat(timespec='milliseconds'),
+                 'event': event}
+        entry.update(fields)
+        if self.events is not None:
+            self.events.append(entry)
+        if self._file is not None:
+            self._write(entry)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        self._file.flush()
+
+    def merge(self, events, counters):
+        """
+        写入其他进程记录的事件（改用本次运行的 run_id）并累加其计数
+        """
+        for name, value in counters.items():
+            self.count(name, value)
+        if self._file is None:
+            return
+        for entry in events:
+            self._write(dict(entry, run_id=self.run_id))
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        计时一个阶段；with 块内可向返回的 dict 中补充计数字段，结束时一起写入
+        """
+        extra = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            self.emit('stage', stage=name, seconds=round(time.perf_counter() - start, 6), **extra)
+
+    def query(self, unit, seconds, attempts, rows, failed=False, restored=False):
+        """
+        记录一个查询单元的结果
+        """
+        self.count('queries')
+        self.count('query_rows', rows)
+        if failed:
+            self.count('query_failures')
+        self.emit('query', broker=unit.broker, symbol=unit.symbol, ranking_type=unit.ranking_type,
+                  start_dt=unit.start_dt, days=unit.days, seconds=round(seconds, 6),
+                  attempts=attempts, rows=rows, failed=failed, restored=restored)
+
+    def close(self, status='ok', **fields):
+        """
+        写入 run_end 事件并关闭文件
+        """
+        self.emit('run_end', status=status, seconds=round(time.perf_counter() - self.started, 6),
+                  counters=self.counters, **fields)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
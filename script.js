@@ -232,20 +232,189 @@ function getBrokerCsvFilename(product, brokerName) {
     return `${product}_${brokerClean}.csv`;
 }
 
-// 发现可用的品种CSV文件（当前只支持 SHFE_rb，可根据需要扩展）
+// 发现可用的品种CSV文件：有分片总清单时按清单中的全市场品种，否则使用已知的品种文件列表
 async function discoverProductFiles() {
-    // 这里直接返回已知的品种文件列表
+    const catalog = await loadShardCatalog();
+    const products = catalog && catalog.products
+        ? Object.keys(catalog.products).filter(product => isMarketScope(catalog.products[product])) : [];
+    if (products.length > 0) {
+        return products.sort().map(product => `${product}.csv`);
+    }
     // 如果将来有更多品种，只需在数组中追加，例如 "DCE_m.csv" 等
     return ["SHFE_rb.csv"];
 }
 
+// 按月分片（后端 data_shards.py 生成）：shards/manifest.json 列出全部品种，
+// shards/{品种}/manifest.json 列出各合约的交易日和各月分片（带内容哈希的路径/压缩版本/大小/sha256）。
+// 有分片时只加载所选日期所在月及之前 SHARD_LOOKBACK_MONTHS 个月的分片，首屏加载量不随历史增长；
+// 没有分片时加载整份品种 CSV
+const SHARD_DIR = 'shards';
+// 预计算文件（分片清单、汇总、跨期矩阵）的 scope 为 'market' 时才是全市场数据；
+// 其他取值（只有部分期货公司的数据）或没有 scope 的旧文件都不使用，改为加载品种 CSV 在浏览器中计算
+const MARKET_SCOPE = 'market';
+const SHARD_LOOKBACK_MONTHS = 3;   // 趋势图最长显示前三月
+let shardCatalog = null;
+
+function isMarketScope(entry) {
+    return !!entry && entry.scope === MARKET_SCOPE;
+}
+const shardManifests = {};         // { 品种: 品种分片清单 或 null }
+const loadedShards = {};           // { 品种: 已加载（含加载失败）的月份 Set }；无分片时为 null
+
+// 加载分片总清单（不使用缓存）；没有分片时返回 null
+async function loadShardCatalog() {
+    try {
+        const resp = await fetch(`${SHARD_DIR}/manifest.json`, { cache: 'no-store' });
+        shardCatalog = resp.ok ? await resp.json() : null;
+    } catch {
+        shardCatalog = null;
+    }
+    return shardCatalog;
+}
+
+// 加载品种分片清单并清空该品种已加载的分片记录；总清单中没有该品种或不是全市场数据时返回 null
+async function loadShardManifest(product) {
+    const entry = shardCatalog && shardCatalog.products ? shardCatalog.products[product] : null;
+    shardManifests[product] = null;
+    loadedShards[product] = null;
+    if (!isMarketScope(entry)) return null;
+    try {
+        const resp = await fetch(encodeURI(`${SHARD_DIR}/${entry.manifest}`), { cache: 'no-store' });
+        const manifest = resp.ok ? await resp.json() : null;
+        if (isMarketScope(manifest)) {
+            shardManifests[product] = manifest;
+            loadedShards[product] = new Set();
+        }
+    } catch (error) {
+        console.warn(`加载分片清单 ${product} 失败:`, error);
+    }
+    return shardManifests[product];
+}
+
+// 所选日期（YYYYMMDD）需要的分片：该月及之前 SHARD_LOOKBACK_MONTHS 个月
+function shardsForDate(product, dateStr) {
+    const manifest = shardManifests[product];
+    if (!manifest || !dateStr) return [];
+    const endMonth = parseInt(dateStr.substring(0, 6), 10);
+    let year = Math.floor(endMonth / 100);
+    let month = endMonth % 100 - SHARD_LOOKBACK_MONTHS;
+    while (month < 1) {
+        month += 12;
+        year -= 1;
+    }
+    const startMonth = year * 100 + month;
+    return manifest.shards.filter(shard => shard.month >= startMonth && shard.month <= endMonth);
+}
+
+// 所选日期需要的分片是否都已加载（无分片的品种总是 true）
+function hasShardsForDate(product, dateStr) {
+    const loaded = loadedShards[product];
+    return !loaded || shardsForDate(product, dateStr).every(shard => loaded.has(shard.month));
+}
+
+// 读取一个分片的文本：分片文件名带内容哈希、发布后不再修改，可直接使用缓存；
+// 浏览器支持 DecompressionStream 时读取 .gz 版本在本地解压（传输量约为原文件的 1/7），否则读取原文件
+async function fetchShardText(shard) {
+    const gz = shard.encodings && shard.encodings.gzip;
+    if (gz && typeof DecompressionStream !== 'undefined') {
+        try {
+            const resp = await fetch(encodeURI(`${SHARD_DIR}/${gz.path}`));
+            if (resp.ok) {
+                const stream = resp.body.pipeThrough(new DecompressionStream('gzip'));
+                return await new Response(stream).text();
+            }
+        } catch (error) {
+            // 服务器已按 Content-Encoding 解压等情况，退回读取原文件
+            console.warn(`解压分片 ${gz.path} 失败，改为读取原文件:`, error);
+        }
+    }
+    const resp = await fetch(encodeURI(`${SHARD_DIR}/${shard.path}`));
+    return resp.ok ? await resp.text() : null;
+}
+
+// 加载所选日期需要而尚未加载的分片，返回新加载的行
+async function loadShardsForDate(product, dateStr) {
+    const loaded = loadedShards[product];
+    if (!loaded) return [];
+    const missing = shardsForDate(product, dateStr).filter(shard => !loaded.has(shard.month));
+    const parts = await Promise.all(missing.map(async shard => {
+        // 先标记，加载失败也不重复请求
+        loaded.add(shard.month);
+        try {
+            const text = await fetchShardText(shard);
+            if (text === null) {
+                console.warn(`无法加载分片: ${shard.path}`);
+                return [];
+            }
+            return parseCSV(text);
+        } catch (error) {
+            console.warn(`加载分片 ${shard.path} 失败:`, error);
+            return [];
+        }
+    }));
+    const rows = [].concat(...parts);
+    if (missing.length > 0) {
+        console.log(`成功加载 ${product} 的 ${missing.length} 个月度分片: ${rows.length} 条记录`);
+    }
+    return rows;
+}
+
+// 品种版本清单缓存：{ 品种: manifest 或 null }
+// 后端整体发布一个品种的一组文件后才切换 {品种}.manifest.json，
+// 同一次浏览中全市场文件与各期货公司文件都按同一份清单读取，不会混用新旧版本
+const productManifests = {};
+
+// 加载品种版本清单（不使用缓存）；没有清单（旧数据目录）时返回 null
+async function loadProductManifest(product) {
+    try {
+        const resp = await fetch(encodeURI(`${product}.manifest.json`), { cache: 'no-store' });
+        productManifests[product] = resp.ok ? await resp.json() : null;
+    } catch {
+        productManifests[product] = null;
+    }
+    return productManifests[product];
+}
+
+// 期货公司文件索引缓存：{ 品种: { 期货公司: {file, rows, first_date, last_date, bytes, sha256} } 或 null }
+// 后端写出 {品种}.brokers.json，一次请求即可列出有专用数据的期货公司
+const brokerIndexes = {};
+
+// 加载期货公司文件索引（不使用缓存）；没有索引（旧数据目录）时返回 null
+async function loadBrokerIndex(product) {
+    try {
+        const resp = await fetch(encodeURI(`${product}.brokers.json`), { cache: 'no-store' });
+        brokerIndexes[product] = resp.ok ? (await resp.json()).brokers || {} : null;
+    } catch {
+        brokerIndexes[product] = null;
+    }
+    return brokerIndexes[product];
+}
+
+// 按版本清单解析文件的实际路径；清单中没有该文件时使用固定文件名
+function resolveProductFile(product, filename) {
+    const manifest = productManifests[product];
+    const entry = manifest && manifest.files ? manifest.files[filename] : null;
+    return entry && entry.path ? entry.path : filename;
+}
+
 // 加载品种CSV数据
 async function loadProductCSV(product) {
     if (!product) return [];
     
     try {
-        const filename = `${product}.csv`;
-        const response = await fetch(filename);
+        await loadProductManifest(product);
+        // 有月度分片时只加载最新交易日需要的几个月，其余月份在选择日期时按需加载
+        const shardManifest = await loadShardManifest(product);
+        if (shardManifest) {
+            const latest = Math.max(...shardManifest.shards.map(shard => shard.last_date));
+            return await loadShardsForDate(product, String(latest));
+        }
+        let filename = resolveProductFile(product, `${product}.csv`);
+        let response = await fetch(encodeURI(filename));
+        if (!response.ok && filename !== `${product}.csv`) {
+            filename = `${product}.csv`;
+            response = await fetch(encodeURI(filename));
+        }
         if (!response.ok) {
             console.warn(`无法加载文件: ${filename}`);
             return [];
@@ -323,7 +492,11 @@ async function onProductChange() {
             }
         }
 
-        const sortedSymbols = Array.from(symbolSet).sort();
+        // 分片模式下只加载了部分月份，合约列表以分片清单为准
+        const shardManifest = shardManifests[product];
+        const sortedSymbols = shardManifest
+            ? Object.keys(shardManifest.symbols).sort()
+            : Array.from(symbolSet).sort();
         populateContractSelect(sortedSymbols);
 
         // 按当前选中合约统计可用日期，并初始化日期选择器
@@ -385,6 +558,15 @@ function populateContractSelect(symbols) {
 // 根据当前选择（合约）计算可用日期列表
 function getAvailableDatesForSelection(selectedContract) {
     const dateSet = new Set();
+    // 分片模式下交易日以分片清单为准（未加载的月份也可选择）
+    const shardManifest = shardManifests[currentProduct];
+    if (shardManifest) {
+        Object.entries(shardManifest.symbols).forEach(([symbol, dates]) => {
+            if (selectedContract && symbol !== selectedContract) return;
+            dates.forEach(d => dateSet.add(String(d)));
+        });
+        return Array.from(dateSet).sort();
+    }
     for (let i = 0, len = allData.length; i < len; i++) {
         const row = allData[i];
         if (!row.datetime) continue;
@@ -459,6 +641,17 @@ function queryData() {
     const dateStr = dateInput.replace(/-/g, '');
     const rowDateYmd = (dt) => (dt && typeof dt === 'string') ? (dt.length >= 8 ? dt.substring(0, 8) : dt) : '';
 
+    // 分片模式：所选日期需要的月份尚未加载时，先加载再重新查询
+    if (!hasShardsForDate(currentProduct, dateStr)) {
+        const product = currentProduct;
+        loadShardsForDate(product, dateStr).then(rows => {
+            if (product !== currentProduct) return;
+            allData = allData.concat(rows);
+            queryData();
+        });
+        return;
+    }
+
     // 获取本日数据
     // 如果选择了具体合约，只显示该合约；否则显示该品种下所有合约
     csvData = allData.filter(row => {
@@ -467,10 +660,10 @@ function queryData() {
         return true;
     });
     
-    // 获取上日数据（用于对比）
-    const dateObj = new Date(dateInput);
-    dateObj.setDate(dateObj.getDate() - 1);
-    const prevDateStr = dateObj.toISOString().slice(0, 10).replace(/-/g, '');
+    // 获取上日数据（用于对比）：当前合约在数据中的前一个交易日（与预计算汇总一致，跳过周末和节假日）
+    const sortedDates = Array.from(availableDateSet).sort();
+    const datePos = sortedDates.indexOf(dateStr);
+    const prevDateStr = datePos > 0 ? sortedDates[datePos - 1] : '';
     
     csvDataPrev = allData.filter(row => {
         if (rowDateYmd(row.datetime) !== prevDateStr) return false;
@@ -485,7 +678,7 @@ function queryData() {
         return;
     }
     
-    renderRankings();
+    renderRankingsForSelection(selectedContract, dateStr);
     renderAnalysisCharts();
 }
 
@@ -506,10 +699,47 @@ function findLatestDateForProduct() {
 }
 
 
+// 持仓排行榜预计算汇总（后端 ranking_summary.py 生成）：summaries/{品种}/{合约}/{YYYYMMDD}.json
+// 每个 (合约, 交易日) 几 KB，内容与 renderRankings 在浏览器中的计算结果一致
+const SUMMARY_DIR = 'summaries';
+let rankingRequestId = 0;
+
+async function loadRankingSummary(product, symbol, dateStr) {
+    if (!product || !symbol || !dateStr) return null;
+    try {
+        const resp = await fetch(encodeURI(`${SUMMARY_DIR}/${product}/${symbol}/${dateStr}.json`), { cache: 'no-cache' });
+        return resp.ok ? await resp.json() : null;
+    } catch {
+        return null;
+    }
+}
+
+// 优先使用全市场的预计算汇总渲染排名，没有汇总（旧数据目录）或不是全市场数据时在浏览器中计算
+async function renderRankingsForSelection(symbol, dateStr) {
+    const requestId = ++rankingRequestId;
+    const startTime = performance.now();
+    const summary = await loadRankingSummary(currentProduct, symbol, dateStr);
+    // 等待期间用户已切换选择，丢弃过期结果
+    if (requestId !== rankingRequestId) return;
+    if (!isMarketScope(summary)) {
+        renderRankings();
+        return;
+    }
+    const tables = {};
+    Object.keys(summary.rankings).forEach(type => {
+        const table = summary.rankings[type];
+        tables[type] = {
+            data: table.items.map(([broker, value, change, rank]) =>
+                (change === null ? { broker, value, rank } : { broker, value, change, rank })),
+            summary: table.summary
+        };
+    });
+    renderRankingTables(tables, startTime);
+}
+
 // 渲染排名（优化版）
 function renderRankings() {
     const startTime = performance.now();
-    const container = document.getElementById('rankings-container');
     
     // 合并同一天同一期货公司的数据（优化：减少parseFloat调用）
     const brokerMap = new Map();
@@ -640,19 +870,6 @@ function renderRankings() {
     netShortData.sort((a, b) => b.value - a.value).splice(20);
     netShortData.forEach((d, i) => { d.rank = i + 1; });
     
-    // 使用DocumentFragment优化DOM操作
-    const fragment = document.createDocumentFragment();
-    const grid = document.createElement('div');
-    grid.className = 'rankings-grid';
-    
-    // 预先计算图表数据，避免后续DOM查询
-    const chartDataMap = new Map();
-    chartDataMap.set('volume', generateChartData(volumeData));
-    chartDataMap.set('long', generateChartData(longData));
-    chartDataMap.set('short', generateChartData(shortData));
-    chartDataMap.set('netLong', generateChartData(netLongData));
-    chartDataMap.set('netShort', generateChartData(netShortData));
-    
     // 计算上日数据（用于汇总对比）
     const prevBrokerMap = new Map();
     for (let i = 0, len = csvDataPrev.length; i < len; i++) {
@@ -675,12 +892,38 @@ function renderRankings() {
     const netLongSummary = calculateSummary(netLongData, prevBrokerMap, 'netLong');
     const netShortSummary = calculateSummary(netShortData, prevBrokerMap, 'netShort');
     
+    renderRankingTables({
+        volume: { data: volumeData, summary: volumeSummary },
+        long: { data: longData, summary: longSummary },
+        short: { data: shortData, summary: shortSummary },
+        netLong: { data: netLongData, summary: netLongSummary },
+        netShort: { data: netShortData, summary: netShortSummary }
+    }, startTime);
+}
+
+// 渲染五张排名表：tables 为 { volume|long|short|netLong|netShort: { data, summary } }
+function renderRankingTables(tables, startTime) {
+    const container = document.getElementById('rankings-container');
+    
+    // 使用DocumentFragment优化DOM操作
+    const fragment = document.createDocumentFragment();
+    const grid = document.createElement('div');
+    grid.className = 'rankings-grid';
+    
+    // 预先计算图表数据，避免后续DOM查询
+    const chartDataMap = new Map();
+    chartDataMap.set('volume', generateChartData(tables.volume.data));
+    chartDataMap.set('long', generateChartData(tables.long.data));
+    chartDataMap.set('short', generateChartData(tables.short.data));
+    chartDataMap.set('netLong', generateChartData(tables.netLong.data));
+    chartDataMap.set('netShort', generateChartData(tables.netShort.data));
+    
     grid.innerHTML = 
-        renderRankingCard('成交量排名', volumeData, 'volume', chartDataMap.get('volume'), volumeSummary) +
-        renderRankingCard('多头持仓排名', longData, 'long', chartDataMap.get('long'), longSummary) +
-        renderRankingCard('空头持仓排名', shortData, 'short', chartDataMap.get('short'), shortSummary) +
-        renderRankingCard('净多头排名', netLongData, 'netLong', chartDataMap.get('netLong'), netLongSummary) +
-        renderRankingCard('净空头排名', netShortData, 'netShort', chartDataMap.get('netShort'), netShortSummary);
+        renderRankingCard('成交量排名', tables.volume.data, 'volume', chartDataMap.get('volume'), tables.volume.summary) +
+        renderRankingCard('多头持仓排名', tables.long.data, 'long', chartDataMap.get('long'), tables.long.summary) +
+        renderRankingCard('空头持仓排名', tables.short.data, 'short', chartDataMap.get('short'), tables.short.summary) +
+        renderRankingCard('净多头排名', tables.netLong.data, 'netLong', chartDataMap.get('netLong'), tables.netLong.summary) +
+        renderRankingCard('净空头排名', tables.netShort.data, 'netShort', chartDataMap.get('netShort'), tables.netShort.summary);
     
     fragment.appendChild(grid);
     container.innerHTML = '';
@@ -921,6 +1164,45 @@ function renderAnalysisCharts() {
     renderTrendChart(symbol);
     renderNetPositionTrendChart(symbol);
     
+    renderCrossPeriodViews();
+}
+
+// 跨期持仓矩阵（后端 cross_period.py 生成）：summaries/{品种}/cross_period/{YYYYMMDD}.json
+// 合约 × 期货公司的多头/空头持仓（long_oi[公司][合约]，无排名行为 null），跨期视图直接使用，不再扫描当日全部排名行
+const CROSS_PERIOD_DIR = 'cross_period';
+let crossPeriodMatrix = null;   // { product, date, data }；data 为 null 表示该日没有全市场矩阵（旧数据目录等），在浏览器中计算
+
+function hasCrossPeriodMatrix(dateStr) {
+    return !!crossPeriodMatrix && crossPeriodMatrix.product === currentProduct && crossPeriodMatrix.date === dateStr;
+}
+
+function crossPeriodMatrixFor(dateStr) {
+    return hasCrossPeriodMatrix(dateStr) ? crossPeriodMatrix.data : null;
+}
+
+// 加载当前品种指定日期的跨期矩阵（结果缓存到 crossPeriodMatrix）
+async function ensureCrossPeriodMatrix(dateStr) {
+    const product = currentProduct;
+    if (!product || !dateStr || hasCrossPeriodMatrix(dateStr)) return;
+    let data = null;
+    try {
+        const resp = await fetch(encodeURI(`${SUMMARY_DIR}/${product}/${CROSS_PERIOD_DIR}/${dateStr}.json`), { cache: 'no-cache' });
+        data = resp.ok ? await resp.json() : null;
+    } catch {
+        data = null;
+    }
+    if (!isMarketScope(data)) data = null;
+    // 等待期间已切换品种，丢弃结果
+    if (product === currentProduct) crossPeriodMatrix = { product, date: dateStr, data };
+}
+
+// 渲染跨期视图：先加载所选日期的跨期矩阵
+async function renderCrossPeriodViews() {
+    const dateInput = document.getElementById('date').value;
+    const dateStr = dateInput ? dateInput.replace(/-/g, '') : '';
+    await ensureCrossPeriodMatrix(dateStr);
+    // 等待期间已切换日期，由新的查询渲染
+    if (dateInput !== document.getElementById('date').value) return;
     // 跨期净持仓表格（按合约汇总）
     renderCrossPeriodTable();
     // 按会员跨期净持仓：分段堆叠条形图 + 明细表
@@ -1451,7 +1733,23 @@ function renderCrossPeriodTable() {
     const contractBrokerMap = new Map();
     
     const rowDateYmd = (dt) => (dt && typeof dt === 'string') ? (dt.length >= 8 ? dt.substring(0, 8) : dt) : '';
-    allData.forEach(row => {
+    // 有预计算矩阵时直接取各单元格，不扫描排名行
+    const crossMatrix = crossPeriodMatrixFor(dateStr);
+    if (crossMatrix) {
+        crossMatrix.brokers.forEach((broker, bi) => {
+            crossMatrix.symbols.forEach((symbol, si) => {
+                if (crossMatrix.long_oi[bi][si] === null) return;
+                contractBrokerMap.set(`${symbol}_${broker}`, {
+                    symbol: symbol,
+                    broker: broker,
+                    long_oi: crossMatrix.long_oi[bi][si],
+                    short_oi: crossMatrix.short_oi[bi][si]
+                });
+            });
+        });
+    }
+    const dayRows = crossMatrix ? [] : allData;
+    dayRows.forEach(row => {
         if (rowDateYmd(row.datetime) !== dateStr) return;
         
         const contractSymbol = row.symbol;
@@ -1583,6 +1881,8 @@ function getCrossPeriodBrokerData() {
     }
     if (!dateInput) return null;
     const dateStr = dateInput.replace(/-/g, '');
+    const crossMatrix = crossPeriodMatrixFor(dateStr);
+    if (crossMatrix) return crossPeriodBrokerDataFromMatrix(crossMatrix);
     const rowDateYmd = (dt) => (dt && typeof dt === 'string') ? (dt.length >= 8 ? dt.substring(0, 8) : dt) : '';
     const rows = allData.filter(row => rowDateYmd(row.datetime) === dateStr);
     if (rows.length === 0) return { brokerList: [], symbolList: [], matrix: new Map(), toShortSymbol: s => (s && s.indexOf('.') >= 0) ? s.split('.')[1] : s };
@@ -1627,6 +1927,24 @@ function getCrossPeriodBrokerData() {
     return { brokerList, symbolList, matrix, toShortSymbol };
 }
 
+// 由预计算矩阵得到 getCrossPeriodBrokerData 的结果（合约、期货公司已按网页的顺序排列）
+function crossPeriodBrokerDataFromMatrix(crossMatrix) {
+    const toShortSymbol = (s) => (s && s.indexOf('.') >= 0) ? s.split('.')[1] : s;
+    const matrix = new Map();
+    crossMatrix.brokers.forEach((broker, bi) => {
+        crossMatrix.symbols.forEach((symbol, si) => {
+            const long = crossMatrix.long_oi[bi][si] || 0;
+            const short = crossMatrix.short_oi[bi][si] || 0;
+            const netLong = Math.max(0, long - short);
+            const netShort = Math.max(0, short - long);
+            if (netLong === 0 && netShort === 0) return;
+            if (!matrix.has(broker)) matrix.set(broker, new Map());
+            matrix.get(broker).set(symbol, { netLong, netShort });
+        });
+    });
+    return { brokerList: crossMatrix.brokers.slice(), symbolList: crossMatrix.symbols.slice(), matrix, toShortSymbol };
+}
+
 // 按会员跨期净持仓表：行=会员简称，列=各合约的净多仓/净空仓
 function renderCrossPeriodBrokerTable() {
     const container = document.getElementById('cross-period-broker-table');
@@ -1834,30 +2152,40 @@ function switchPage(pageType) {
     }
 }
 
-// 填充期货公司选择器（只展示当前品种有“公司专用CSV文件”的期货公司）
-async function populateBrokerSelect() {
-    const brokerSelectHeader = document.getElementById('broker-select-header');
-    if (!brokerSelectHeader) return;
-
-    brokerSelectHeader.innerHTML = '<option value="">请选择期货公司</option>';
-    if (!currentProduct || !allData || allData.length === 0) return;
-
+// 没有期货公司文件索引（旧数据目录）时，逐个检查已加载数据中的期货公司是否有专用CSV文件
+async function probeBrokerFiles() {
     const brokerSet = new Set();
     for (let i = 0, len = allData.length; i < len; i++) {
         const b = allData[i].broker;
         if (b && b.trim()) brokerSet.add(b.trim());
     }
 
+    const manifest = productManifests[currentProduct];
     const checkPromises = Array.from(brokerSet).map(async (broker) => {
         const filename = getBrokerCsvFilename(currentProduct, broker);
         if (!filename) return null;
+        // 有版本清单时直接按清单判断，无需逐个探测
+        if (manifest && manifest.files) return manifest.files[filename] ? broker : null;
         try {
             const resp = await fetch(encodeURI(filename), { method: 'HEAD' });
             return resp.ok ? broker : null;
         } catch { return null; }
     });
     const results = await Promise.all(checkPromises);
-    const brokers = results.filter(Boolean);
+    return results.filter(Boolean);
+}
+
+// 填充期货公司选择器（只展示当前品种有“公司专用CSV文件”的期货公司）
+async function populateBrokerSelect() {
+    const brokerSelectHeader = document.getElementById('broker-select-header');
+    if (!brokerSelectHeader) return;
+
+    brokerSelectHeader.innerHTML = '<option value="">请选择期货公司</option>';
+    if (!currentProduct || !allData || allData.length === 0) return;
+
+    // 有期货公司文件索引时直接使用（也包含只在未加载月份中出现的公司）
+    const brokerIndex = await loadBrokerIndex(currentProduct);
+    const brokers = brokerIndex ? Object.keys(brokerIndex) : await probeBrokerFiles();
 
     brokerSelectHeader.innerHTML = '<option value="">请选择期货公司</option>';
 
@@ -1983,7 +2311,10 @@ async function loadBrokerDataForCurrentSelection(brokerName) {
         return;
     }
     
-    const filename = getBrokerCsvFilename(currentProduct, brokerName);
+    const brokerIndex = brokerIndexes[currentProduct];
+    const filename = brokerIndex && brokerIndex[brokerName]
+        ? brokerIndex[brokerName].file
+        : getBrokerCsvFilename(currentProduct, brokerName);
     if (!filename) {
         console.warn(`未配置期货公司专用CSV文件: product=${currentProduct}, broker=${brokerName}`);
         brokerDataAll = [];
@@ -1991,7 +2322,11 @@ async function loadBrokerDataForCurrentSelection(brokerName) {
     }
     
     try {
-        const resp = await fetch(encodeURI(filename));
+        let resp = await fetch(encodeURI(resolveProductFile(currentProduct, filename)));
+        if (!resp.ok && resolveProductFile(currentProduct, filename) !== filename) {
+            // 清单引用的旧版本已被清理（页面打开时间过长），退回固定文件名
+            resp = await fetch(encodeURI(filename));
+        }
         if (!resp.ok) {
             console.warn(`无法加载期货公司专用数据文件: ${filename}，状态码: ${resp.status}`);
             brokerDataAll = [];
@@ -2317,12 +2652,39 @@ function renderBrokerCrossPeriodChart(brokerName) {
     if (!dateInput) return;
     const dateStr = String(dateInput).replace(/-/g, '').substring(0, 8);
 
-    const sourceData = (brokerDataAll && brokerDataAll.length > 0) ? brokerDataAll : allData;
-    const brokerData = sourceData.filter(row => {
-        if (row.broker !== brokerName) return false;
-        const rowDate = String(row.datetime || '').replace(/-/g, '').substring(0, 8);
-        return rowDate === dateStr;
-    });
+    // 先加载所选日期的跨期矩阵，加载后重新渲染（期间已切换公司则不再渲染）
+    if (!hasCrossPeriodMatrix(dateStr)) {
+        ensureCrossPeriodMatrix(dateStr).then(() => {
+            const brokerSelectHeader = document.getElementById('broker-select-header');
+            if (hasCrossPeriodMatrix(dateStr) && brokerSelectHeader && brokerSelectHeader.value === brokerName) {
+                renderBrokerCrossPeriodChart(brokerName);
+            }
+        });
+        return;
+    }
+
+    // 有预计算矩阵时取该公司所在的一行，否则在已加载数据中筛选
+    const crossMatrix = crossPeriodMatrixFor(dateStr);
+    const brokerIdx = crossMatrix ? crossMatrix.brokers.indexOf(brokerName) : -1;
+    let brokerData;
+    if (brokerIdx >= 0) {
+        brokerData = [];
+        crossMatrix.symbols.forEach((symbol, si) => {
+            if (crossMatrix.long_oi[brokerIdx][si] === null) return;
+            brokerData.push({
+                symbol: symbol,
+                long_oi: crossMatrix.long_oi[brokerIdx][si],
+                short_oi: crossMatrix.short_oi[brokerIdx][si]
+            });
+        });
+    } else {
+        const sourceData = (brokerDataAll && brokerDataAll.length > 0) ? brokerDataAll : allData;
+        brokerData = sourceData.filter(row => {
+            if (row.broker !== brokerName) return false;
+            const rowDate = String(row.datetime || '').replace(/-/g, '').substring(0, 8);
+            return rowDate === dateStr;
+        });
+    }
 
     const showNoData = (canvas, msg) => {
         if (!canvas) return;
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试活跃合约的选取和按数据日失效的合约缓存
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from contract_discovery import ContractDiscovery, rank_contracts, select_active
+
+# 合约 -> (持仓量, 成交量)
+QUOTES = {
+    'SHFE.rb2601': (900, 50),
+    'SHFE.rb2605': (400, 80),
+    'SHFE.rb2603': (400, 90),
+    'SHFE.rb2602': (0, 5),
+}
+
+
+class QuoteApi:
+    def __init__(self):
+        self.queries = 0
+
+    def query_quotes(self, ins_class, exchange_id, product_id=None, expired=False):
+        self.queries += 1
+        return [symbol for symbol in QUOTES if symbol.startswith(f"{exchange_id}.{product_id or ''}")]
+
+    def get_quote(self, symbol):
+        open_interest, volume = QUOTES[symbol]
+        return SimpleNamespace(open_interest=open_interest, volume=volume)
+
+
+def test_rank_contracts_orders_by_open_interest_then_volume():
+    ranked = rank_contracts(QuoteApi(), list(QUOTES))
+    assert [item['symbol'] for item in ranked] == ['SHFE.rb2601', 'SHFE.rb2603', 'SHFE.rb2605', 'SHFE.rb2602']
+
+
+@pytest.mark.parametrize('top_k, expected', [
+    (None, ['SHFE.rb2601', 'SHFE.rb2603', 'SHFE.rb2605']),
+    (2, ['SHFE.rb2601', 'SHFE.rb2603']),
+    (0, []),
+])
+def test_select_active_skips_contracts_without_open_interest(top_k, expected):
+    ranked = rank_contracts(QuoteApi(), list(QUOTES))
+    assert select_active(ranked, top_k) == expected
+
+
+def test_select_active_respects_min_open_interest():
+    ranked = rank_contracts(QuoteApi(), list(QUOTES))
+    assert select_active(ranked, min_open_interest=500) == ['SHFE.rb2601']
+
+
+def test_cache_is_reused_within_data_day_and_expires_after(tmp_path):
+    cache_file = str(tmp_path / 'contracts.json')
+    api = QuoteApi()
+    first = ContractDiscovery(cache_file, date(2025, 8, 29)).discover(['SHFE.rb'], lambda: api, top_k=2)
+    assert first == {('SHFE', 'rb'): ['SHFE.rb2601', 'SHFE.rb2603']}
+    assert api.queries == 1
+
+    def unreachable():
+        raise AssertionError("缓存命中时不应查询")
+
+    # 同一数据日命中缓存；修改 top_k 不需要重新查询
+    same_day = ContractDiscovery(cache_file, date(2025, 8, 29))
+    assert same_day.cached('SHFE.rb')
+    assert same_day.discover(['SHFE.rb'], unreachable) == {
+        ('SHFE', 'rb'): ['SHFE.rb2601', 'SHFE.rb2603', 'SHFE.rb2605']}
+
+    # 新的数据日缓存失效，重新查询
+    next_day = ContractDiscovery(cache_file, date(2025, 9, 1))
+    assert not next_day.cached('SHFE.rb')
+    next_day.discover(['SHFE.rb'], lambda: api)
+    assert api.queries == 2
+
+
+def test_unreadable_cache_is_ignored(tmp_path):
+    cache_file = tmp_path / 'contracts.json'
+    cache_file.write_text('{"data_day": ', encoding='utf-8')
+    discovery = ContractDiscovery(str(cache_file), date(2025, 8, 29))
+    assert not discovery.cached('SHFE.rb')
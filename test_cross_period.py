@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试跨期（合约 × 期货公司）持仓矩阵
+"""
+import json
+
+import pandas as pd
+
+from cross_period import cross_period_matrix, write_cross_period
+from ranking_schema import MARKET_SCOPE, apply_ranking_schema
+from ranking_storage import RANKING_COLUMNS
+
+
+def row(ranking_type, broker, symbol, datetime=20250829, **values):
+    return dict(ranking_type=ranking_type, datetime=datetime, symbol=symbol, broker=broker, **values)
+
+
+def frame(rows):
+    return apply_ranking_schema(pd.DataFrame(rows, columns=RANKING_COLUMNS))
+
+
+ROWS = frame([
+    row('LONG', 'B期货', 'SHFE.rb2605', long_oi=300),
+    row('LONG', 'A期货', 'SHFE.rb2601', long_oi=100),
+    # 同一公司同一合约出现在多张排名表中时取最大值
+    row('VOLUME', 'A期货', 'SHFE.rb2601', volume=50, long_oi=80, short_oi=20),
+    row('SHORT', 'A期货', 'SHFE.rb2510', short_oi=70),
+    row('SHORT', 'B期货', 'SHFE.rb2601', short_oi=90),
+])
+
+
+def test_matrix_orders_contracts_by_month_and_brokers_by_name():
+    matrix = cross_period_matrix(ROWS)
+    assert matrix['symbols'] == ['SHFE.rb2510', 'SHFE.rb2601', 'SHFE.rb2605']
+    assert matrix['brokers'] == ['A期货', 'B期货']
+    # [期货公司][合约]；没有排名行的格子为 None，有排名行但该列为空的为 0
+    assert matrix['long_oi'] == [[0, 100, None], [None, 0, 300]]
+    assert matrix['short_oi'] == [[70, 20, None], [None, 90, 0]]
+
+
+def test_matrix_columns_sum_to_market_totals():
+    matrix = cross_period_matrix(ROWS)
+    long_by_symbol = [sum(value or 0 for value in column) for column in zip(*matrix['long_oi'])]
+    assert long_by_symbol == [0, 100, 300]
+
+
+def test_write_cross_period_writes_touched_days(tmp_path):
+    prev = frame([row('LONG', 'A期货', 'SHFE.rb2601', datetime=20250828, long_oi=60)])
+    merged = pd.concat([prev, ROWS], ignore_index=True)
+    assert write_cross_period(merged, ROWS, str(tmp_path), 'SHFE', 'rb') == 1
+    directory = tmp_path / 'SHFE_rb' / 'cross_period'
+    assert [path.name for path in directory.iterdir()] == ['20250829.json']
+    content = json.loads((directory / '20250829.json').read_text(encoding='utf-8'))
+    assert content['date'] == 20250829
+    assert content['scope'] == MARKET_SCOPE
+    assert content['long_oi'] == cross_period_matrix(ROWS)['long_oi']
+    assert write_cross_period(merged, ROWS.iloc[:0], str(tmp_path), 'SHFE', 'rb') == 0
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试按月分片、内容哈希文件名和总清单
+"""
+import gzip
+import hashlib
+import json
+
+from data_shards import HASH_LENGTH, write_catalog, write_shards
+from ranking_schema import MARKET_SCOPE, apply_ranking_schema, concat_rankings, read_ranking_csv
+from ranking_storage import upsert_rows
+from test_ranking_storage import make_rows
+
+
+def rankings(days, **kwargs):
+    return apply_ranking_schema(make_rows(days, **kwargs))
+
+
+def read_json(path):
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def test_catalog_lists_only_market_scope(tmp_path):
+    market = rankings([20250828, 20250829])
+    write_shards(market, market, str(tmp_path), 'SHFE', 'rb')
+    broker = rankings([20250829], brokers=('A期货',), symbol='SHFE.cu2601')
+    write_shards(broker, broker, str(tmp_path), 'SHFE', 'cu', scope=['A期货'])
+    # 没有 scope 的旧清单同样不当作全市场视图
+    legacy = rankings([20250829], symbol='DCE.m2601')
+    write_shards(legacy, legacy, str(tmp_path), 'DCE', 'm')
+    legacy_path = tmp_path / 'DCE_m' / 'manifest.json'
+    manifest = read_json(legacy_path)
+    del manifest['scope']
+    legacy_path.write_text(json.dumps(manifest), encoding='utf-8')
+
+    assert read_json(tmp_path / 'SHFE_cu' / 'manifest.json')['scope'] == ['A期货']
+    assert write_catalog(str(tmp_path)) == 1
+    catalog = read_json(tmp_path / 'manifest.json')
+    assert list(catalog['products']) == ['SHFE_rb']
+    assert catalog['products']['SHFE_rb']['scope'] == MARKET_SCOPE
+
+
+def product_files(root, name='SHFE_rb'):
+    return sorted(path.name for path in (root / name).iterdir() if path.name != 'manifest.json')
+
+
+def test_shards_split_by_month(tmp_path):
+    merged = rankings([20250730, 20250731, 20250801, 20250829])
+    assert write_shards(merged, merged, str(tmp_path), 'SHFE', 'rb') == 2
+    manifest = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')
+    assert manifest['product'] == 'SHFE.rb'
+    assert manifest['symbols'] == {'SHFE.rb2601': [20250730, 20250731, 20250801, 20250829]}
+    assert [(shard['month'], shard['first_date'], shard['last_date'], shard['rows'])
+            for shard in manifest['shards']] == [(202507, 20250730, 20250731, 4), (202508, 20250801, 20250829, 4)]
+    # 分片内容与品种 CSV 的列和取值相同
+    august = read_ranking_csv(str(tmp_path / manifest['shards'][1]['path']))
+    assert list(august.columns) == list(merged.columns)
+    assert august['datetime'].tolist() == [20250801, 20250801, 20250829, 20250829]
+
+
+def test_only_touched_months_are_rewritten(tmp_path):
+    merged = rankings([20250731, 20250829])
+    write_shards(merged, merged, str(tmp_path), 'SHFE', 'rb')
+    july = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards'][0]
+
+    new = rankings([20250901])
+    assert write_shards(concat_rankings([merged, new]), new, str(tmp_path), 'SHFE', 'rb') == 1
+    shards = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards']
+    assert [shard['month'] for shard in shards] == [202507, 202508, 202509]
+    assert shards[0] == july
+
+
+def test_keep_months_limits_shards_and_days(tmp_path):
+    merged = rankings([20250627, 20250731, 20250829])
+    write_shards(merged, merged, str(tmp_path), 'SHFE', 'rb')
+    write_shards(merged, merged.iloc[:0], str(tmp_path), 'SHFE', 'rb', keep_months=2)
+    manifest = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')
+    assert [shard['month'] for shard in manifest['shards']] == [202507, 202508]
+    assert manifest['symbols'] == {'SHFE.rb2601': [20250731, 20250829]}
+    # 移出清单的月份在上一版清单不再引用后删除
+    assert any(name.startswith('202506') for name in product_files(tmp_path))
+    write_shards(merged, merged.iloc[:0], str(tmp_path), 'SHFE', 'rb', keep_months=2)
+    assert not any(name.startswith('202506') for name in product_files(tmp_path))
+
+
+def test_shard_names_carry_content_hash_and_gzip_copy(tmp_path):
+    merged = rankings([20250829])
+    write_shards(merged, merged, str(tmp_path), 'SHFE', 'rb')
+    shard = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards'][0]
+    data = (tmp_path / shard['path']).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    assert shard['path'] == f"SHFE_rb/202508.{digest[:HASH_LENGTH]}.csv"
+    assert (shard['bytes'], shard['sha256']) == (len(data), digest)
+    gz = shard['encodings']['gzip']
+    assert gz['path'] == shard['path'] + '.gz'
+    assert gzip.decompress((tmp_path / gz['path']).read_bytes()) == data
+
+    # 内容不变时不重写，文件名不变
+    assert write_shards(merged, merged, str(tmp_path), 'SHFE', 'rb') == 0
+    assert read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards'][0] == shard
+
+
+def test_superseded_shards_are_removed_after_one_update(tmp_path):
+    first = rankings([20250828])
+    write_shards(first, first, str(tmp_path), 'SHFE', 'rb')
+    old = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards'][0]['path'].split('/')[1]
+
+    second = rankings([20250829])
+    merged = concat_rankings([first, second])
+    write_shards(merged, second, str(tmp_path), 'SHFE', 'rb')
+    current = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards'][0]['path'].split('/')[1]
+    assert current != old
+    # 上一版清单引用的文件保留一次，持有旧清单的页面仍可读取
+    assert product_files(tmp_path) == sorted([old, old + '.gz', current, current + '.gz'])
+
+    third = rankings([20250829], base=500)
+    merged = upsert_rows(merged, third).merged_df
+    write_shards(merged, third, str(tmp_path), 'SHFE', 'rb')
+    latest = read_json(tmp_path / 'SHFE_rb' / 'manifest.json')['shards'][0]['path'].split('/')[1]
+    assert product_files(tmp_path) == sorted([current, current + '.gz', latest, latest + '.gz'])
+
+
+def test_catalog_summarises_product_manifests(tmp_path):
+    merged = rankings([20250731, 20250829])
+    write_shards(merged, merged, str(tmp_path), 'SHFE', 'rb')
+    write_catalog(str(tmp_path))
+    manifest_bytes = (tmp_path / 'SHFE_rb' / 'manifest.json').read_bytes()
+    shards = json.loads(manifest_bytes)['shards']
+    entry = read_json(tmp_path / 'manifest.json')['products']['SHFE_rb']
+    assert entry['manifest'] == 'SHFE_rb/manifest.json'
+    assert entry['sha256'] == hashlib.sha256(manifest_bytes).hexdigest()
+    assert (entry['first_date'], entry['last_date']) == (20250731, 20250829)
+    assert entry['bytes'] == sum(shard['bytes'] for shard in shards)
+    assert entry['gzip_bytes'] == sum(shard['encodings']['gzip']['bytes'] for shard in shards)
+    assert write_catalog(str(tmp_path / 'missing')) == 0
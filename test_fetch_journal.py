@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试断点续查日志：中断后重新运行只查询未完成的单元
+"""
+from datetime import date
+
+import pandas as pd
+
+from fetch_journal import FetchJournal
+from query_ranking_to_csv import QueryUnit, fetch_units_concurrently
+
+DATA_DAY = date(2025, 8, 29)
+LONG = QueryUnit(None, 'SHFE', 'rb', 'SHFE.rb2601', 'LONG', '多头持仓排名', 5, None)
+SHORT = LONG._replace(ranking_type='SHORT', type_name='空头持仓排名')
+
+
+def ranking_rows(ranking_type, brokers=('A期货', 'B期货')):
+    return pd.DataFrame({
+        'ranking_type': ranking_type, 'datetime': 20250829, 'symbol': 'SHFE.rb2601',
+        'broker': list(brokers), 'long_oi': [100.0 + i for i in range(len(brokers))],
+    })
+
+
+def test_journal_restores_completed_units(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = FetchJournal(path, DATA_DAY)
+    journal.record(LONG, ranking_rows('LONG'))
+    journal.record(SHORT, pd.DataFrame())
+
+    resumed = FetchJournal(path, DATA_DAY)
+    assert len(resumed) == 2
+    restored = resumed.get(LONG)
+    assert restored['broker'].astype(str).tolist() == ['A期货', 'B期货']
+    assert restored['long_oi'].astype(int).tolist() == [100, 101]
+    # 无数据的单元同样算已完成
+    assert resumed.get(SHORT) is not None and resumed.get(SHORT).empty
+    assert resumed.get(LONG._replace(broker='A期货')) is None
+    assert resumed.get(LONG._replace(start_dt=date(2025, 8, 1))) is None
+
+
+def test_journal_ignores_other_data_day_and_torn_line(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    FetchJournal(path, date(2025, 8, 28)).record(LONG, ranking_rows('LONG'))
+    FetchJournal(path, DATA_DAY).record(SHORT, ranking_rows('SHORT'))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"data_day": "2025-08-29", "unit": [')
+
+    resumed = FetchJournal(path, DATA_DAY)
+    assert len(resumed) == 1
+    assert resumed.get(LONG) is None
+    assert resumed.get(SHORT) is not None
+
+    resumed.clear()
+    assert len(resumed) == 0
+    assert not (tmp_path / 'journal.jsonl').exists()
+
+
+class UnreachableApi:
+    """
+    断点日志已覆盖全部单元时不应发出任何查询
+    """
+
+    def create_task(self, coro):
+        coro.close()
+        raise AssertionError("不应发出查询")
+
+    def wait_update(self):
+        raise AssertionError("不应等待查询")
+
+
+def test_fetch_resumes_from_journal_without_querying(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = FetchJournal(path, DATA_DAY)
+    journal.record(LONG, ranking_rows('LONG'))
+    journal.record(SHORT, ranking_rows('SHORT', brokers=('C期货',)))
+
+    results = fetch_units_concurrently(UnreachableApi(), [LONG, SHORT], journal=FetchJournal(path, DATA_DAY))
+    assert list(results) == [LONG, SHORT]
+    assert results[LONG]['broker'].astype(str).tolist() == ['A期货', 'B期货']
+    assert results[SHORT]['broker'].astype(str).tolist() == ['C期货']
+
+
+def test_fetch_queries_only_unfinished_units(tmp_path):
+    from fake_tqapi import create_api
+
+    path = str(tmp_path / 'journal.jsonl')
+    FetchJournal(path, DATA_DAY).record(LONG, ranking_rows('LONG'))
+    api = create_api('user', 'password', 'synthetic')
+    queried = []
+    query = api.query_symbol_ranking
+
+    def record_query(**kwargs):
+        queried.append(kwargs['ranking_type'])
+        return query(**kwargs)
+
+    api.query_symbol_ranking = record_query
+    journal = FetchJournal(path, DATA_DAY)
+    try:
+        results = fetch_units_concurrently(api, [LONG, SHORT], journal=journal)
+    finally:
+        api.close()
+    assert queried == ['SHORT']
+    assert results[LONG]['broker'].astype(str).tolist() == ['A期货', 'B期货']
+    assert len(results[SHORT]) > 0
+    # 新完成的单元写入日志，再次中断后同样可以恢复
+    assert FetchJournal(path, DATA_DAY).get(SHORT) is not None
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试多进程查询的分组：同一输出的查询单元分在同一组，工作量大的组先提交
+"""
+from fetch_pool import group_units
+from query_ranking_to_csv import QueryUnit
+
+RB = QueryUnit(None, 'SHFE', 'rb', 'SHFE.rb2601', 'LONG', '多头持仓排名', 5, None)
+
+
+def test_units_are_grouped_by_output():
+    cu = RB._replace(product='cu', symbol='SHFE.cu2601')
+    broker = RB._replace(broker='A期货')
+    units = [RB, cu, broker, RB._replace(ranking_type='SHORT', type_name='空头持仓排名'), cu._replace(days=20)]
+    groups = group_units(units)
+    assert sorted(len(group) for group in groups) == [1, 2, 2]
+    for group in groups:
+        assert len({(unit.broker, unit.exchange, unit.product) for unit in group}) == 1
+    assert sorted(map(units.index, (unit for group in groups for unit in group))) == list(range(len(units)))
+
+
+def test_larger_groups_come_first():
+    small = RB._replace(product='cu', symbol='SHFE.cu2601', days=3)
+    large = [RB._replace(symbol=f"SHFE.rb26{month:02d}") for month in (1, 5, 10)]
+    groups = group_units([small] + large)
+    assert groups == [large, [small]]
+    # 组内工作量按查询的交易日数计算
+    groups = group_units([small._replace(days=40)] + large)
+    assert groups == [[small._replace(days=40)], large]
+
+
+def test_no_units_no_groups():
+    assert group_units([]) == []
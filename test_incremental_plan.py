@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试增量查询规划：按现有数据和已查询日期记录只查询缺失的交易日
+"""
+from datetime import date, timedelta
+
+import pandas as pd
+
+from query_ledger import QueryLedger
+from query_ranking_to_csv import QueryUnit, get_date_coverage, merge_coverage, plan_incremental_units
+from ranking_schema import date_int
+
+# 20 个连续的“交易日”（规划只使用窗口中的日期，不查交易日历）
+WINDOW = [date(2025, 8, 1) + timedelta(days=i) for i in range(20)]
+UNIT = QueryUnit(None, 'SHFE', 'rb', 'SHFE.rb2601', 'LONG', '多头持仓排名', len(WINDOW), None)
+KEY = ('SHFE', 'rb', None)
+
+
+def covered(days, symbol='SHFE.rb2601', ranking_type='LONG'):
+    return {(symbol, ranking_type): {date_int(day) for day in days}}
+
+
+def test_covered_window_needs_no_query():
+    assert plan_incremental_units([UNIT], {KEY: covered(WINDOW)}, WINDOW) == []
+
+
+def test_missing_tail_is_queried_alone():
+    planned = plan_incremental_units([UNIT], {KEY: covered(WINDOW[:-2])}, WINDOW)
+    assert planned == [UNIT._replace(start_dt=WINDOW[-2], days=2)]
+
+
+def test_nearby_gaps_are_merged():
+    have = [day for i, day in enumerate(WINDOW) if i not in (10, 13)]
+    planned = plan_incremental_units([UNIT], {KEY: covered(have)}, WINDOW, overhead_days=5)
+    assert planned == [UNIT._replace(start_dt=WINDOW[10], days=4)]
+
+
+def test_distant_gaps_are_queried_separately():
+    have = [day for i, day in enumerate(WINDOW) if i not in (1, 18)]
+    planned = plan_incremental_units([UNIT], {KEY: covered(have)}, WINDOW, overhead_days=5)
+    assert planned == [UNIT._replace(start_dt=WINDOW[1], days=1), UNIT._replace(start_dt=WINDOW[18], days=1)]
+
+
+def test_scattered_gaps_fall_back_to_full_query():
+    # 合并后的区间覆盖整个窗口，拆分没有节省，保留原单元
+    have = [WINDOW[5], WINDOW[15]]
+    planned = plan_incremental_units([UNIT], {KEY: covered(have)}, WINDOW, overhead_days=1)
+    assert planned == [UNIT]
+    # 开销较小时两段缺失区间分开查询更省
+    planned = plan_incremental_units([UNIT], {KEY: covered(WINDOW[2:18])}, WINDOW, overhead_days=1)
+    assert planned == [UNIT._replace(start_dt=WINDOW[0], days=2), UNIT._replace(start_dt=WINDOW[18], days=2)]
+    # 完全没有数据时同样保留原单元（不拆成带 start_dt 的单元）
+    assert plan_incremental_units([UNIT], {}, WINDOW) == [UNIT]
+
+
+def test_split_mode_requires_every_output():
+    coverage = {KEY: covered(WINDOW), ('SHFE', 'rb', 'A期货'): covered(WINDOW[:-1])}
+    planned = plan_incremental_units([UNIT], coverage, WINDOW, coverage_brokers=[None, 'A期货'])
+    assert planned == [UNIT._replace(start_dt=WINDOW[-1], days=1)]
+
+
+def test_coverage_is_per_symbol_and_ranking_type():
+    other = UNIT._replace(ranking_type='SHORT', type_name='空头持仓排名')
+    planned = plan_incremental_units([UNIT, other], {KEY: covered(WINDOW)}, WINDOW)
+    assert planned == [other]
+
+
+def test_get_date_coverage_normalises_dates():
+    df = pd.DataFrame({'symbol': ['SHFE.rb2601'] * 2, 'ranking_type': ['LONG'] * 2,
+                       'datetime': ['2025-08-01', '20250802']})
+    assert get_date_coverage(df) == {('SHFE.rb2601', 'LONG'): {20250801, 20250802}}
+
+
+def test_ledger_marks_empty_dates_as_queried(tmp_path):
+    ledger = QueryLedger(str(tmp_path))
+    # 数据中只有前 10 天；后 10 天查询过但该期货公司未上榜
+    data = covered(WINDOW[:10])
+    assert plan_incremental_units([UNIT], {KEY: data}, WINDOW) != []
+
+    ledger.record('SHFE', 'rb', {(None, 'SHFE.rb2601', 'LONG'): {date_int(day) for day in WINDOW[10:]}})
+    coverage = merge_coverage(data, ledger.load('SHFE', 'rb'))
+    assert plan_incremental_units([UNIT], {KEY: coverage}, WINDOW) == []
+    # 各输出分开记录
+    assert ledger.load('SHFE', 'rb', 'A期货') == {}
+
+
+def test_ledger_prunes_dates_outside_window(tmp_path):
+    ledger = QueryLedger(str(tmp_path))
+    ledger.record('SHFE', 'rb', {('A期货', 'SHFE.rb2601', 'LONG'): {20250701, 20250801}})
+    ledger.record('SHFE', 'rb', {('A期货', 'SHFE.rb2601', 'SHORT'): {20250802}}, keep_from=20250801)
+    assert ledger.load('SHFE', 'rb', 'A期货') == {
+        ('SHFE.rb2601', 'LONG'): {20250801},
+        ('SHFE.rb2601', 'SHORT'): {20250802},
+    }
+    ledger.record('SHFE', 'rb', {}, keep_from=20250901)
+    assert ledger.load('SHFE', 'rb', 'A期货') == {}
+
+
+def test_empty_result_leaves_day_to_be_replanned(tmp_path):
+    from query_ranking_to_csv import PreparedJob, get_trading_day_window, record_queried_days
+
+    window = get_trading_day_window(5, date(2025, 8, 25))
+    unit = UNIT._replace(days=len(window), start_dt=window[0])
+    short = unit._replace(ranking_type='SHORT', type_name='空头持仓排名')
+    ledger = QueryLedger(str(tmp_path))
+    prepared = PreparedJob(None, {('SHFE', 'rb'): ['SHFE.rb2601']}, [None], [None], False,
+                           None, {}, [unit, short], ledger, window)
+    # LONG 只返回到倒数第二个交易日；SHORT 在最新交易日数据发布前查询，结果为空
+    rows = pd.DataFrame({'datetime': [date_int(day) for day in window[:-1]]})
+    record_queried_days(prepared, {unit: rows, short: pd.DataFrame()}, failed=[])
+
+    recorded = ledger.load('SHFE', 'rb')
+    assert recorded == {('SHFE.rb2601', 'LONG'): {date_int(day) for day in window[:-1]}}
+    # 下次运行重新查询 LONG 的最新交易日和 SHORT 的整个窗口
+    planned = plan_incremental_units([unit, short], {KEY: recorded}, window)
+    assert planned == [unit._replace(start_dt=window[-1], days=1), short]
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试批量任务配置的解析和校验
+"""
+from datetime import date
+
+import pytest
+
+from job_config import load_config, parse_job
+
+
+def test_job_merges_defaults():
+    job = parse_job({'name': 'rb', 'symbols': 'SHFE.rb2601', 'start_dt': '2025-01-02'},
+                    {'days': 20, 'brokers': ['A期货'], 'output_dir': 'data'}, 0)
+    assert job.symbols == ['SHFE.rb2601']
+    assert job.days == 20
+    assert job.start_dt == date(2025, 1, 2)
+    assert job.brokers == ['A期货']
+    assert job.storage_backend == 'csv'
+    assert job.storage_options['csv_directory'] == 'data'
+    assert job.top_k == 3
+
+
+def test_job_defaults_name_and_top_k():
+    job = parse_job({'products': 'DCE.m', 'top_k': 'all', 'shard_keep_months': 0}, {}, 4)
+    assert job.name == 'job5'
+    assert job.products == ['DCE.m']
+    assert job.top_k is None
+    assert job.storage_options['shard_keep_months'] is None
+
+
+@pytest.mark.parametrize('raw, message', [
+    ({'name': 'rb', 'symbol': ['SHFE.rb2601']}, '未知配置项'),
+    ({'name': 'rb', 'products': ['rb']}, '品种格式'),
+    ({'name': 'rb', 'products': ['shfe.rb']}, '品种格式'),
+    ({'name': 'rb', 'start_dt': '2025-13-01'}, 'start_dt'),
+])
+def test_job_rejects_invalid_settings(raw, message):
+    with pytest.raises(ValueError, match=message):
+        parse_job(raw, {}, 0)
+
+
+def test_unknown_default_is_reported_with_job_name():
+    with pytest.raises(ValueError, match='任务 rb 中有未知配置项'):
+        parse_job({'name': 'rb'}, {'dayz': 5}, 0)
+
+
+@pytest.mark.parametrize('content, message', [
+    ('[defaults]\ndays = 5\n', '没有定义任何任务'),
+    ('[[jobs]]\nname = "a"\n[[jobs]]\nname = "a"\n', '任务名重复'),
+    ('[run]\nparallel = 2\n[[jobs]]\nname = "a"\n', r'\[run\] 中有未知配置项'),
+])
+def test_config_rejects_invalid_files(tmp_path, content, message):
+    path = tmp_path / 'jobs.toml'
+    path.write_text(content, encoding='utf-8')
+    with pytest.raises(ValueError, match=message):
+        load_config(str(path))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试排名数据的列类型约定及 CSV 读写往返
+"""
+import sys
+
+import pandas as pd
+import pytest
+
+from ranking_schema import RANKING_DTYPES, apply_ranking_schema, concat_rankings, read_ranking_csv
+from test_ranking_storage import make_rows
+
+
+def dtypes(df):
+    return {col: str(df[col].dtype) for col in df.columns}
+
+
+def test_schema_converts_text_dates_and_float_integers():
+    df = make_rows(['2025-08-29', '20250901'])
+    df['volume'] = df['volume'].astype(float)
+    df.loc[0, 'long_ranking'] = None
+    converted = apply_ranking_schema(df)
+    assert dtypes(converted) == RANKING_DTYPES
+    assert converted['datetime'].tolist() == [20250829, 20250829, 20250901, 20250901]
+    assert converted['volume'].tolist() == [100, 101, 100, 101]
+    assert converted['long_ranking'].isna().tolist() == [True, False, False, False]
+    # 原 DataFrame 不被修改
+    assert df['datetime'].tolist()[0] == '2025-08-29'
+
+
+def test_schema_keeps_unknown_columns_and_empty_frames():
+    df = make_rows([20250829]).assign(in_long=[True, False])
+    assert apply_ranking_schema(df)['in_long'].tolist() == [True, False]
+    empty = pd.DataFrame()
+    assert apply_ranking_schema(empty) is empty
+
+
+@pytest.mark.parametrize('use_pyarrow', [True, False])
+def test_csv_round_trip_keeps_values_and_types(tmp_path, monkeypatch, use_pyarrow):
+    if use_pyarrow:
+        pytest.importorskip('pyarrow')
+    else:
+        # 模拟未安装 pyarrow：使用默认解析器
+        monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    df = apply_ranking_schema(make_rows([20250829, 20250901]))
+    df.loc[1, 'short_change'] = pd.NA
+    path = tmp_path / 'SHFE_rb.csv'
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+    # 整数列写出时不带 .0 后缀，空值仍为空
+    assert ',100,1,1,200,2,1,300,3,1\n' in path.read_text(encoding='utf-8-sig')
+    assert ',101,1,2,201,2,2,301,,2\n' in path.read_text(encoding='utf-8-sig')
+
+    reloaded = read_ranking_csv(str(path))
+    assert dtypes(reloaded) == RANKING_DTYPES
+    pd.testing.assert_frame_equal(reloaded.astype(str), df.astype(str))
+
+
+def test_concat_keeps_categories():
+    left = apply_ranking_schema(make_rows([20250829], brokers=('A期货',)))
+    right = apply_ranking_schema(make_rows([20250901], brokers=('B期货',)))
+    combined = concat_rankings([left, right.iloc[:0], right])
+    assert isinstance(combined['broker'].dtype, pd.CategoricalDtype)
+    assert combined['broker'].astype(str).tolist() == ['A期货', 'B期货']
+    assert concat_rankings([left.iloc[:0]]).empty
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试增量合并、CSV 追加/重写以及各存储后端的保存/读取
+"""
+import hashlib
+import os
+
+import pandas as pd
+import pytest
+
+from ranking_schema import read_ranking_csv
+from ranking_storage import (
+    RANKING_COLUMNS, RANKING_TYPE_NAMES, CsvStorage, create_storage, get_broker_index_filename, normalize_datetime,
+    save_merged_data, upsert_rows,
+)
+
+
+def make_rows(days, brokers=('A期货', 'B期货'), ranking_type='LONG', symbol='SHFE.rb2601', base=100):
+    """
+    构造排名宽表：每个交易日每家期货公司一行，volume 为 base + 公司序号
+    """
+    rows = []
+    for day in days:
+        for i, broker in enumerate(brokers):
+            rows.append(dict(
+                ranking_type=ranking_type, ranking_type_name=RANKING_TYPE_NAMES[ranking_type], datetime=day,
+                symbol=symbol, exchange_id=symbol.split('.')[0], instrument_id=symbol.split('.')[1], broker=broker,
+                volume=base + i, volume_change=1, volume_ranking=i + 1,
+                long_oi=2 * base + i, long_change=2, long_ranking=i + 1,
+                short_oi=3 * base + i, short_change=3, short_ranking=i + 1,
+            ))
+    return pd.DataFrame(rows, columns=RANKING_COLUMNS)
+
+
+def values(df):
+    """
+    按去重键排序后的 (日期, 期货公司, volume) 列表，用于比较不同后端读回的内容
+    """
+    ordered = df.sort_values(['datetime', 'broker'], kind='stable')
+    return [(int(day), str(broker), int(volume))
+            for day, broker, volume in ordered[['datetime', 'broker', 'volume']].itertuples(index=False)]
+
+
+def test_normalize_datetime_formats():
+    series = pd.Series(['2025-08-29', '20250829', '2025-08-29 00:00:00', 20250829])
+    assert normalize_datetime(series).tolist() == [20250829] * 4
+    assert normalize_datetime(pd.Series(pd.to_datetime(['2025-08-29']))).tolist() == [20250829]
+
+
+def test_upsert_appends_new_keys():
+    old = make_rows([20250828])
+    result = upsert_rows(old, make_rows(['2025-08-29']))
+    assert result.patched_count == 0
+    assert len(result.appended_df) == 2
+    assert len(result.merged_df) == 4
+    assert result.merged_df['datetime'].tolist() == [20250828, 20250828, 20250829, 20250829]
+
+
+def test_upsert_overwrites_existing_keys_in_place():
+    old = make_rows([20250828, 20250829])
+    result = upsert_rows(old, make_rows(['2025-08-29', '2025-09-01'], base=500))
+    assert result.patched_count == 2
+    assert len(result.appended_df) == 2
+    # 被覆盖的记录留在原位置，新交易日追加在末尾
+    assert values(result.merged_df) == [
+        (20250828, 'A期货', 100), (20250828, 'B期货', 101),
+        (20250829, 'A期货', 500), (20250829, 'B期货', 501),
+        (20250901, 'A期货', 500), (20250901, 'B期货', 501),
+    ]
+    assert result.merged_df['datetime'].tolist()[:4] == [20250828, 20250828, 20250829, 20250829]
+
+
+def test_upsert_deduplicates_new_data_keeping_last():
+    new = pd.concat([make_rows([20250829]), make_rows(['2025-08-29'], base=900)], ignore_index=True)
+    result = upsert_rows(pd.DataFrame(), new)
+    assert len(result.merged_df) == 2
+    assert values(result.merged_df) == [(20250829, 'A期货', 900), (20250829, 'B期货', 901)]
+
+    result = upsert_rows(make_rows([20250829]), new)
+    assert result.patched_count == 2
+    assert values(result.merged_df) == [(20250829, 'A期货', 900), (20250829, 'B期货', 901)]
+
+
+def write_csv(path, df):
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+    return read_ranking_csv(path)
+
+
+def test_save_merged_data_appends_without_patches(tmp_path):
+    path = str(tmp_path / 'SHFE_rb.csv')
+    existing = write_csv(path, make_rows([20250828]))
+    before = open(path, 'rb').read()
+    result = upsert_rows(existing, make_rows([20250829]))
+
+    appended = save_merged_data(path, existing, result.merged_df, result.patched_count, result.appended_df)
+    assert appended is True
+    after = open(path, 'rb').read()
+    # 原文件字节保持不变，新记录追加在后
+    assert after.startswith(before)
+    assert values(read_ranking_csv(path)) == values(result.merged_df)
+
+
+def test_save_merged_data_rewrites_with_patches(tmp_path):
+    path = str(tmp_path / 'SHFE_rb.csv')
+    existing = write_csv(path, make_rows([20250828, 20250829]))
+    result = upsert_rows(existing, make_rows([20250829], base=500))
+
+    appended = save_merged_data(path, existing, result.merged_df, result.patched_count, result.appended_df)
+    assert appended is False
+    reloaded = read_ranking_csv(path)
+    assert len(reloaded) == 4
+    assert values(reloaded) == values(result.merged_df)
+
+
+def open_storage(backend, root):
+    root = str(root)
+    return create_storage(
+        backend, csv_directory=root, parquet_dir=os.path.join(root, 'parquet'),
+        normalized_dir=os.path.join(root, 'facts'), sqlite_path=os.path.join(root, 'ranking.sqlite3'),
+        segments_dir=os.path.join(root, 'segments'), export_csv=False,
+    )
+
+
+def save_batch(backend, root, batch, broker=None):
+    """
+    按 save_job 的流程保存一批新数据：加载现有数据 -> upsert -> save -> commit
+    """
+    storage = open_storage(backend, root)
+    existing = storage.load('SHFE', 'rb', broker)
+    result = upsert_rows(existing, batch)
+    storage.save('SHFE', 'rb', broker, existing, result)
+    if hasattr(storage, 'commit'):
+        storage.commit()
+    if hasattr(storage, 'close'):
+        storage.close()
+    return result
+
+
+@pytest.mark.parametrize('backend', ['csv', 'parquet', 'normalized', 'sqlite', 'segments'])
+def test_storage_round_trip(backend, tmp_path):
+    if backend == 'parquet':
+        pytest.importorskip('pyarrow')
+    save_batch(backend, tmp_path, make_rows(['2025-08-28', '20250829']))
+    # 第二次运行重新返回 20250829（数值变化）并新增 20250901
+    result = save_batch(backend, tmp_path, make_rows([20250829, 20250901], base=500))
+    assert result.patched_count == 2
+
+    storage = open_storage(backend, tmp_path)
+    loaded = storage.load('SHFE', 'rb')
+    if hasattr(storage, 'close'):
+        storage.close()
+    assert list(loaded.columns) == RANKING_COLUMNS
+    assert values(loaded) == [
+        (20250828, 'A期货', 100), (20250828, 'B期货', 101),
+        (20250829, 'A期货', 500), (20250829, 'B期货', 501),
+        (20250901, 'A期货', 500), (20250901, 'B期货', 501),
+    ]
+    assert loaded['long_oi'].astype(int).tolist() == [200, 201, 1000, 1001, 1000, 1001]
+
+
+@pytest.mark.parametrize('backend', ['csv', 'sqlite', 'segments'])
+def test_storage_keeps_outputs_separate(backend, tmp_path):
+    save_batch(backend, tmp_path, make_rows([20250829]))
+    save_batch(backend, tmp_path, make_rows([20250829], brokers=('A期货',), base=700), broker='A期货')
+
+    storage = open_storage(backend, tmp_path)
+    market = storage.load('SHFE', 'rb')
+    broker = storage.load('SHFE', 'rb', 'A期货')
+    if hasattr(storage, 'close'):
+        storage.close()
+    assert values(market) == [(20250829, 'A期货', 100), (20250829, 'B期货', 101)]
+    assert values(broker) == [(20250829, 'A期货', 700)]
+
+
+def test_save_merged_data_writes_to_output(tmp_path):
+    path = str(tmp_path / 'SHFE_rb.csv')
+    output = str(tmp_path / 'next' / 'SHFE_rb.csv')
+    existing = write_csv(path, make_rows([20250828]))
+    before = open(path, 'rb').read()
+    result = upsert_rows(existing, make_rows([20250829]))
+
+    save_merged_data(path, existing, result.merged_df, result.patched_count, result.appended_df, output=output)
+    assert open(path, 'rb').read() == before
+    assert len(read_ranking_csv(output)) == 4
+
+
+def save_csv(storage, batch, broker=None):
+    existing = storage.load('SHFE', 'rb', broker)
+    storage.save('SHFE', 'rb', broker, existing, upsert_rows(existing, batch))
+
+
+@pytest.mark.parametrize('generations', [True, False])
+def test_broker_index_lists_broker_files(tmp_path, generations):
+    storage = CsvStorage(str(tmp_path), generations=generations)
+    save_csv(storage, make_rows([20250828, 20250829]))
+    save_csv(storage, make_rows([20250828, 20250829], brokers=('A期货',)), 'A期货')
+    save_csv(storage, make_rows([20250829], brokers=('B期货',)), 'B期货')
+    if generations:
+        storage.commit()
+
+    assert (tmp_path / get_broker_index_filename('SHFE', 'rb')).exists()
+    index = storage.read_broker_index('SHFE', 'rb')
+    # 全市场文件不进索引
+    assert sorted(index) == ['A期货', 'B期货']
+    entry = index['A期货']
+    assert (entry['file'], entry['rows'], entry['first_date'], entry['last_date']) == \
+        ('SHFE_rb_A期货.csv', 2, 20250828, 20250829)
+    data = (tmp_path / entry['file']).read_bytes()
+    assert (entry['bytes'], entry['sha256']) == (len(data), hashlib.sha256(data).hexdigest())
+
+    # 只更新一家公司时，其余公司的索引项保持不变
+    storage = CsvStorage(str(tmp_path), generations=generations)
+    save_csv(storage, make_rows([20250901], brokers=('A期货',)), 'A期货')
+    if generations:
+        storage.commit()
+    updated = storage.read_broker_index('SHFE', 'rb')
+    assert updated['B期货'] == index['B期货']
+    assert (updated['A期货']['rows'], updated['A期货']['last_date']) == (3, 20250901)
+
+
+def test_broker_index_includes_existing_files_on_first_publish(tmp_path):
+    write_csv(str(tmp_path / 'SHFE_rb_C期货.csv'), make_rows([20250828], brokers=('C期货',)))
+    storage = CsvStorage(str(tmp_path))
+    save_csv(storage, make_rows([20250829]))
+    storage.commit()
+    index = storage.read_broker_index('SHFE', 'rb')
+    assert list(index) == ['C期货']
+    assert index['C期货']['rows'] == 1
+
+
+def test_segments_backend_does_not_export_csv_by_default(tmp_path):
+    segments_dir = str(tmp_path / 'segments')
+    assert create_storage('segments', segments_dir=segments_dir, csv_directory=str(tmp_path)).csv is None
+    assert create_storage('segments', segments_dir=segments_dir, csv_directory=str(tmp_path),
+                          export_csv=None).csv is None
+    assert create_storage('segments', segments_dir=segments_dir, csv_directory=str(tmp_path),
+                          export_csv=True).csv is not None
+    sqlite = create_storage('sqlite', sqlite_path=str(tmp_path / 'ranking.sqlite3'), csv_directory=str(tmp_path))
+    assert sqlite.csv is not None
+    sqlite.close()
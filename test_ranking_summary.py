@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试持仓排行榜预计算汇总与网页 renderRankings / calculateSummary 的计算结果一致
+"""
+import json
+
+import pandas as pd
+
+from ranking_schema import MARKET_SCOPE, apply_ranking_schema
+from ranking_storage import RANKING_COLUMNS
+from ranking_summary import TOP_N, summarize_day, write_summaries
+
+
+def row(ranking_type, broker, datetime=20250829, symbol='SHFE.rb2601', **values):
+    """
+    一条排名行：只填写给出的列，其余为空（与查询结果中其他排名表的列为空一致）
+    """
+    return dict(ranking_type=ranking_type, datetime=datetime, symbol=symbol, broker=broker, **values)
+
+
+def frame(rows):
+    return apply_ranking_schema(pd.DataFrame(rows, columns=RANKING_COLUMNS))
+
+
+TODAY = frame([
+    row('VOLUME', 'A期货', volume=500, volume_change=10, volume_ranking=1, long_oi=150),
+    row('VOLUME', 'B期货', volume=300, volume_change=-5, volume_ranking=2),
+    row('LONG', 'B期货', long_oi=400, long_change=20, long_ranking=1),
+    row('LONG', 'C期货', long_oi=200, long_change=5, long_ranking=2),
+    row('SHORT', 'A期货', short_oi=350, short_change=7, short_ranking=1),
+    row('SHORT', 'C期货', short_oi=100, short_change=-1, short_ranking=2),
+])
+
+PREV = frame([
+    row('VOLUME', 'A期货', datetime=20250828, volume=400, volume_ranking=1, long_oi=100, short_oi=300),
+    row('LONG', 'B期货', datetime=20250828, long_oi=350, long_ranking=1),
+    # 当日不在榜的公司同样计入上日合计
+    row('VOLUME', 'D期货', datetime=20250828, volume=50, volume_ranking=2, short_oi=80),
+])
+
+
+def summary(today, prev, change, top5=None):
+    top5 = today if top5 is None else top5
+    return {'todayTotal': today, 'prevTotal': prev, 'change': change,
+            'top5Total': top5, 'top10Total': today, 'top20Total': today}
+
+
+def test_tables_follow_page_ordering():
+    tables = summarize_day(TODAY, PREV)
+    assert tables['volume']['items'] == [['A期货', 500, 10, 1], ['B期货', 300, -5, 2]]
+    # 只出现在成交量表中的 A 期货按数值排在有名次的公司之后，顺延名次，增减为 0
+    assert tables['long']['items'] == [['B期货', 400, 20, 1], ['C期货', 200, 5, 2], ['A期货', 150, 0, 3]]
+    assert tables['short']['items'] == [['A期货', 350, 7, 1], ['C期货', 100, -1, 2]]
+    # 净持仓按各公司当日的最大多头/空头持仓计算
+    assert tables['netLong']['items'] == [['B期货', 400, None, 1], ['C期货', 100, None, 2]]
+    assert tables['netShort']['items'] == [['A期货', 200, None, 1]]
+
+
+def test_summaries_match_calculate_summary():
+    tables = summarize_day(TODAY, PREV)
+    assert tables['volume']['summary'] == summary(800, 450, 350)
+    assert tables['long']['summary'] == summary(750, 450, 300)
+    assert tables['short']['summary'] == summary(450, 380, 70)
+    # 上日净持仓合计只累加为正的公司
+    assert tables['netLong']['summary'] == summary(500, 350, 150)
+    assert tables['netShort']['summary'] == summary(200, 280, -80)
+
+
+def test_tables_keep_top_n_and_top_totals():
+    rows = frame([row('LONG', f"{i:02d}期货", long_oi=1000 - i, long_change=1, long_ranking=i + 1)
+                  for i in range(TOP_N + 5)])
+    tables = summarize_day(rows, rows.iloc[:0])
+    values = [1000 - i for i in range(TOP_N)]
+    assert [item[3] for item in tables['long']['items']] == list(range(1, TOP_N + 1))
+    assert tables['long']['summary'] == {
+        'todayTotal': sum(values), 'prevTotal': 0, 'change': sum(values),
+        'top5Total': sum(values[:5]), 'top10Total': sum(values[:10]), 'top20Total': sum(values),
+    }
+    assert tables['volume']['items'] == []
+
+
+def test_write_summaries_rewrites_following_day(tmp_path):
+    merged = pd.concat([PREV, TODAY], ignore_index=True)
+    assert write_summaries(merged, PREV, str(tmp_path), 'SHFE', 'rb') == 2
+    directory = tmp_path / 'SHFE_rb'
+    assert json.loads((directory / 'index.json').read_text(encoding='utf-8')) == {
+        'SHFE.rb2601': [20250828, 20250829]}
+    content = json.loads((directory / 'SHFE.rb2601' / '20250829.json').read_text(encoding='utf-8'))
+    assert content['prev_date'] == 20250828
+    assert content['scope'] == MARKET_SCOPE
+    assert content['rankings'] == json.loads(json.dumps(summarize_day(TODAY, PREV)))
+    # 只有最新交易日的新数据时不重写前一天
+    assert write_summaries(merged, TODAY, str(tmp_path), 'SHFE', 'rb') == 1
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试请求层：自适应限速（AIMD）、退避重试和重试队列
+"""
+import asyncio
+
+import pytest
+
+from request_layer import AdaptiveTokenBucket, RequestLayer, is_throttle_error
+
+
+class Throttled(Exception):
+    status = 429
+
+
+def test_bucket_halves_on_throttle_and_recovers_slowly():
+    bucket = AdaptiveTokenBucket(8, min_rate=1)
+    bucket.on_throttle()
+    assert bucket.rate == 4
+    assert bucket.tokens <= 0
+    bucket.on_throttle()
+    bucket.on_throttle()
+    bucket.on_throttle()
+    # 不低于 min_rate
+    assert bucket.rate == 1
+    # 加性回升：每次成功增加 increase / rate
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(1.5)
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(1.5 + 0.5 / 1.5)
+    for _ in range(1000):
+        bucket.on_success()
+    # 不超过初始速率
+    assert bucket.rate == 8
+
+
+def test_throttle_errors_are_recognised():
+    assert is_throttle_error(Throttled())
+    assert is_throttle_error(RuntimeError('HTTP 429 Too Many Requests'))
+    assert not is_throttle_error(RuntimeError('连接断开'))
+
+
+def flaky(failures, error=RuntimeError):
+    """
+    前 failures 次调用抛出 error，之后返回 'ok'
+    """
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        if len(calls) <= failures:
+            raise error('失败')
+        return 'ok'
+
+    return request, calls
+
+
+def test_call_retries_until_success():
+    layer = RequestLayer(rate=1000, max_attempts=3, base_delay=0)
+    request, calls = flaky(2)
+    assert asyncio.run(layer.call(request)) == 'ok'
+    assert len(calls) == 3
+    assert layer.stats['attempts'] == 3
+    assert layer.stats['retries'] == 2
+    assert layer.stats['successes'] == 1
+
+
+def test_call_raises_last_error_and_slows_down_on_throttle():
+    layer = RequestLayer(rate=1000, max_attempts=2, base_delay=0)
+    request, calls = flaky(5, error=Throttled)
+    with pytest.raises(Throttled):
+        asyncio.run(layer.call(request))
+    assert len(calls) == 2
+    assert layer.stats['throttles'] == 2
+    assert layer.bucket.rate == 250
+
+
+def test_backoff_delay_is_capped():
+    layer = RequestLayer(base_delay=1.0, max_delay=5.0)
+    for attempt in range(10):
+        assert 0 <= layer.backoff_delay(attempt) <= min(5.0, 2 ** attempt)
+
+
+def test_retry_queue_then_final_failure():
+    layer = RequestLayer()
+    layer.give_up('a')
+    layer.give_up('b')
+    assert layer.stats['requeued'] == 2
+    # 取出重试队列后，再次失败记为最终失败
+    assert layer.take_retry_queue() == ['a', 'b']
+    assert layer.retry_queue == []
+    layer.give_up('b')
+    assert layer.failed == ['b']
+    assert layer.stats['final_failures'] == 1
+    # 重试轮结束后，新的失败重新进入重试队列
+    layer.end_retry_round()
+    layer.give_up('c')
+    assert layer.retry_queue == ['c']
+    assert layer.failed == ['b']
@@ -2,8 +2,9 @@
 # -*- coding: utf-8 -*-
 """
 测试股票数据获取
+设置环境变量 TQ_FAKE_API（例如 "synthetic"）可离线运行
 """
-from tqsdk import TqApi, TqAuth
+from fake_tqapi import create_api
 
 # 使用你的天勤账号
 USERNAME = "chaos123"
@@ -13,7 +14,7 @@ SYMBOL = "SSE.513630"  # 股票代码
 
 def test_stock_data():
     """测试获取股票行情和K线数据"""
-    api = TqApi(auth=TqAuth(USERNAME, PASSWORD))
+    api = create_api(USERNAME, PASSWORD)
     
     try:
         print(f"正在获取 {SYMBOL} 的行情数据...")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试交易日历的边界日期（节假日、周末、日历起止、数据发布时间）
+"""
+import json
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from trading_calendar import TradingCalendar, load_trading_calendar, refresh_trading_calendar
+
+# 2024 年国庆：10 月 1 日 ~ 7 日休市，9 月 29 日（周日）、10 月 12 日（周六）调休上班但期货不交易
+NATIONAL_DAY = [date(2024, 10, d) for d in range(1, 8)]
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar(NATIONAL_DAY, [2024], first_day=date(2024, 9, 2), last_day=date(2024, 10, 31))
+
+
+def test_holidays_and_weekends(calendar):
+    assert calendar.is_trading_day(date(2024, 9, 30))
+    assert not calendar.is_trading_day(date(2024, 10, 1))
+    assert not calendar.is_trading_day(date(2024, 9, 29))
+    assert not calendar.is_trading_day(date(2024, 10, 12))
+
+
+def test_neighbours_across_holiday(calendar):
+    assert calendar.previous_trading_day(date(2024, 10, 8)) == date(2024, 9, 30)
+    assert calendar.next_trading_day(date(2024, 9, 30)) == date(2024, 10, 8)
+    assert calendar.on_or_after(date(2024, 10, 3)) == date(2024, 10, 8)
+    assert calendar.on_or_before(date(2024, 10, 3)) == date(2024, 9, 30)
+    # 本身是交易日时返回自身
+    assert calendar.on_or_after(date(2024, 10, 8)) == date(2024, 10, 8)
+    assert calendar.on_or_before(date(2024, 10, 8)) == date(2024, 10, 8)
+
+
+def test_ranges_at_calendar_bounds(calendar):
+    first = date(2024, 9, 2)
+    assert calendar.trading_days(first, date(2024, 9, 6)) == [date(2024, 9, d) for d in range(2, 7)]
+    assert calendar.count_trading_days(first, date(2024, 9, 6)) == 5
+    assert calendar.first_n_trading_days(first, 2) == [date(2024, 9, 2), date(2024, 9, 3)]
+    assert calendar.last_n_trading_days(date(2024, 9, 3), 5) == [date(2024, 9, 2), date(2024, 9, 3)]
+    assert calendar.trading_days(date(2024, 10, 1), date(2024, 10, 7)) == []
+    assert calendar.count_trading_days(date(2024, 10, 8), date(2024, 10, 1)) == 0
+    assert calendar.last_n_trading_days(date(2024, 10, 7), 2) == [date(2024, 9, 27), date(2024, 9, 30)]
+    with pytest.raises(ValueError):
+        calendar.previous_trading_day(first)
+    with pytest.raises(ValueError):
+        calendar.next_trading_day(date(2024, 10, 31))
+    with pytest.raises(ValueError):
+        calendar.is_trading_day(date(2024, 9, 1))
+
+
+def test_latest_data_day_respects_publish_time(calendar):
+    assert calendar.latest_data_day(datetime(2024, 9, 30, 18, 29)) == date(2024, 9, 27)
+    assert calendar.latest_data_day(datetime(2024, 9, 30, 18, 30)) == date(2024, 9, 30)
+    # 节假日期间为节前最后一个交易日
+    assert calendar.latest_data_day(datetime(2024, 10, 5, 20, 0)) == date(2024, 9, 30)
+
+
+def test_calendar_covers_table_years_only():
+    calendar = load_trading_calendar()
+    assert calendar.first_day == date(2020, 1, 1)
+    assert calendar.last_day == date(max(calendar.years), 12, 31)
+    # 2023 年元旦假期（1 月 2 日周一休市）和 2020 年延长的春节假期
+    assert calendar.on_or_after(date(2023, 1, 1)) == date(2023, 1, 3)
+    assert calendar.next_trading_day(date(2020, 1, 23)) == date(2020, 2, 3)
+    # 覆盖年份之外不推测，直接报错
+    with pytest.raises(ValueError):
+        calendar.is_trading_day(date(2019, 12, 31))
+    with pytest.raises(ValueError):
+        calendar.on_or_after(calendar.last_day + timedelta(days=1))
+
+
+def test_pre_2024_start_dt_window():
+    from query_ranking_to_csv import get_trading_day_window
+
+    window = get_trading_day_window(5, date(2023, 3, 1), now=datetime(2025, 9, 1, 20, 0))
+    assert window == [date(2023, 3, 1), date(2023, 3, 2), date(2023, 3, 3), date(2023, 3, 6), date(2023, 3, 7)]
+
+
+def test_start_dt_outside_calendar_is_rejected():
+    from job_config import Job
+    from query_ranking_to_csv import prepare_job
+    from run_metrics import RunMetrics
+
+    job = Job('old', ['SHFE.rb2001'], 5, date(2019, 6, 3), [], False, True, 'csv', {})
+    assert prepare_job(job, RunMetrics()) is None
+    last_day = load_trading_calendar().last_day
+    assert prepare_job(job._replace(start_dt=last_day + timedelta(days=1)), RunMetrics()) is None
+
+
+def test_missing_or_incomplete_calendar_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='不存在'):
+        load_trading_calendar(str(tmp_path / 'missing.json'))
+    path = tmp_path / 'calendar.json'
+    path.write_text(json.dumps({'years': [], 'holidays': []}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        load_trading_calendar(str(path))
+    # 中间缺少的年份同样不按周末规则推测
+    path.write_text(json.dumps({'years': [2024, 2026], 'holidays': ['20240101']}), encoding='utf-8')
+    with pytest.raises(ValueError, match='2025'):
+        load_trading_calendar(str(path))
+
+
+class CalendarApi:
+    def get_trading_calendar(self, start_dt, end_dt):
+        days = pd.date_range(start_dt, end_dt)
+        return pd.DataFrame({'date': days, 'trading': [d.weekday() < 5 and d.month != 10 for d in days]})
+
+
+def test_refresh_trading_calendar_merges_years(tmp_path):
+    path = tmp_path / 'calendar.json'
+    path.write_text(json.dumps({'years': [2024], 'holidays': ['20240101', '20250101']}), encoding='utf-8')
+    refresh_trading_calendar(CalendarApi(), [2025], filename=str(path))
+
+    content = json.loads(path.read_text(encoding='utf-8'))
+    assert content['years'] == [2024, 2025]
+    assert '20240101' in content['holidays']
+    # 2025 年按查询结果替换：1 月 1 日不再是节假日，10 月的工作日都是
+    assert '20250101' not in content['holidays']
+    assert '20251008' in content['holidays']
+    assert not any(name.endswith('.tmp') for name in map(str, tmp_path.iterdir()))
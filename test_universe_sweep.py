@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试全市场扫描的分片规划（按交易所切分，大交易所按品种 LPT 拆分）
+"""
+from universe_sweep import estimate_cost, plan_shards
+
+
+def contracts(exchange, product, count):
+    return [f"{exchange}.{product}26{month:02d}" for month in range(1, count + 1)]
+
+
+def universe(spec):
+    """
+    spec: {(交易所, 品种): 合约数}
+    """
+    return {(exchange, product): contracts(exchange, product, count) for (exchange, product), count in spec.items()}
+
+
+def test_estimate_cost_counts_queries():
+    assert estimate_cost(['SHFE.rb2601', 'SHFE.rb2605'], []) == 6
+    assert estimate_cost(['SHFE.rb2601'], ['A期货', 'B期货']) == 6
+
+
+def test_exchanges_within_target_stay_whole():
+    # 平均工作量 7.5：GFEX 不超过，INE 超过但只有一个品种，都不拆分
+    shards = plan_shards(universe({('INE', 'sc'): 3, ('GFEX', 'si'): 1, ('GFEX', 'lc'): 1}), 2, [])
+    assert [(shard.name, shard.cost) for shard in shards] == [('INE', 9), ('GFEX', 6)]
+    assert [product for _, product, _ in shards[1].products] == ['lc', 'si']
+
+
+def test_large_exchange_is_split_with_balanced_load():
+    # SHFE 的工作量约为总量的 3/4，4 个进程时拆成 3 个分片
+    spec = {('SHFE', 'rb'): 6, ('SHFE', 'cu'): 5, ('SHFE', 'al'): 4, ('SHFE', 'zn'): 3, ('SHFE', 'au'): 3,
+            ('SHFE', 'ag'): 3, ('SHFE', 'ni'): 2, ('SHFE', 'sn'): 1, ('INE', 'sc'): 9}
+    shards = plan_shards(universe(spec), 4, [])
+    shfe = [shard for shard in shards if shard.name.startswith('SHFE')]
+    assert sorted(shard.name for shard in shfe) == ['SHFE-1', 'SHFE-2', 'SHFE-3']
+    # 每个品种只出现在一个分片中，分片工作量之和不变
+    placed = [product for shard in shfe for _, product, _ in shard.products]
+    assert sorted(placed) == sorted(product for exchange, product in spec if exchange == 'SHFE')
+    assert sum(shard.cost for shard in shfe) == 27 * 3
+    # LPT：最重与最轻分片之差不超过最大的单个品种
+    costs = [shard.cost for shard in shfe]
+    assert max(costs) - min(costs) <= estimate_cost(contracts('SHFE', 'rb', 6), [])
+    # 按工作量从大到小排列
+    assert [shard.cost for shard in shards] == sorted((shard.cost for shard in shards), reverse=True)
+
+
+def test_exchange_is_not_split_beyond_its_products():
+    shards = plan_shards(universe({('SHFE', 'rb'): 6, ('SHFE', 'cu'): 6}), 8, [])
+    assert sorted(shard.name for shard in shards) == ['SHFE-1', 'SHFE-2']
+    assert all(len(shard.products) == 1 for shard in shards)
+
+
+def test_products_without_contracts_are_skipped():
+    shards = plan_shards({('SHFE', 'rb'): contracts('SHFE', 'rb', 1), ('SHFE', 'wr'): []}, 1, [])
+    assert [(shard.name, [product for _, product, _ in shard.products]) for shard in shards] == [('SHFE', ['rb'])]
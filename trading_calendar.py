@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+国内期货交易日历
+
+使用说明：
+1. 节假日表保存在同目录的 trading_calendar.json 中（随仓库发布，当前覆盖 2020 ~ 2026 年）
+2. 日历范围就是表中覆盖的年份，按 节假日 + 周末 判断交易日；表中没有的年份不做推测，查询时抛出 ValueError
+   （START_DT 早于最早年份的任务直接报错；表中年份必须连续）
+3. 交易所公布新一年节假日安排后，运行 `python trading_calendar.py 2027` 从天勤服务器刷新节假日表，
+   否则进入新的一年后计算查询窗口会报错
+"""
+
+import json
+import os
+from datetime import date, datetime, time, timedelta
+
+from atomic_io import atomic_write_json
+
+# 节假日表文件
+CALENDAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trading_calendar.json")
+
+# 持仓排名数据的发布时间（数据更新时间: 18:30~19:00），此前当日数据不可能存在
+DATA_READY_TIME = time(18, 30)
+
+
+def _parse_ymd(value):
+    return datetime.strptime(value, "%Y%m%d").date()
+
+
+class TradingCalendar:
+    """
+    交易日历：构造时预先展开覆盖区间内的全部交易日，
+    之后的交易日判断、前后交易日、区间交易日列表及计数均为 O(1) 查表
+    """
+
+    def __init__(self, holidays, years, first_day=None, last_day=None):
+        self.holidays = set(holidays)
+        self.years = set(years)
+        if not self.years:
+            raise ValueError("节假日表没有覆盖任何年份，请运行 python trading_calendar.py <年份> 刷新")
+        # 范围只包含节假日表覆盖的年份：其他年份的节假日未知，不按周末规则推测
+        if first_day is None:
+            first_day = date(min(self.years), 1, 1)
+        if last_day is None:
+            last_day = date(max(self.years), 12, 31)
+        missing = sorted(set(range(first_day.year, last_day.year + 1)) - self.years)
+        if missing:
+            raise ValueError(f"节假日表缺少 {missing} 年，请运行 python trading_calendar.py "
+                             f"{' '.join(map(str, missing))} 刷新")
+        self.first_day = first_day
+        self.last_day = last_day
+
+        # 交易日列表，以及每个自然日 -> 不晚于该日的最后一个交易日在列表中的位置
+        self._days = []
+        self._floor_index = {}
+        current = first_day
+        while current <= last_day:
+            if current.weekday() < 5 and current not in self.holidays:
+                self._days.append(current)
+            self._floor_index[current] = len(self._days) - 1
+            current += timedelta(days=1)
+        self._index = {day: i for i, day in enumerate(self._days)}
+
+    def _check(self, day):
+        if day not in self._floor_index:
+            raise ValueError(f"日期 {day} 超出交易日历范围 {self.first_day} ~ {self.last_day}"
+                             f"（节假日表覆盖的年份），请运行 python trading_calendar.py {day.year} 刷新")
+
+    def is_trading_day(self, day):
+        self._check(day)
+        return day in self._index
+
+    def previous_trading_day(self, day):
+        """
+        严格早于 day 的最近一个交易日
+        """
+        self._check(day)
+        i = self._floor_index[day] - (1 if day in self._index else 0)
+        if i < 0:
+            raise ValueError(f"{day} 之前没有交易日")
+        return self._days[i]
+
+    def next_trading_day(self, day):
+        """
+        严格晚于 day 的最近一个交易日
+        """
+        self._check(day)
+        i = self._floor_index[day] + 1
+        if i >= len(self._days):
+            raise ValueError(f"{day} 之后没有交易日")
+        return self._days[i]
+
+    def on_or_before(self, day):
+        """
+        不晚于 day 的最近一个交易日（day 本身是交易日则返回 day）
+        """
+        return day if self.is_trading_day(day) else self.previous_trading_day(day)
+
+    def on_or_after(self, day):
+        """
+        不早于 day 的最近一个交易日（day 本身是交易日则返回 day）
+        """
+        return day if self.is_trading_day(day) else self.next_trading_day(day)
+
+    def trading_days(self, start, end):
+        """
+        [start, end] 区间内的交易日列表（升序）
+        """
+        self._check(start)
+        self._check(end)
+        lo = self._floor_index[start - timedelta(days=1)] + 1 if start > self.first_day else 0
+        return self._days[lo:self._floor_index[end] + 1]
+
+    def count_trading_days(self, start, end):
+        """
+        [start, end] 区间内的交易日数量
+        """
+        self._check(start)
+        self._check(end)
+        lo = self._floor_index[start - timedelta(days=1)] + 1 if start > self.first_day else 0
+        return max(self._floor_index[end] + 1 - lo, 0)
+
+    def last_n_trading_days(self, end, n):
+        """
+        截止到 end（含）的最近 n 个交易日（升序）
+        """
+        self._check(end)
+        hi = self._floor_index[end] + 1
+        return self._days[max(hi - n, 0):hi]
+
+    def first_n_trading_days(self, start, n):
+        """
+        从 start（含）起的 n 个交易日（升序）
+        """
+        self._check(start)
+        lo = self._floor_index[start - timedelta(days=1)] + 1 if start > self.first_day else 0
+        return self._days[lo:lo + n]
+
+    def latest_data_day(self, now=None):
+        """
+        持仓排名数据可能已发布的最近一个交易日：
+        当日是交易日且已过发布时间则为当日，否则为上一个交易日
+        """
+        if now is None:
+            now = datetime.now()
+        today = now.date()
+        if self.is_trading_day(today) and now.time() >= DATA_READY_TIME:
+            return today
+        return self.previous_trading_day(today)
+
+
+def load_trading_calendar(filename=CALENDAR_FILE):
+    """
+    从节假日表文件构建交易日历；文件不存在或损坏时抛出 ValueError（不按周末规则推测）
+    """
+    if not os.path.exists(filename):
+        raise ValueError(f"交易日历文件 {filename} 不存在，请运行 python trading_calendar.py <年份> 生成")
+    try:
+        with open(filename, encoding="utf-8") as f:
+            content = json.load(f)
+        holidays = [_parse_ymd(d) for d in content.get("holidays", [])]
+        years = content.get("years", [])
+    except (OSError, ValueError) as e:
+        raise ValueError(f"加载交易日历 {filename} 失败: {e}")
+    return TradingCalendar(holidays, years)
+
+
+_default_calendar = None
+
+
+def get_trading_calendar():
+    """
+    进程内共享的默认交易日历（首次调用时加载）
+    """
+    global _default_calendar
+    if _default_calendar is None:
+        _default_calendar = load_trading_calendar()
+    return _default_calendar
+
+
+def refresh_trading_calendar(api, years, filename=CALENDAR_FILE):
+    """
+    通过 api.get_trading_calendar 查询指定年份的交易日历，合并进节假日表文件
+    """
+    holidays, known_years = set(), set()
+    if os.path.exists(filename):
+        with open(filename, encoding="utf-8") as f:
+            content = json.load(f)
+        holidays = set(content.get("holidays", []))
+        known_years = set(content.get("years", []))
+
+    for year in years:
+        df = api.get_trading_calendar(start_dt=date(year, 1, 1), end_dt=date(year, 12, 31))
+        holidays = {d for d in holidays if not d.startswith(str(year))}
+        for _, row in df.iterrows():
+            day = row["date"].date()
+            if day.weekday() < 5 and not row["trading"]:
+                holidays.add(day.strftime("%Y%m%d"))
+        known_years.add(year)
+        print(f"  [OK] {year} 年交易日历已更新")
+
+    content = {
+        "description": "国内期货交易所（SHFE/DCE/CZCE/INE/GFEX/CFFEX）休市的工作日，周末不在此列",
+        "years": sorted(known_years),
+        "holidays": sorted(holidays),
+    }
+    atomic_write_json(filename, content, indent=2)
+
+    global _default_calendar
+    _default_calendar = None
+
+
+if __name__ == "__main__":
+    import sys
+    from fake_tqapi import create_api
+    from job_config import resolve_credentials
+    from query_ranking_to_csv import USERNAME, PASSWORD
+
+    refresh_years = [int(y) for y in sys.argv[1:]] or [date.today().year, date.today().year + 1]
+    api = create_api(*resolve_credentials(USERNAME, PASSWORD))
+    try:
+        refresh_trading_calendar(api, refresh_years)
+    finally:
+        api.close()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+全市场品种扫描
+
+一次运行覆盖 SHFE/DCE/CZCE/INE/GFEX/CFFEX 全部期货品种：
+1. 主进程列出各交易所在市合约，按品种选出活跃合约（结果按数据日缓存，见 contract_discovery）
+2. 按交易所切分为分片；工作量（查询数）超过平均值的交易所再按品种拆成多个分片
+3. 分片按工作量从大到小提交到进程池，每个分片在独立进程中用自己的 TqApi 连接运行，
+   每个品种一个任务、写入各自的输出文件（分片之间没有共享文件，断点日志和指标文件也按分片分开）
+4. 汇总各分片结果，打印并写入运行摘要 JSON；各分片的指标追加进指标文件，分片总清单由主进程生成
+
+使用：python query_ranking_to_csv.py --sweep [--workers 4] [--exchanges SHFE,DCE] [--config jobs.toml]
+指定 --config 时以其中 [defaults] 作为各品种任务的模板、[run] 作为运行参数，否则使用脚本【配置区域】
+"""
+
+import contextlib
+import math
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from atomic_io import atomic_write_json
+from contract_discovery import ContractDiscovery
+from trading_calendar import get_trading_calendar
+
+SWEEP_EXCHANGES = ["SHFE", "DCE", "CZCE", "INE", "GFEX", "CFFEX"]
+
+# 一个分片：名称、[(交易所, 品种, [合约...]), ...]、预估查询数
+Shard = namedtuple('Shard', ['name', 'products', 'cost'])
+
+
+def estimate_cost(symbols, brokers):
+    """
+    一个品种的预估查询数：合约数 × 3 种排名 × 期货公司数
+    """
+    return len(symbols) * 3 * max(len(brokers or []), 1)
+
+
+def plan_shards(universe, workers, brokers):
+    """
+    universe: {(交易所, 品种): [合约...]}
+    先按交易所分片；单个交易所的工作量超过 总量/workers 时按品种拆成多个分片，
+    拆分时把品种按工作量从大到小依次放入当前最轻的分片（LPT），保证各分片大小接近
+    返回按工作量从大到小排列的 Shard 列表
+    """
+    by_exchange = {}
+    for (exchange, product), symbols in universe.items():
+        if symbols:
+            by_exchange.setdefault(exchange, []).append((exchange, product, symbols))
+    total = sum(estimate_cost(symbols, brokers) for items in by_exchange.values() for _, _, symbols in items)
+    target = max(total / max(int(workers), 1), 1)
+    shards = []
+    for exchange, items in by_exchange.items():
+        cost = sum(estimate_cost(symbols, brokers) for _, _, symbols in items)
+        parts = min(max(math.ceil(cost / target), 1), len(items))
+        buckets = [[] for _ in range(parts)]
+        loads = [0] * parts
+        for item in sorted(items, key=lambda item: -estimate_cost(item[2], brokers)):
+            i = loads.index(min(loads))
+            buckets[i].append(item)
+            loads[i] += estimate_cost(item[2], brokers)
+        for i, bucket in enumerate(buckets):
+            name = exchange if parts == 1 else f"{exchange}-{i + 1}"
+            shards.append(Shard(name, sorted(bucket), loads[i]))
+    return sorted(shards, key=lambda shard: -shard.cost)
+
+
+def discover_universe(exchanges, get_api, cache_file, top_k):
+    """
+    各交易所全部品种的活跃合约 {(交易所, 品种): [合约...]}
+    """
+    discovery = ContractDiscovery(cache_file, get_trading_calendar().latest_data_day())
+    products = discovery.list_products(exchanges, get_api)
+    return discovery.discover(products, get_api, top_k)
+
+
+def _shard_file(filename, shard_name):
+    """
+    各分片独立的断点日志/指标文件，避免多个进程同时追加同一个文件
+    """
+    if not filename:
+        return filename
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{shard_name}{ext}"
+
+
+def run_shard(shard, template, username, password, run_options, log_dir):
+    """
+    进程池中执行的分片：每个品种一个任务，共用本进程的一个 TqApi 连接
+    进度输出写入 log_dir 下的分片日志；返回分片结果摘要
+    """
+    from query_ranking_to_csv import run_jobs
+
+    jobs = [
+        template._replace(name=f"{exchange}.{product}", symbols=list(symbols), products=())
+        for exchange, product, symbols in shard.products
+    ]
+    options = dict(run_options)
+    options['journal_file'] = _shard_file(options.get('journal_file'), shard.name)
+    options['metrics_file'] = _shard_file(options.get('metrics_file'), shard.name)
+    # 多个分片进程同时汇总分片总清单会互相覆盖，由主进程在全部分片结束后汇总
+    options['shard_catalog'] = False
+    summary = []
+    start = time.perf_counter()
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"sweep_{shard.name}.log")
+    with open(log_file, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        try:
+            ok = run_jobs(jobs, username, password, **options, summary=summary)
+        except Exception as e:
+            print(f"错误: 分片 {shard.name} 运行失败: {e!r}")
+            ok = False
+    return {
+        'shard': shard.name,
+        'ok': ok,
+        'cost': shard.cost,
+        'seconds': round(time.perf_counter() - start, 3),
+        'log': log_file,
+        'jobs': summary,
+    }
+
+
+def merge_shard_metrics(metrics_file, results):
+    """
+    全部分片结束后，把各分片的指标文件（包括运行失败的分片已写入的部分）按分片名顺序追加进 metrics_file 并删除
+    """
+    if not metrics_file:
+        return
+    with open(metrics_file, 'a', encoding='utf-8') as out:
+        for result in sorted(results, key=lambda result: result['shard']):
+            path = _shard_file(metrics_file, result['shard'])
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    out.write(line)
+            os.remove(path)
+
+
+def print_sweep_plan(shards, workers):
+    print("=" * 60)
+    print(f"全市场扫描计划: {len(shards)} 个分片, {workers} 个进程")
+    print("=" * 60)
+    for shard in shards:
+        symbols = sum(len(symbols) for _, _, symbols in shard.products)
+        print(f"  {shard.name:<10} {len(shard.products):>3} 个品种 {symbols:>4} 个合约  预估 {shard.cost} 个查询")
+    print()
+
+
+def print_sweep_summary(results, seconds):
+    print()
+    print("=" * 60)
+    print("全市场扫描完成")
+    print("=" * 60)
+    for result in sorted(results, key=lambda result: result['shard']):
+        rows = sum(job['rows_written'] for job in result['jobs'])
+        status = "[OK]" if result['ok'] else "[FAIL]"
+        print(f"  {status} {result['shard']:<10} {len(result['jobs']):>3} 个品种  新增 {rows} 条  "
+              f"耗时 {result['seconds']:.1f} 秒  日志 {result['log']}")
+    failed = [result['shard'] for result in results if not result['ok']]
+    print(f"总耗时: {seconds:.1f} 秒" + (f"，失败分片: {failed}" if failed else ""))
+
+
+def run_sweep(template, username, password, exchanges=None, workers=4, run_options=None,
+              summary_file="sweep_summary.json", log_dir="sweep_logs", fake_api=None):
+    """
+    运行全市场扫描；全部分片成功返回 True
+    template 为各品种任务的模板（Job），其中 days / brokers / storage / top_k 等对所有品种生效
+    """
+    from fake_tqapi import create_api
+    from query_ranking_to_csv import write_shard_catalogs
+
+    exchanges = exchanges or SWEEP_EXCHANGES
+    run_options = dict(run_options or {})
+    fake_api = fake_api or os.environ.get('TQ_FAKE_API')
+    run_options['fake_api'] = fake_api
+    # 分片本身已在独立进程中运行，分片内不再启动查询进程池
+    run_options['fetch_workers'] = 1
+    started = time.perf_counter()
+
+    print("=" * 60)
+    print(f"全市场品种发现: {', '.join(exchanges)}")
+    print("=" * 60)
+    api = None
+
+    def connect():
+        nonlocal api
+        if api is None:
+            api = create_api(username, password, fake_api)
+        return api
+
+    try:
+        universe = discover_universe(exchanges, connect, run_options.get('contract_cache_file'), template.top_k)
+    finally:
+        # 主进程只用于发现合约，查询前关闭连接
+        if api is not None:
+            api.close()
+    shards = plan_shards(universe, workers, template.brokers)
+    if not shards:
+        print("错误: 没有发现任何活跃合约")
+        return False
+    workers = min(max(int(workers), 1), len(shards))
+    print_sweep_plan(shards, workers)
+
+    results = []
+    # spawn：子进程不继承主进程的 TqApi 事件循环等状态
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {
+            pool.submit(run_shard, shard, template, username, password, run_options, log_dir): shard
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'shard': shard.name, 'ok': False, 'cost': shard.cost, 'seconds': 0,
+                          'log': None, 'jobs': [], 'error': repr(e)}
+            print(f"  {'[OK]' if result['ok'] else '[FAIL]'} 分片 {result['shard']} 完成，"
+                  f"耗时 {result['seconds']:.1f} 秒")
+            results.append(result)
+
+    write_shard_catalogs([template])
+    merge_shard_metrics(run_options.get('metrics_file'), results)
+    seconds = time.perf_counter() - started
+    print_sweep_summary(results, seconds)
+    if summary_file:
+        atomic_write_json(summary_file, {
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'data_day': get_trading_calendar().latest_data_day().isoformat(),
+            'exchanges': exchanges,
+            'workers': workers,
+            'seconds': round(seconds, 3),
+            'products': sum(len(result['jobs']) for result in results),
+            'rows_written': sum(job['rows_written'] for result in results for job in result['jobs']),
+            'shards': sorted(results, key=lambda result: result['shard']),
+        })
+        print(f"运行摘要已写入 {summary_file}")
+    return all(result['ok'] for result in results)